@@ -1,27 +1,43 @@
 from __future__ import annotations
 
+from datetime import datetime, time
 from pathlib import Path
 
 import streamlit as st
 
-from src.chunking import chunk_records
 from src.citations import format_source_reference
 from src.config import AppConfig
-from src.embeddings import get_embedding_model
-from src.ingestion import extract_text_from_file
-from src.rag_pipeline import answer_query
-from src.vector_store import build_or_update_vectorstore, clear_vectorstore, load_vectorstore
+from src.index_versions import active_index_dir
+from src.jobs import IngestJob, IngestJobQueue, shared_job_queue
+from src.manifest import load_manifest
+from src.rag_pipeline import stream_answer_query
+from src.registry import shared_embedding_model, shared_vectorstore, warmup
+from src.retrieval_cache import RetrievalCache
+from src.scope import RetrievalScope
+from src.shards import collection_root, list_collections
+from src.telemetry import configure_telemetry
 
 st.set_page_config(page_title="College Helper RAG", layout="wide")
 st.title("College Helper RAG")
 
 
 def _init_session() -> None:
-    st.session_state.setdefault("vectorstore", None)
     st.session_state.setdefault("uploaded_paths", [])
     st.session_state.setdefault("image_paths", [])
 
 
+@st.cache_resource
+def _get_retrieval_cache(max_entries: int, ttl_seconds: float) -> RetrievalCache:
+    # Shared by every session in this process so repeated questions skip the search.
+    return RetrievalCache(max_entries=max_entries, ttl_seconds=ttl_seconds)
+
+
+@st.cache_resource
+def _warmup_process(_config: AppConfig) -> dict[str, float]:
+    # Runs once per server process; later sessions and reruns find everything loaded.
+    return warmup(_config)
+
+
 def _save_uploaded_files(upload_dir: Path, uploaded_files) -> tuple[list[Path], list[Path]]:
     saved: list[Path] = []
     images: list[Path] = []
@@ -34,6 +50,66 @@ def _save_uploaded_files(upload_dir: Path, uploaded_files) -> tuple[list[Path],
     return saved, images
 
 
+def _job_caption(job: IngestJob) -> str:
+    counts = f"{job.files_done}/{job.files_total} files, {job.batches} batches, {job.chunks_indexed} chunks"
+    if job.status == "completed":
+        return f"Indexed {job.chunks_indexed} chunks ({job.chunks_embedded} embedded) from {job.files_total} files."
+    if job.status == "failed":
+        return f"Failed after {counts}: {job.error}"
+    return f"{job.status.capitalize()}: {counts}"
+
+
+def _render_jobs(job_queue: IngestJobQueue, polling: bool) -> None:
+    st.subheader("Ingestion Jobs")
+    jobs = job_queue.list_jobs(limit=10)
+    if polling and all(job.finished for job in jobs):
+        # Last job just finished: rerun the whole page to stop polling and pick up the new chunks.
+        st.rerun()
+    for job in jobs:
+        names = ("Rebuild: " if job.rebuild else "") + (f"[{job.collection}] " if job.collection else "")
+        names += ", ".join(job.files) or "no files"
+        with st.container(border=True):
+            st.progress(job.fraction, text=f"{names[:120]}")
+            st.caption(_job_caption(job))
+            if job.status in {"queued", "running"}:
+                if st.button("Cancel", key=f"cancel-{job.id}"):
+                    job_queue.cancel(job.id)
+                    st.rerun()
+            elif job.status in {"failed", "cancelled"}:
+                if st.button("Resume", key=f"resume-{job.id}"):
+                    job_queue.retry(job.id)
+                    st.rerun()
+            if job.warnings or job.files:
+                with st.expander("Details"):
+                    for source_file, status in job.files.items():
+                        st.text(f"{source_file}: {status}")
+                    for warning in job.warnings:
+                        st.warning(warning)
+
+
+def _scope_picker(config: AppConfig, collections: list[str]) -> RetrievalScope | None:
+    known: set[str] = set()
+    for name in collections or [None]:
+        known.update(load_manifest(active_index_dir(collection_root(config.chroma_persist_dir, name))))
+    with st.expander("Search scope"):
+        files = st.multiselect("Only search these files", sorted(known))
+        limit_pages = st.checkbox("Limit to a page range", value=False)
+        first_column, last_column = st.columns(2)
+        page_min = first_column.number_input("First page", min_value=1, value=1, step=1, disabled=not limit_pages)
+        # No upper limit: a scanned book can run past any fixed maximum. Left empty, the range is open-ended.
+        page_max = last_column.number_input(
+            "Last page", min_value=page_min, value=None, step=1, placeholder="Last", disabled=not limit_pages
+        )
+        uploaded_after = st.date_input("Uploaded on or after", value=None)
+    scope = RetrievalScope(
+        source_files=files or None,
+        page_min=page_min if limit_pages else None,
+        page_max=page_max if limit_pages else None,
+        uploaded_after=datetime.combine(uploaded_after, time.min).timestamp() if uploaded_after else None,
+    )
+    return None if scope.is_empty else scope
+
+
 def main() -> None:
     _init_session()
 
@@ -43,11 +119,19 @@ def main() -> None:
         st.error(f"Configuration error: {exc}")
         st.stop()
 
+    configure_telemetry(config.trace_log_path, config.metrics_port)
+
     st.subheader("Configuration")
     st.write(f"Chroma persist dir: `{config.chroma_persist_dir}`")
     st.write(f"Upload dir: `{config.upload_dir}`")
 
-    embedding_model = get_embedding_model(config)
+    # Loaded once per process and shared by every session, so reruns do not reload weights.
+    embedding_model = shared_embedding_model(config)
+    if config.warmup_on_start:
+        try:
+            _warmup_process(config)
+        except Exception as exc:  # noqa: BLE001
+            st.warning(f"Warmup failed: {exc}")
 
     col1, col2 = st.columns(2)
     with col1:
@@ -57,7 +141,10 @@ def main() -> None:
             accept_multiple_files=True,
         )
     with col2:
-        clear_and_rebuild = st.checkbox("Clear and rebuild vector store", value=False)
+        clear_and_rebuild = st.checkbox("Rebuild vector store from these files", value=False)
+        collection = st.text_input(
+            "Collection (course or department)", value="", help="Leave blank for the default collection."
+        ).strip()
 
     if st.button("Process Documents", type="primary"):
         if not uploaded_files:
@@ -68,68 +155,69 @@ def main() -> None:
                 st.session_state.uploaded_paths = [str(p) for p in saved_paths]
                 st.session_state.image_paths = [str(p) for p in image_paths]
 
-                all_records = []
-                warnings = []
-                for p in saved_paths:
-                    try:
-                        records = extract_text_from_file(p)
-                        if not records:
-                            warnings.append(f"No text extracted from {p.name}.")
-                        all_records.extend(records)
-                    except Exception as exc:  # noqa: BLE001
-                        warnings.append(f"{p.name}: {exc}")
-
-                if clear_and_rebuild:
-                    clear_vectorstore(config.chroma_persist_dir)
-
-                chunks = chunk_records(
-                    all_records,
-                    chunk_size_tokens=config.chunk_size_tokens,
-                    overlap_tokens=config.chunk_overlap_tokens,
-                )
-
-                if not chunks:
-                    st.warning("No chunks were created. Check document content/OCR.")
-                else:
-                    st.session_state.vectorstore = build_or_update_vectorstore(
-                        chunks=chunks,
-                        embedding_model=embedding_model,
-                        persist_dir=config.chroma_persist_dir,
-                    )
-                    st.success(f"Indexed {len(chunks)} chunks from {len(saved_paths)} files.")
-
-                for warning in warnings:
-                    st.warning(warning)
+                # Runs in a background worker, so the page stays responsive and a refresh loses nothing.
+                # A rebuild fills a new index version and switches to it when done; queries keep
+                # using the current index meanwhile.
+                shared_job_queue(config).submit(saved_paths, rebuild=clear_and_rebuild, collection=collection or None)
+                st.success(f"Queued {len(saved_paths)} files for {'rebuild' if clear_and_rebuild else 'indexing'}.")
             except Exception as exc:  # noqa: BLE001
-                st.error(f"Failed to process documents: {exc}")
+                st.error(f"Failed to queue documents: {exc}")
 
-    if st.session_state.vectorstore is None:
-        try:
-            st.session_state.vectorstore = load_vectorstore(config.chroma_persist_dir, embedding_model)
-        except Exception:  # noqa: BLE001
-            st.session_state.vectorstore = None
+    try:
+        job_queue = shared_job_queue(config)
+    except Exception as exc:  # noqa: BLE001
+        st.error(f"Ingestion queue is unavailable: {exc}")
+    else:
+        jobs = job_queue.list_jobs(limit=10)
+        if jobs:
+            # Re-renders every second while a job is active; idle job lists are static.
+            active = any(not job.finished for job in jobs)
+            st.fragment(run_every=1.0 if active else None)(_render_jobs)(job_queue, active)
+
+    # Looked up on every rerun so all sessions see the handle reopened after a rebuild.
+    try:
+        vectorstore = shared_vectorstore(config, embedding_model)
+    except Exception:  # noqa: BLE001
+        vectorstore = None
 
     st.subheader("Ask a Question")
     query = st.text_input("Enter your question")
     use_multimodal = st.checkbox("Use multimodal reasoning (Gemini with uploaded images)", value=False)
+    collections: list[str] = []
+    available = list_collections(config.chroma_persist_dir)
+    if len(available) > 1:
+        # Several collections are searched in parallel and merged; none selected searches the default.
+        collections = st.multiselect("Search collections", available)
+    scope = _scope_picker(config, collections)
 
     if st.button("Ask"):
         if not query.strip():
             st.warning("Please enter a question.")
-        elif st.session_state.vectorstore is None:
+        elif vectorstore is None:
             st.warning("Vector store is not available. Please process documents first.")
         else:
             try:
-                result = answer_query(
+                result = stream_answer_query(
                     query=query.strip(),
-                    vectorstore=st.session_state.vectorstore,
+                    vectorstore=vectorstore,
                     config=config,
                     use_multimodal=use_multimodal,
                     images=st.session_state.image_paths,
+                    cache=_get_retrieval_cache(config.retrieval_cache_size, config.retrieval_cache_ttl_seconds),
+                    scope=scope,
+                    collections=collections or None,
                 )
                 st.markdown("### Answer")
-                st.write(result.answer_text)
+                st.write_stream(result.tokens)
                 st.caption(f"Model used: {result.used_model}")
+                with st.expander("Timings"):
+                    st.json(
+                        {
+                            "timings_ms": {stage: round(ms, 1) for stage, ms in result.timings.items()},
+                            "prompt_tokens": result.prompt_tokens,
+                            "completion_tokens": result.completion_tokens,
+                        }
+                    )
 
                 for warning in result.warnings:
                     st.warning(warning)
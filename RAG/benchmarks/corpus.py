@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import random
+from dataclasses import dataclass, field
+from pathlib import Path
+
+from PIL import Image, ImageDraw
+
+_SUBJECTS = [
+    "calculus", "algebra", "biology", "chemistry", "physics", "networks", "databases", "compilers",
+    "economics", "history", "statistics", "cryptography", "thermodynamics", "genetics", "robotics",
+]
+_TOPICS = [
+    "lecture", "assignment", "syllabus", "exam", "laboratory", "tutorial", "project", "seminar",
+    "deadline", "grading", "attendance", "textbook", "quiz", "module", "workshop", "elective",
+]
+_FILLER = [
+    "students", "must", "submit", "the", "report", "before", "week", "covers", "chapter", "notes",
+    "include", "derivations", "examples", "practice", "problems", "and", "solutions", "for", "each",
+    "unit", "schedule", "room", "professor", "office", "hours", "credit", "marks", "section", "review",
+]
+
+
+@dataclass(slots=True)
+class SyntheticCorpus:
+    root: Path
+    text_files: list[Path] = field(default_factory=list)
+    pdf_files: list[Path] = field(default_factory=list)
+    image_files: list[Path] = field(default_factory=list)
+    queries: list[str] = field(default_factory=list)
+
+    @property
+    def files(self) -> list[Path]:
+        return [*self.text_files, *self.pdf_files, *self.image_files]
+
+
+def _sentence(rng: random.Random) -> str:
+    code = f"M{rng.randint(20, 25)}{rng.choice(['BCS', 'MAT', 'PHY', 'ECO'])}{rng.randint(100, 599)}"
+    words = [rng.choice(_SUBJECTS), rng.choice(_TOPICS), code, *rng.choices(_FILLER, k=rng.randint(8, 18))]
+    rng.shuffle(words)
+    return " ".join(words).capitalize() + "."
+
+
+def _paragraphs(rng: random.Random, words: int) -> str:
+    sentences: list[str] = []
+    total = 0
+    while total < words:
+        sentence = _sentence(rng)
+        sentences.append(sentence)
+        total += sentence.count(" ") + 1
+    return "\n\n".join(" ".join(sentences[i : i + 5]) for i in range(0, len(sentences), 5))
+
+
+def _pdf_escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def _wrap(text: str, width: int = 90) -> list[str]:
+    lines: list[str] = []
+    for paragraph in text.split("\n"):
+        line = ""
+        for word in paragraph.split():
+            if line and len(line) + len(word) + 1 > width:
+                lines.append(line)
+                line = word
+            else:
+                line = f"{line} {word}".strip()
+        lines.append(line)
+    return lines
+
+
+def write_pdf(path: Path, pages: list[str]) -> None:
+    # Minimal PDF 1.4 writer with a built-in Helvetica font, so no PDF library is needed.
+    objects: list[bytes] = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        b"",  # page tree, filled in once the page objects are numbered
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    page_refs: list[str] = []
+    for page_text in pages:
+        lines = _wrap(page_text)[:60]
+        ops = ["BT", "/F1 10 Tf", "12 TL", "50 790 Td"] + [f"({_pdf_escape(line)}) Tj T*" for line in lines] + ["ET"]
+        stream = "\n".join(ops).encode("latin-1")
+        objects.append(b"<< /Length %d >>\nstream\n%s\nendstream" % (len(stream), stream))
+        content_ref = len(objects)
+        objects.append(
+            b"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 842] "
+            b"/Resources << /Font << /F1 3 0 R >> >> /Contents %d 0 R >>" % content_ref
+        )
+        page_refs.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(page_refs)}] /Count {len(page_refs)} >>".encode("latin-1")
+
+    out = bytearray(b"%PDF-1.4\n")
+    offsets: list[int] = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(out))
+        out += b"%d 0 obj\n%s\nendobj\n" % (number, body)
+    xref_at = len(out)
+    out += b"xref\n0 %d\n0000000000 65535 f \n" % (len(objects) + 1)
+    out += b"".join(b"%010d 00000 n \n" % offset for offset in offsets)
+    out += b"trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n" % (len(objects) + 1, xref_at)
+    path.write_bytes(bytes(out))
+
+
+def write_image(path: Path, text: str, size: tuple[int, int] = (1200, 900)) -> None:
+    image = Image.new("RGB", size, color="white")
+    draw = ImageDraw.Draw(image)
+    for row, line in enumerate(_wrap(text, width=80)[:40]):
+        draw.text((30, 30 + row * 20), line, fill="black")
+    image.save(path)
+
+
+def build_corpus(
+    root: str | Path,
+    text_files: int = 10,
+    pdf_files: int = 5,
+    pdf_pages: int = 8,
+    image_files: int = 3,
+    words_per_page: int = 400,
+    queries: int = 100,
+    seed: int = 13,
+) -> SyntheticCorpus:
+    rng = random.Random(seed)
+    corpus = SyntheticCorpus(root=Path(root))
+    corpus.root.mkdir(parents=True, exist_ok=True)
+
+    for index in range(text_files):
+        path = corpus.root / f"notes_{index:03d}.txt"
+        path.write_text(_paragraphs(rng, words_per_page * 3), encoding="utf-8")
+        corpus.text_files.append(path)
+    for index in range(pdf_files):
+        path = corpus.root / f"handbook_{index:03d}.pdf"
+        write_pdf(path, [_paragraphs(rng, words_per_page) for _ in range(pdf_pages)])
+        corpus.pdf_files.append(path)
+    for index in range(image_files):
+        path = corpus.root / f"notice_{index:03d}.png"
+        write_image(path, _paragraphs(rng, words_per_page // 2))
+        corpus.image_files.append(path)
+
+    # Queries mix subject, topic and filler words so both dense and lexical retrieval have matches.
+    corpus.queries = [
+        f"{rng.choice(_TOPICS)} {' '.join(rng.choices(_FILLER, k=3))} for {rng.choice(_SUBJECTS)}?"
+        for _ in range(queries)
+    ]
+    return corpus
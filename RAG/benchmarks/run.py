@@ -0,0 +1,323 @@
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Any, Callable, Iterator, Sequence
+
+import numpy as np
+
+from benchmarks.corpus import SyntheticCorpus, build_corpus
+from src import rag_pipeline
+from src.chunking import chunk_records
+from src.config import AppConfig
+from src.embeddings import _build_embedding_model
+from src.ingestion import extract_text_from_file
+from src.lexical_index import drop_lexical_index, get_lexical_index
+from src.llm import _groq_messages
+from src.retriever import hybrid_retrieve, retrieve
+from src.vector_store import VECTOR_BACKENDS, build_or_update_vectorstore
+
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+class HashEmbeddings:
+    # Deterministic bag-of-words hashing: offline, stable across runs, and similar texts stay close.
+    def __init__(self, size: int = 384) -> None:
+        self.size = size
+
+    def _vector(self, text: str) -> list[float]:
+        vector = np.zeros(self.size, dtype=np.float32)
+        for word in text.lower().split():
+            digest = hashlib.blake2b(word.encode("utf-8"), digest_size=8).digest()
+            bucket = int.from_bytes(digest[:4], "little") % self.size
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        norm = float(np.linalg.norm(vector)) or 1.0
+        return (vector / norm).tolist()
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._vector(text)
+
+
+def _git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=Path(__file__).resolve().parent,
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except Exception:  # noqa: BLE001
+        return "unknown"
+
+
+def _latency_summary(samples: list[float]) -> dict[str, float]:
+    values = np.asarray(samples, dtype=np.float64) * 1000.0
+    return {
+        "count": len(samples),
+        "mean_ms": float(values.mean()),
+        "p50_ms": float(np.percentile(values, 50)),
+        "p95_ms": float(np.percentile(values, 95)),
+        "p99_ms": float(np.percentile(values, 99)),
+        "max_ms": float(values.max()),
+    }
+
+
+def _measure(fn: Callable[[str], Any], queries: list[str], warmup: int = 5) -> dict[str, float]:
+    for query in queries[:warmup]:
+        fn(query)
+    samples: list[float] = []
+    for query in queries:
+        started = time.perf_counter()
+        fn(query)
+        samples.append(time.perf_counter() - started)
+    return _latency_summary(samples)
+
+
+@contextmanager
+def _stub_llm(latency_ms: float) -> Iterator[None]:
+    # Builds the real prompt so prompt assembly is measured, then waits instead of calling Groq.
+    def fake_generate(query, context_chunks, config) -> str:
+        _groq_messages(query, context_chunks)
+        if latency_ms:
+            time.sleep(latency_ms / 1000.0)
+        return "stub answer"
+
+    original = rag_pipeline.generate_with_groq
+    rag_pipeline.generate_with_groq = fake_generate
+    try:
+        yield
+    finally:
+        rag_pipeline.generate_with_groq = original
+
+
+def _bench_extraction(corpus: SyntheticCorpus) -> tuple[dict[str, Any], list[dict[str, Any]]]:
+    stages: dict[str, Any] = {}
+    records: list[dict[str, Any]] = []
+    for kind, paths in (("txt", corpus.text_files), ("pdf", corpus.pdf_files), ("image", corpus.image_files)):
+        if not paths:
+            continue
+        size = sum(path.stat().st_size for path in paths)
+        started = time.perf_counter()
+        try:
+            extracted = [record for path in paths for record in extract_text_from_file(path)]
+        except Exception as exc:  # noqa: BLE001
+            # OCR needs a local Tesseract install; report the stage as skipped rather than failing the run.
+            stages[kind] = {"skipped": str(exc)}
+            continue
+        elapsed = time.perf_counter() - started
+        records.extend(extracted)
+        stages[kind] = {
+            "files": len(paths),
+            "records": len(extracted),
+            "seconds": elapsed,
+            "files_per_s": len(paths) / elapsed,
+            "records_per_s": len(extracted) / elapsed,
+            "mb_per_s": size / 1e6 / elapsed,
+        }
+    return stages, records
+
+
+def _config(
+    persist_dir: Path,
+    backend: str,
+    retrieval_mode: str,
+    top_k: int,
+    local_embedding_model: str = "hash",
+) -> AppConfig:
+    return AppConfig(
+        openai_api_key="offline",
+        groq_api_key="offline",
+        gemini_api_key="offline",
+        embedding_provider="local",
+        local_embedding_model=local_embedding_model,
+        chroma_persist_dir=persist_dir,
+        upload_dir=persist_dir.parent / "uploads",
+        chunk_size_tokens=500,
+        chunk_overlap_tokens=50,
+        retriever_top_k=top_k,
+        retrieval_score_threshold=0.0,
+        openai_embedding_model="offline",
+        gemini_embedding_model="offline",
+        groq_model="stub",
+        gemini_model="stub",
+        retrieval_mode=retrieval_mode,
+        vector_backend=backend,
+    )
+
+
+def run_benchmarks(
+    workdir: str | Path,
+    text_files: int = 10,
+    pdf_files: int = 5,
+    pdf_pages: int = 8,
+    image_files: int = 3,
+    words_per_page: int = 400,
+    queries: int = 100,
+    backends: Sequence[str] = VECTOR_BACKENDS,
+    top_k: int = 5,
+    llm_latency_ms: float = 0.0,
+    seed: int = 13,
+    local_embedding_model: str | None = None,
+) -> dict[str, Any]:
+    workdir = Path(workdir)
+    params = {
+        "text_files": text_files,
+        "pdf_files": pdf_files,
+        "pdf_pages": pdf_pages,
+        "image_files": image_files,
+        "words_per_page": words_per_page,
+        "queries": queries,
+        "backends": list(backends),
+        "top_k": top_k,
+        "llm_latency_ms": llm_latency_ms,
+        "seed": seed,
+        "embedding": local_embedding_model or "hash",
+    }
+    corpus = build_corpus(
+        workdir / "corpus", text_files, pdf_files, pdf_pages, image_files, words_per_page, queries, seed
+    )
+    if local_embedding_model:
+        # A locally cached sentence-transformers model gives realistic embedding numbers offline.
+        embedding = _build_embedding_model(_config(workdir, "flat", "dense", top_k, local_embedding_model))
+    else:
+        embedding = HashEmbeddings()
+    stages: dict[str, Any] = {}
+
+    stages["extract"], records = _bench_extraction(corpus)
+
+    chunk_records([{"text": "warm up the tokenizer", "source_file": "warmup.txt"}])
+    started = time.perf_counter()
+    chunks = chunk_records(records)
+    elapsed = time.perf_counter() - started
+    stages["chunk"] = {
+        "records": len(records),
+        "chunks": len(chunks),
+        "seconds": elapsed,
+        "chunks_per_s": len(chunks) / elapsed if elapsed else 0.0,
+    }
+
+    texts = [chunk.text for chunk in chunks]
+    started = time.perf_counter()
+    embedding.embed_documents(texts)
+    elapsed = time.perf_counter() - started
+    stages["embed"] = {"chunks": len(texts), "seconds": elapsed, "chunks_per_s": len(texts) / elapsed}
+
+    for backend in backends:
+        persist_dir = workdir / f"db_{backend}"
+        started = time.perf_counter()
+        vectorstore = build_or_update_vectorstore(chunks, embedding, persist_dir, backend=backend)
+        elapsed = time.perf_counter() - started
+        lexical_index = get_lexical_index(persist_dir)
+        dense_config = _config(persist_dir, backend, "dense", top_k)
+        hybrid_config = _config(persist_dir, backend, "hybrid", top_k)
+
+        with _stub_llm(llm_latency_ms):
+            stages[backend] = {
+                # Includes embedding every chunk, BM25 indexing and the backend write.
+                "index": {"chunks": len(chunks), "seconds": elapsed, "chunks_per_s": len(chunks) / elapsed},
+                "retrieve_dense": _measure(lambda q: retrieve(q, vectorstore, k=top_k), corpus.queries),
+                "retrieve_hybrid": _measure(
+                    lambda q: hybrid_retrieve(q, vectorstore, lexical_index, k=top_k), corpus.queries
+                ),
+                "answer_dense": _measure(
+                    lambda q: rag_pipeline.answer_query(q, vectorstore, dense_config), corpus.queries
+                ),
+                "answer_hybrid": _measure(
+                    lambda q: rag_pipeline.answer_query(q, vectorstore, hybrid_config), corpus.queries
+                ),
+            }
+        drop_lexical_index(persist_dir)
+
+    return {
+        "meta": {
+            "commit": _git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "params": params,
+        },
+        "stages": stages,
+    }
+
+
+def _flatten(node: Any, prefix: str = "") -> dict[str, float]:
+    if isinstance(node, dict):
+        flat: dict[str, float] = {}
+        for key, value in node.items():
+            flat.update(_flatten(value, f"{prefix}.{key}" if prefix else key))
+        return flat
+    return {prefix: node} if isinstance(node, (int, float)) and not isinstance(node, bool) else {}
+
+
+def compare(current: dict[str, Any], baseline: dict[str, Any]) -> list[str]:
+    # Relative change of every throughput and latency number that both runs recorded.
+    now, before = _flatten(current["stages"]), _flatten(baseline["stages"])
+    lines: list[str] = []
+    for key in sorted(now.keys() & before.keys()):
+        if not key.endswith(("_per_s", "_ms")) or not before[key]:
+            continue
+        change = (now[key] - before[key]) / before[key] * 100.0
+        lines.append(f"{key:<45} {before[key]:>12.3f} -> {now[key]:>12.3f} ({change:+.1f}%)")
+    return lines
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Offline ingestion and query benchmarks.")
+    parser.add_argument("--text-files", type=int, default=10)
+    parser.add_argument("--pdf-files", type=int, default=5)
+    parser.add_argument("--pdf-pages", type=int, default=8)
+    parser.add_argument("--image-files", type=int, default=3)
+    parser.add_argument("--words-per-page", type=int, default=400)
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--backends", default=",".join(VECTOR_BACKENDS))
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=0.0, help="Simulated LLM latency per answer")
+    parser.add_argument("--seed", type=int, default=13)
+    parser.add_argument("--local-embedding-model", default=None, help="Cached sentence-transformers model to embed with")
+    parser.add_argument("--output", type=Path, default=None, help="Default: benchmarks/results/<commit>.json")
+    parser.add_argument("--baseline", type=Path, default=None, help="Earlier results file to compare against")
+    args = parser.parse_args(argv)
+
+    with tempfile.TemporaryDirectory(prefix="rag-bench-") as workdir:
+        results = run_benchmarks(
+            workdir,
+            text_files=args.text_files,
+            pdf_files=args.pdf_files,
+            pdf_pages=args.pdf_pages,
+            image_files=args.image_files,
+            words_per_page=args.words_per_page,
+            queries=args.queries,
+            backends=[name.strip() for name in args.backends.split(",") if name.strip()],
+            top_k=args.top_k,
+            llm_latency_ms=args.llm_latency_ms,
+            seed=args.seed,
+            local_embedding_model=args.local_embedding_model,
+        )
+
+    output = args.output or RESULTS_DIR / f"{results['meta']['commit'][:12]}.json"
+    output.parent.mkdir(parents=True, exist_ok=True)
+    output.write_text(json.dumps(results, indent=2), encoding="utf-8")
+    print(json.dumps(results["stages"], indent=2))
+    print(f"Results written to {output}")
+    if args.baseline:
+        print("\n".join(compare(results, json.loads(args.baseline.read_text(encoding="utf-8")))))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
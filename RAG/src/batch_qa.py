@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from itertools import islice
+from pathlib import Path
+from typing import Any, AsyncIterator, Iterable, Iterator, Sequence
+
+from src.citations import source_to_record
+from src.config import AppConfig
+from src.embeddings import get_embedding_model
+from src.index_versions import active_index_dir
+from src.models import RAGAnswer
+from src.rag_pipeline import answer_query, dense_fetch_k
+from src.retrieval_cache import RetrievalCache
+from src.retriever import retrieve_many
+from src.vector_store import get_index_version, load_vectorstore
+
+
+@dataclass(slots=True)
+class BatchQuestion:
+    question: str
+    id: Any = None
+    images: list[str] = field(default_factory=list)
+
+
+def read_questions(path: str | Path) -> Iterator[BatchQuestion]:
+    with Path(path).open("r", encoding="utf-8") as handle:
+        for line_number, line in enumerate(handle, start=1):
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError as exc:
+                raise ValueError(f"{path}:{line_number}: invalid JSON ({exc.msg})") from exc
+            if not isinstance(record, dict):
+                record = {"question": record}
+            question = record.get("question") or record.get("query")
+            if not isinstance(question, str) or not question.strip():
+                raise ValueError(f"{path}:{line_number}: expected a 'question' field")
+            yield BatchQuestion(question=question, id=record.get("id"), images=list(record.get("images") or []))
+
+
+def answer_to_record(item: BatchQuestion, answer: RAGAnswer) -> dict[str, Any]:
+    return {
+        "id": item.id,
+        "question": item.question,
+        "answer": answer.answer_text,
+        "used_model": answer.used_model,
+        "warnings": answer.warnings,
+        "sources": [source_to_record(result) for result in answer.sources],
+    }
+
+
+def _prefetch(queries: list[str], vectorstore, config: AppConfig, cache: RetrievalCache) -> None:
+    try:
+        retrieve_many(
+            queries,
+            vectorstore,
+            k=dense_fetch_k(config),
+            cache=cache,
+            index_version=get_index_version(config.chroma_persist_dir),
+        )
+    except Exception:  # noqa: BLE001
+        # Each question retries retrieval on its own path and reports its own error.
+        pass
+
+
+def _answer_one(item: BatchQuestion, vectorstore, config: AppConfig, cache: RetrievalCache) -> RAGAnswer:
+    try:
+        return answer_query(
+            item.question,
+            vectorstore,
+            config,
+            use_multimodal=bool(item.images),
+            images=item.images or None,
+            cache=cache,
+        )
+    except Exception as exc:  # noqa: BLE001
+        # One failed generation should not abort a whole question bank.
+        return RAGAnswer(answer_text="", sources=[], used_model="none", warnings=[f"Failed to answer: {exc}"])
+
+
+async def answer_batch(
+    questions: Iterable[BatchQuestion],
+    vectorstore,
+    config: AppConfig,
+    concurrency: int | None = None,
+    window: int = 64,
+    cache: RetrievalCache | None = None,
+) -> AsyncIterator[tuple[BatchQuestion, RAGAnswer]]:
+    cache = cache or RetrievalCache()
+    workers = max(1, concurrency or config.batch_concurrency)
+    loop = asyncio.get_running_loop()
+    items = iter(questions)
+    pending: deque[tuple[BatchQuestion, asyncio.Future[RAGAnswer]]] = deque()
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        while chunk := list(islice(items, window)):
+            # Embed the window in one call and search it in one vectorized pass; the
+            # per-question pipeline below then finds its dense hits in the cache.
+            queries = [item.question for item in chunk]
+            await loop.run_in_executor(executor, _prefetch, queries, vectorstore, config, cache)
+            for item in chunk:
+                future = loop.run_in_executor(executor, _answer_one, item, vectorstore, config, cache)
+                pending.append((item, future))
+            # Emit finished answers in input order, and keep at most two windows in flight.
+            while pending and (len(pending) > window or pending[0][1].done()):
+                item, future = pending.popleft()
+                yield item, await future
+
+        while pending:
+            item, future = pending.popleft()
+            yield item, await future
+
+
+async def _run(
+    input_path: Path,
+    output_path: Path,
+    vectorstore,
+    config: AppConfig,
+    concurrency: int | None,
+) -> int:
+    written = 0
+    with output_path.open("w", encoding="utf-8") as handle:
+        async for item, answer in answer_batch(read_questions(input_path), vectorstore, config, concurrency):
+            handle.write(json.dumps(answer_to_record(item, answer), ensure_ascii=False) + "\n")
+            handle.flush()
+            written += 1
+    return written
+
+
+def run_batch(
+    input_path: str | Path,
+    output_path: str | Path,
+    vectorstore,
+    config: AppConfig,
+    concurrency: int | None = None,
+) -> int:
+    return asyncio.run(_run(Path(input_path), Path(output_path), vectorstore, config, concurrency))
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Answer a JSONL file of questions against the indexed documents.")
+    parser.add_argument("input", help="JSONL file with one {\"question\": ...} object per line")
+    parser.add_argument("output", help="JSONL file to write answers to, in input order")
+    parser.add_argument("--concurrency", type=int, default=None, help="Parallel LLM calls (default BATCH_CONCURRENCY)")
+    args = parser.parse_args(argv)
+
+    config = AppConfig.from_env()
+    vectorstore = load_vectorstore(
+        active_index_dir(config.chroma_persist_dir),
+        get_embedding_model(config),
+        config.vector_backend,
+        config.vector_quantization,
+        config.rescore_candidates,
+    )
+    written = run_batch(args.input, args.output, vectorstore, config, args.concurrency)
+    print(f"Wrote {written} answers to {args.output}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
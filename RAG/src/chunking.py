@@ -1,22 +1,92 @@
 from __future__ import annotations
 
+from functools import lru_cache
+from itertools import accumulate
 from typing import Any
 
-from langchain_text_splitters import RecursiveCharacterTextSplitter
+import tiktoken
 
 from src.models import DocumentChunk
 from src.utils import sha1_text
 
+# Bumped whenever chunk boundaries or ids change; part of every chunk id.
+CHUNKER_VERSION = 2
+DEFAULT_ENCODING = "gpt2"
+
+
+@lru_cache(maxsize=None)
+def _get_encoding(encoding_name: str) -> tiktoken.Encoding:
+    return tiktoken.get_encoding(encoding_name)
+
+
+class TokenChunker:
+    def __init__(self, chunk_size_tokens: int, overlap_tokens: int, encoding_name: str = DEFAULT_ENCODING) -> None:
+        if chunk_size_tokens <= 0:
+            raise ValueError("chunk_size_tokens must be positive")
+        if not 0 <= overlap_tokens < chunk_size_tokens:
+            raise ValueError("overlap_tokens must be in [0, chunk_size_tokens)")
+        self.chunk_size_tokens = chunk_size_tokens
+        self.overlap_tokens = overlap_tokens
+        self.encoding = _get_encoding(encoding_name)
+
+    def _char_offsets(self, text: str, tokens: list[int], boundaries: list[int]) -> dict[int, int]:
+        # Map token boundaries to character offsets by decoding only the bytes between
+        # consecutive boundaries, which keeps this linear in the record length.
+        byte_offsets = list(accumulate(map(len, self.encoding.decode_tokens_bytes(tokens)), initial=0))
+        data = text.encode("utf-8")
+
+        mapping: dict[int, int] = {}
+        prev_byte = 0
+        prev_char = 0
+        for boundary in sorted(set(boundaries)):
+            byte_pos = byte_offsets[boundary]
+            # Snap forward past UTF-8 continuation bytes when a token splits a character.
+            while byte_pos < len(data) and data[byte_pos] & 0xC0 == 0x80:
+                byte_pos += 1
+            prev_char += len(data[prev_byte:byte_pos].decode("utf-8"))
+            prev_byte = byte_pos
+            mapping[boundary] = prev_char
+        return mapping
+
+    def split(self, text: str) -> list[tuple[str, int, int]]:
+        # Encode once, then cut windows by token offsets instead of re-counting tokens per piece.
+        tokens = self.encoding.encode_ordinary(text)
+        if not tokens:
+            return []
+
+        total = len(tokens)
+        windows: list[tuple[int, int]] = []
+        start = 0
+        while True:
+            end = min(start + self.chunk_size_tokens, total)
+            windows.append((start, end))
+            if end >= total:
+                break
+            start = end - self.overlap_tokens
+
+        offsets = self._char_offsets(text, tokens, [pos for window in windows for pos in window])
+        pieces: list[tuple[str, int, int]] = []
+        for start, end in windows:
+            char_start, char_end = offsets[start], offsets[end]
+            raw = text[char_start:char_end]
+            stripped = raw.strip()
+            if stripped:
+                char_start += len(raw) - len(raw.lstrip())
+                pieces.append((stripped, char_start, char_start + len(stripped)))
+        return pieces
+
+
+@lru_cache(maxsize=32)
+def get_chunker(chunk_size_tokens: int, overlap_tokens: int) -> TokenChunker:
+    return TokenChunker(chunk_size_tokens, overlap_tokens)
+
 
 def chunk_records(
     records: list[dict[str, Any]],
     chunk_size_tokens: int = 500,
     overlap_tokens: int = 50,
 ) -> list[DocumentChunk]:
-    splitter = RecursiveCharacterTextSplitter.from_tiktoken_encoder(
-        chunk_size=chunk_size_tokens,
-        chunk_overlap=overlap_tokens,
-    )
+    chunker = get_chunker(chunk_size_tokens, overlap_tokens)
 
     output: list[DocumentChunk] = []
 
@@ -28,14 +98,16 @@ def chunk_records(
         source_file = record.get("source_file", "unknown")
         page_number = record.get("page_number")
 
-        pieces = splitter.split_text(text)
-        for idx, piece in enumerate(pieces):
+        for idx, (piece, char_start, char_end) in enumerate(chunker.split(text)):
             metadata = {
                 "source_file": source_file,
                 "page_number": page_number,
                 "chunk_index": idx,
+                "char_start": char_start,
+                "char_end": char_end,
+                "chunker_version": CHUNKER_VERSION,
             }
-            chunk_id = sha1_text(f"{source_file}|{page_number}|{idx}|{piece}")
+            chunk_id = sha1_text(f"v{CHUNKER_VERSION}|{source_file}|{page_number}|{idx}|{piece}")
             output.append(
                 DocumentChunk(
                     id=chunk_id,
@@ -1,12 +1,42 @@
 from __future__ import annotations
 
+from typing import Any
+
 from src.models import RetrievalResult
 
 
+def _chunk_label(result: RetrievalResult) -> str:
+    # Packed passages can span a run of adjacent chunks.
+    indices = result.chunk.metadata.get("chunk_indices")
+    if indices and len(indices) > 1:
+        return f"{indices[0]}-{indices[-1]}"
+    return str(result.chunk.chunk_index)
+
+
+def _location(source: dict[str, Any]) -> str:
+    page = source.get("page_number")
+    return f"{source.get('source_file')} | page={page if page is not None else 'n/a'}"
+
+
 def format_source_reference(index: int, result: RetrievalResult, preview_chars: int = 220) -> str:
     page = result.chunk.page_number if result.chunk.page_number is not None else "n/a"
     snippet = result.chunk.text.strip().replace("\n", " ")[:preview_chars]
+    also_in = "".join(f"\nAlso in: {_location(other)}" for other in result.chunk.metadata.get("also_in", []))
     return (
         f"S{index} | {result.chunk.source_file} | page={page} | "
-        f"chunk={result.chunk.chunk_index} | score={result.score:.3f}\n{snippet}"
+        f"chunk={_chunk_label(result)} | score={result.score:.3f}{also_in}\n{snippet}"
     )
+
+
+def source_to_record(result: RetrievalResult) -> dict[str, Any]:
+    return {
+        "source_file": result.chunk.source_file,
+        "page_number": result.chunk.page_number,
+        "chunk_index": result.chunk.chunk_index,
+        "chunk_indices": result.chunk.metadata.get("chunk_indices", [result.chunk.chunk_index]),
+        "score": result.score,
+        # Other files holding the same passage, recorded when ingest deduplicated it.
+        "also_in": result.chunk.metadata.get("also_in", []),
+        # Set when the answer came from a fan-out over named collections.
+        "collection": result.chunk.metadata.get("collection"),
+    }
@@ -24,6 +24,46 @@ class AppConfig:
     gemini_embedding_model: str
     groq_model: str
     gemini_model: str
+    embedding_cache_dir: Path = Path("data/embedding_cache")
+    embedding_cache_max_mb: int = 512
+    gemini_embedding_batch_size: int = 100
+    gemini_embedding_workers: int = 4
+    gemini_embedding_rpm: int = 1500
+    extraction_workers: int | None = None
+    pdf_pages_per_task: int = 16
+    retrieval_cache_size: int = 1024
+    retrieval_cache_ttl_seconds: float = 600.0
+    gemini_upload_workers: int = 4
+    gemini_upload_max_side: int = 2048
+    retrieval_mode: str = "dense"
+    rrf_k: int = 60
+    rerank_enabled: bool = False
+    rerank_model: str = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+    rerank_candidates: int = 20
+    rerank_batch_size: int = 32
+    vector_backend: str = "chroma"
+    vector_quantization: str = "none"
+    rescore_candidates: int = 200
+    batch_concurrency: int = 4
+    trace_log_path: Path | None = None
+    metrics_port: int = 0
+    warmup_on_start: bool = False
+    service_workers: int = 8
+    service_max_inflight: int = 64
+    service_max_pending_ingest: int = 4
+    ingest_jobs_db: Path = Path("data/ingest_jobs.sqlite3")
+    context_token_budget: int = 3000
+    context_dedup_threshold: float = 0.8
+    dedup_enabled: bool = True
+    dedup_max_distance: int = 3
+    ocr_cache_dir: Path | None = Path("data/ocr_cache")
+    ocr_max_side: int = 2000
+    ocr_target_dpi: int = 300
+    ocr_deskew: bool = True
+    index_retire_grace_seconds: float = 30.0
+    shard_workers: int = 4
+    shard_score_normalization: str = "none"
+    ingest_job_lease_seconds: float = 60.0
 
     @classmethod
     def from_env(cls) -> "AppConfig":
@@ -47,6 +87,9 @@ class AppConfig:
         upload_dir = Path(os.getenv("UPLOAD_DIR", "data/uploads"))
         chroma_persist_dir.mkdir(parents=True, exist_ok=True)
         upload_dir.mkdir(parents=True, exist_ok=True)
+        extraction_workers = os.getenv("EXTRACTION_WORKERS", "").strip()
+        trace_log_path = os.getenv("TRACE_LOG_PATH", "").strip()
+        ocr_cache_dir = os.getenv("OCR_CACHE_DIR", "data/ocr_cache").strip()
 
         return cls(
             openai_api_key=openai_api_key,
@@ -66,4 +109,44 @@ class AppConfig:
             gemini_embedding_model=os.getenv("GEMINI_EMBEDDING_MODEL", "models/embedding-001"),
             groq_model=os.getenv("GROQ_MODEL", "llama-3.3-70b-versatile"),
             gemini_model=os.getenv("GEMINI_MODEL", "gemini-1.5-flash"),
+            embedding_cache_dir=Path(os.getenv("EMBEDDING_CACHE_DIR", "data/embedding_cache")),
+            embedding_cache_max_mb=int(os.getenv("EMBEDDING_CACHE_MAX_MB", "512")),
+            gemini_embedding_batch_size=int(os.getenv("GEMINI_EMBEDDING_BATCH_SIZE", "100")),
+            gemini_embedding_workers=int(os.getenv("GEMINI_EMBEDDING_WORKERS", "4")),
+            gemini_embedding_rpm=int(os.getenv("GEMINI_EMBEDDING_RPM", "1500")),
+            extraction_workers=int(extraction_workers) if extraction_workers else None,
+            pdf_pages_per_task=int(os.getenv("PDF_PAGES_PER_TASK", "16")),
+            retrieval_cache_size=int(os.getenv("RETRIEVAL_CACHE_SIZE", "1024")),
+            retrieval_cache_ttl_seconds=float(os.getenv("RETRIEVAL_CACHE_TTL_SECONDS", "600")),
+            gemini_upload_workers=int(os.getenv("GEMINI_UPLOAD_WORKERS", "4")),
+            gemini_upload_max_side=int(os.getenv("GEMINI_UPLOAD_MAX_SIDE", "2048")),
+            retrieval_mode=os.getenv("RETRIEVAL_MODE", "dense").strip().lower(),
+            rrf_k=int(os.getenv("RRF_K", "60")),
+            rerank_enabled=os.getenv("RERANK_ENABLED", "false").strip().lower() in {"1", "true", "yes"},
+            rerank_model=os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"),
+            rerank_candidates=int(os.getenv("RERANK_CANDIDATES", "20")),
+            rerank_batch_size=int(os.getenv("RERANK_BATCH_SIZE", "32")),
+            vector_backend=os.getenv("VECTOR_BACKEND", "chroma").strip().lower(),
+            vector_quantization=os.getenv("VECTOR_QUANTIZATION", "none").strip().lower(),
+            rescore_candidates=int(os.getenv("RESCORE_CANDIDATES", "200")),
+            batch_concurrency=int(os.getenv("BATCH_CONCURRENCY", "4")),
+            trace_log_path=Path(trace_log_path) if trace_log_path else None,
+            metrics_port=int(os.getenv("METRICS_PORT", "0")),
+            warmup_on_start=os.getenv("WARMUP_ON_START", "false").strip().lower() in {"1", "true", "yes"},
+            service_workers=int(os.getenv("SERVICE_WORKERS", "8")),
+            service_max_inflight=int(os.getenv("SERVICE_MAX_INFLIGHT", "64")),
+            service_max_pending_ingest=int(os.getenv("SERVICE_MAX_PENDING_INGEST", "4")),
+            ingest_jobs_db=Path(os.getenv("INGEST_JOBS_DB", "data/ingest_jobs.sqlite3")),
+            context_token_budget=int(os.getenv("CONTEXT_TOKEN_BUDGET", "3000")),
+            context_dedup_threshold=float(os.getenv("CONTEXT_DEDUP_THRESHOLD", "0.8")),
+            dedup_enabled=os.getenv("DEDUP_ENABLED", "true").strip().lower() in {"1", "true", "yes"},
+            dedup_max_distance=int(os.getenv("DEDUP_MAX_DISTANCE", "3")),
+            ocr_cache_dir=Path(ocr_cache_dir) if ocr_cache_dir else None,
+            ocr_max_side=int(os.getenv("OCR_MAX_SIDE", "2000")),
+            ocr_target_dpi=int(os.getenv("OCR_TARGET_DPI", "300")),
+            ocr_deskew=os.getenv("OCR_DESKEW", "true").strip().lower() in {"1", "true", "yes"},
+            index_retire_grace_seconds=float(os.getenv("INDEX_RETIRE_GRACE_SECONDS", "30")),
+            shard_workers=int(os.getenv("SHARD_WORKERS", "4")),
+            shard_score_normalization=os.getenv("SHARD_SCORE_NORMALIZATION", "none").strip().lower(),
+            ingest_job_lease_seconds=float(os.getenv("INGEST_JOB_LEASE_SECONDS", "60")),
         )
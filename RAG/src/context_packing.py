@@ -0,0 +1,149 @@
+from __future__ import annotations
+
+import re
+from collections import defaultdict
+
+from src.chunking import DEFAULT_ENCODING, _get_encoding
+from src.models import DocumentChunk, RetrievalResult
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def _overlap_length(left: str, right: str) -> int:
+    # Fallback for chunks without character offsets: longest suffix of left that prefixes right.
+    limit = min(len(left), len(right)) // 2
+    for size in range(limit, 0, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def _tail(left: RetrievalResult, right: RetrievalResult) -> str:
+    # The part of right that left does not already contain.
+    left_end = left.chunk.metadata.get("char_end")
+    right_start = right.chunk.metadata.get("char_start")
+    if isinstance(left_end, int) and isinstance(right_start, int):
+        if right_start >= left_end:
+            return f" {right.chunk.text}"
+        # Chunk text is exactly record[char_start:char_end], so the overlap is a plain slice.
+        return right.chunk.text[left_end - right_start :]
+    return right.chunk.text[_overlap_length(left.chunk.text, right.chunk.text) :]
+
+
+def _merge_run(run: list[RetrievalResult]) -> RetrievalResult:
+    if len(run) == 1:
+        return run[0]
+    text = run[0].chunk.text + "".join(_tail(previous, current) for previous, current in zip(run, run[1:]))
+    first, last = run[0].chunk, run[-1].chunk
+    metadata = {
+        **first.metadata,
+        "chunk_ids": [result.chunk.id for result in run],
+        "chunk_indices": [result.chunk.chunk_index for result in run],
+    }
+    if "char_end" in last.metadata:
+        metadata["char_end"] = last.metadata["char_end"]
+    chunk = DocumentChunk(
+        id=first.id,
+        text=text,
+        source_file=first.source_file,
+        page_number=first.page_number,
+        chunk_index=first.chunk_index,
+        metadata=metadata,
+    )
+    return RetrievalResult(chunk=chunk, score=max(result.score for result in run))
+
+
+def merge_adjacent(results: list[RetrievalResult]) -> list[RetrievalResult]:
+    groups: dict[tuple[str | None, str, int | None], list[RetrievalResult]] = defaultdict(list)
+    seen: set[str] = set()
+    for result in results:
+        if result.chunk.id in seen:
+            continue
+        seen.add(result.chunk.id)
+        # Same-named files in two collections are different documents.
+        key = (result.chunk.metadata.get("collection"), result.chunk.source_file, result.chunk.page_number)
+        groups[key].append(result)
+
+    merged: list[RetrievalResult] = []
+    for group in groups.values():
+        group.sort(key=lambda result: result.chunk.chunk_index)
+        run = [group[0]]
+        for result in group[1:]:
+            if result.chunk.chunk_index == run[-1].chunk.chunk_index + 1:
+                run.append(result)
+            else:
+                merged.append(_merge_run(run))
+                run = [result]
+        merged.append(_merge_run(run))
+    merged.sort(key=lambda result: result.score, reverse=True)
+    return merged
+
+
+def _shingles(text: str, size: int = 3) -> set[tuple[str, ...]]:
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < size:
+        return {tuple(words)} if words else set()
+    return {tuple(words[i : i + size]) for i in range(len(words) - size + 1)}
+
+
+def drop_near_duplicates(results: list[RetrievalResult], threshold: float = 0.8) -> list[RetrievalResult]:
+    # Results arrive best-first, so the higher-scored copy of a repeated passage is the one kept.
+    kept: list[RetrievalResult] = []
+    kept_shingles: list[set[tuple[str, ...]]] = []
+    for result in results:
+        shingles = _shingles(result.chunk.text)
+        duplicate = False
+        for other in kept_shingles:
+            union = len(shingles | other)
+            if union and len(shingles & other) / union >= threshold:
+                duplicate = True
+                break
+        if not duplicate:
+            kept.append(result)
+            kept_shingles.append(shingles)
+    return kept
+
+
+def _truncated(result: RetrievalResult, tokens: list[int], budget: int) -> RetrievalResult:
+    text = _get_encoding(DEFAULT_ENCODING).decode(tokens[:budget])
+    chunk = result.chunk
+    metadata = {**chunk.metadata, "truncated": True}
+    return RetrievalResult(
+        chunk=DocumentChunk(chunk.id, text, chunk.source_file, chunk.page_number, chunk.chunk_index, metadata),
+        score=result.score,
+    )
+
+
+def fit_token_budget(results: list[RetrievalResult], token_budget: int) -> list[RetrievalResult]:
+    if token_budget <= 0:
+        return results
+    encoding = _get_encoding(DEFAULT_ENCODING)
+    packed: list[RetrievalResult] = []
+    remaining = token_budget
+    for result in results:
+        tokens = encoding.encode_ordinary(result.chunk.text)
+        if len(tokens) <= remaining:
+            packed.append(result)
+            remaining -= len(tokens)
+        elif not packed:
+            # Never send an empty context: cut the best passage down to the budget instead.
+            packed.append(_truncated(result, tokens, remaining))
+            remaining = 0
+        # Otherwise skip it and keep trying lower-scored but shorter passages.
+        if remaining <= 0:
+            break
+    return packed
+
+
+def pack_context(
+    results: list[RetrievalResult],
+    token_budget: int = 3000,
+    dedup_threshold: float = 0.8,
+) -> list[RetrievalResult]:
+    # Each packed result is one cited passage ([S1], [S2], ...) and one entry in the answer's sources.
+    if not results:
+        return results
+    packed = merge_adjacent(results)
+    if dedup_threshold < 1.0:
+        packed = drop_near_duplicates(packed, dedup_threshold)
+    return fit_token_budget(packed, token_budget)
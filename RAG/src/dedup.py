@@ -0,0 +1,294 @@
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import re
+import threading
+from dataclasses import dataclass, field, replace
+from pathlib import Path
+from typing import Any
+
+import numpy as np
+
+from src.models import DocumentChunk, RetrievalResult
+from src.scope import RetrievalScope
+from src.utils import file_lock, file_signature
+
+DEDUP_INDEX_FILENAME = "dedup_index.json"
+SIMHASH_BITS = 64
+
+_WORD_RE = re.compile(r"\w+")
+_BIT_WEIGHTS = np.uint64(1) << np.arange(SIMHASH_BITS, dtype=np.uint64)
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    words = _WORD_RE.findall(text.lower())
+    if not words:
+        return 0
+    shingles = {" ".join(words[i : i + shingle_size]) for i in range(max(1, len(words) - shingle_size + 1))}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "little") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    # One row per shingle, one column per bit: each shingle votes +1 or -1 on every bit.
+    bits = ((hashes[:, None] >> np.arange(SIMHASH_BITS, dtype=np.uint64)) & np.uint64(1)).astype(np.int32)
+    votes = (2 * bits - 1).sum(axis=0)
+    return int(_BIT_WEIGHTS[votes > 0].sum())
+
+
+def _member(chunk: DocumentChunk) -> list[Any]:
+    return [chunk.id, chunk.source_file, chunk.page_number, chunk.chunk_index]
+
+
+@dataclass(slots=True)
+class DedupPlan:
+    # Chunks to embed and store, the signatures of the new canonicals among them, and the
+    # (chunk, canonical id) pairs that will be recorded as aliases instead of stored.
+    unique: list[DocumentChunk] = field(default_factory=list)
+    canonicals: dict[str, int] = field(default_factory=dict)
+    aliases: list[tuple[DocumentChunk, str]] = field(default_factory=list)
+
+
+class DedupIndex:
+    def __init__(self, max_distance: int = 3) -> None:
+        self.max_distance = max_distance
+        # Pigeonhole: two signatures within max_distance bits agree exactly on at least one of
+        # max_distance + 1 bands, so band lookups find every candidate without a full scan.
+        bands = max_distance + 1
+        width = SIMHASH_BITS // bands
+        self._bands = [(i * width, SIMHASH_BITS if i == bands - 1 else (i + 1) * width) for i in range(bands)]
+        self.signatures: dict[str, int] = {}
+        # canonical id -> every chunk (canonical included) whose text it stands for.
+        self.members: dict[str, list[list[Any]]] = {}
+        self.aliases: dict[str, str] = {}
+        # source file -> ids of its chunks that are aliases, so scoped retrieval can find them.
+        self._aliases_by_file: dict[str, set[str]] = {}
+        self._buckets: dict[tuple[int, int], set[str]] = {}
+        self._lock = threading.RLock()
+        # The saved file this copy was read from or last wrote, and the commit/release calls made since.
+        # A save that finds the file replaced by another writer replays them onto the newer copy.
+        self._signature: tuple[int, int, int] | None = None
+        self._journal: list[tuple[str, Any]] = []
+
+    def __len__(self) -> int:
+        return len(self.signatures)
+
+    def _band_keys(self, signature: int) -> list[tuple[int, int]]:
+        return [(i, (signature >> start) & ((1 << (end - start)) - 1)) for i, (start, end) in enumerate(self._bands)]
+
+    def _add_canonical(self, chunk_id: str, signature: int) -> None:
+        self.signatures[chunk_id] = signature
+        for key in self._band_keys(signature):
+            self._buckets.setdefault(key, set()).add(chunk_id)
+
+    def _remove_canonical(self, chunk_id: str) -> None:
+        signature = self.signatures.pop(chunk_id)
+        for key in self._band_keys(signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(chunk_id)
+                if not bucket:
+                    del self._buckets[key]
+        self.members.pop(chunk_id, None)
+
+    def _nearest(self, signature: int) -> tuple[int, str] | None:
+        best: tuple[int, str] | None = None
+        for key in self._band_keys(signature):
+            for candidate in self._buckets.get(key, ()):
+                distance = (self.signatures[candidate] ^ signature).bit_count()
+                if distance <= self.max_distance and (best is None or distance < best[0]):
+                    best = (distance, candidate)
+        return best
+
+    def find(self, signature: int) -> str | None:
+        with self._lock:
+            best = self._nearest(signature)
+            return best[1] if best else None
+
+    def plan(self, chunks: list[DocumentChunk]) -> DedupPlan:
+        # Decides which chunks need embedding without registering anything; commit() records the
+        # decisions once their vectors are stored, so a failed write leaves no canonical behind.
+        plan = DedupPlan()
+        # Canonicals this batch introduces, so near-duplicates within one batch alias each other.
+        pending = DedupIndex(self.max_distance)
+        with self._lock:
+            for chunk in chunks:
+                if chunk.id in self.signatures or chunk.id in pending.signatures:
+                    plan.unique.append(chunk)
+                    continue
+                if chunk.id in self.aliases:
+                    continue
+                signature = simhash(chunk.text)
+                matches = [match for match in (self._nearest(signature), pending._nearest(signature)) if match]
+                if matches:
+                    plan.aliases.append((chunk, min(matches)[1]))
+                    continue
+                pending._add_canonical(chunk.id, signature)
+                plan.canonicals[chunk.id] = signature
+                plan.unique.append(chunk)
+        return plan
+
+    def commit(self, plan: DedupPlan) -> None:
+        with self._lock:
+            self._journal.append(("commit", plan))
+            for chunk in plan.unique:
+                if chunk.id not in self.signatures:
+                    signature = plan.canonicals.get(chunk.id)
+                    self._add_canonical(chunk.id, simhash(chunk.text) if signature is None else signature)
+                members = self.members.setdefault(chunk.id, [])
+                if all(member[0] != chunk.id for member in members):
+                    members.insert(0, _member(chunk))
+            for chunk, canonical in plan.aliases:
+                if chunk.id in self.aliases:
+                    continue
+                self.aliases[chunk.id] = canonical
+                self.members.setdefault(canonical, []).append(_member(chunk))
+                self._aliases_by_file.setdefault(chunk.source_file, set()).add(chunk.id)
+
+    def release(self, chunk_ids: list[str]) -> list[str]:
+        # Drops references and returns the ids whose vectors can now be deleted. A canonical chunk
+        # stays stored while other files still alias it; it just stops citing the removed file.
+        removable: list[str] = []
+        with self._lock:
+            self._journal.append(("release", list(chunk_ids)))
+            for chunk_id in chunk_ids:
+                canonical = self.aliases.pop(chunk_id, None)
+                if canonical is not None:
+                    for member in self.members.get(canonical, []):
+                        if member[0] == chunk_id:
+                            self._aliases_by_file.get(member[1], set()).discard(chunk_id)
+                    self._drop_member(canonical, chunk_id)
+                    if not self.members.get(canonical):
+                        self._remove_canonical(canonical)
+                        removable.append(canonical)
+                    continue
+                if chunk_id not in self.signatures:
+                    removable.append(chunk_id)
+                    continue
+                self._drop_member(chunk_id, chunk_id)
+                if not self.members.get(chunk_id):
+                    self._remove_canonical(chunk_id)
+                    removable.append(chunk_id)
+        return removable
+
+    def _drop_member(self, canonical: str, chunk_id: str) -> None:
+        members = self.members.get(canonical, [])
+        self.members[canonical] = [member for member in members if member[0] != chunk_id]
+
+    def scope_aliases(self, scope: RetrievalScope) -> frozenset[str]:
+        # Stored chunks that stand for text in a scoped file under another file's name. Their rows
+        # carry the other file, so the scope admits them by id (see RetrievalScope.alias_ids).
+        if scope.source_files is None:
+            return frozenset()
+        found: set[str] = set()
+        with self._lock:
+            for source_file in scope.source_files:
+                for alias_id in self._aliases_by_file.get(source_file, ()):
+                    canonical = self.aliases[alias_id]
+                    member = next((m for m in self.members.get(canonical, []) if m[0] == alias_id), None)
+                    if member is not None and scope.matches_page(member[2]):
+                        found.add(canonical)
+        return frozenset(found)
+
+    def sources(self, chunk_id: str) -> list[list[Any]]:
+        with self._lock:
+            return [list(member) for member in self.members.get(chunk_id, [])]
+
+    def _rebase(self, base: "DedupIndex") -> None:
+        # Replays this copy's unsaved calls onto `base`, the newer saved index, and takes its state.
+        for operation, argument in self._journal:
+            getattr(base, operation)(argument)
+        self.max_distance, self._bands, self._buckets = base.max_distance, base._bands, base._buckets
+        self.signatures, self.members, self.aliases = base.signatures, base.members, base.aliases
+        self._aliases_by_file = base._aliases_by_file
+
+    def _is_stale(self, path: Path) -> bool:
+        # Safe to replace with the saved file: it changed since this copy read it, and nothing here is unsaved.
+        return not self._journal and file_signature(path) != self._signature
+
+    def save(self, persist_dir: str | Path) -> None:
+        path = Path(persist_dir) / DEDUP_INDEX_FILENAME
+        with self._lock, file_lock(path.with_name(path.name + ".lock")):
+            if file_signature(path) != self._signature:
+                # Another writer (process or stale cached copy) saved since this copy was read.
+                self._rebase(DedupIndex.load(persist_dir, self.max_distance))
+            payload = {
+                "version": 1,
+                "max_distance": self.max_distance,
+                "signatures": self.signatures,
+                "members": self.members,
+                "aliases": self.aliases,
+            }
+            tmp_path = path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(payload), encoding="utf-8")
+            os.replace(tmp_path, path)
+            self._signature = file_signature(path)
+            self._journal = []
+
+    @classmethod
+    def load(cls, persist_dir: str | Path, max_distance: int = 3) -> "DedupIndex":
+        path = Path(persist_dir) / DEDUP_INDEX_FILENAME
+        # Taken before reading: a replace in between leaves this copy marked stale, never wrongly current.
+        signature = file_signature(path)
+        if signature is None:
+            return cls(max_distance)
+        data = json.loads(path.read_text(encoding="utf-8"))
+        index = cls(int(data.get("max_distance", max_distance)))
+        for chunk_id, signature in data.get("signatures", {}).items():
+            index._add_canonical(chunk_id, int(signature))
+        index.members = {key: [list(member) for member in value] for key, value in data.get("members", {}).items()}
+        index.aliases = dict(data.get("aliases", {}))
+        for canonical_members in index.members.values():
+            for member in canonical_members:
+                if member[0] in index.aliases:
+                    index._aliases_by_file.setdefault(member[1], set()).add(member[0])
+        index._signature = signature
+        return index
+
+
+def annotate_sources(results: list[RetrievalResult], index: DedupIndex) -> list[RetrievalResult]:
+    # A stored chunk may stand for the same text in several files. Cite the first live source
+    # and list the others, so deduplication never hides where a passage appears.
+    if not len(index):
+        return results
+    output: list[RetrievalResult] = []
+    for result in results:
+        members = index.sources(result.chunk.id)
+        if len(members) <= 1 and (not members or members[0][1] == result.chunk.source_file):
+            output.append(result)
+            continue
+        chunk = result.chunk
+        metadata = {**chunk.metadata}
+        own = next((member for member in members if member[1] == chunk.source_file), None)
+        if own is None:
+            # The file this vector was first stored for is gone; cite a file that still has the text.
+            own = members[0]
+            chunk = replace(chunk, source_file=own[1], page_number=own[2], chunk_index=own[3])
+            metadata.update(source_file=own[1], page_number=own[2], chunk_index=own[3])
+            # Offsets belonged to the original file and would mislead context packing.
+            metadata.pop("char_start", None)
+            metadata.pop("char_end", None)
+        metadata["also_in"] = [{"source_file": m[1], "page_number": m[2]} for m in members if m is not own]
+        output.append(RetrievalResult(chunk=replace(chunk, metadata=metadata), score=result.score))
+    return output
+
+
+_INDEXES: dict[str, DedupIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_dedup_index(persist_dir: str | Path, max_distance: int = 3) -> DedupIndex:
+    key = str(Path(persist_dir).resolve())
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        # Picks up saves from other processes; a copy with unsaved changes merges them when it saves.
+        if index is None or index._is_stale(Path(persist_dir) / DEDUP_INDEX_FILENAME):
+            index = _INDEXES[key] = DedupIndex.load(persist_dir, max_distance)
+        return index
+
+
+def drop_dedup_index(persist_dir: str | Path) -> None:
+    with _INDEXES_LOCK:
+        _INDEXES.pop(str(Path(persist_dir).resolve()), None)
@@ -0,0 +1,144 @@
+from __future__ import annotations
+
+import sqlite3
+import threading
+import time
+from array import array
+from pathlib import Path
+from typing import Any
+
+from src.utils import sha1_text
+
+_SQLITE_MAX_PARAMS = 500
+
+
+def embed_queries(model: Any, texts: list[str]) -> list[list[float]]:
+    # Providers with a batched query path expose embed_queries; others embed one query at a time.
+    batched = getattr(model, "embed_queries", None)
+    if batched is not None:
+        return batched(texts)
+    return [model.embed_query(text) for text in texts]
+
+
+class CachedEmbeddings:
+    def __init__(
+        self,
+        model: Any,
+        provider: str,
+        model_name: str,
+        cache_dir: str | Path,
+        max_bytes: int = 512 * 1024 * 1024,
+    ) -> None:
+        self.model = model
+        self.provider = provider
+        self.model_name = model_name
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(cache_path / "embeddings.sqlite3"), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "key TEXT PRIMARY KEY, vector BLOB NOT NULL, nbytes INTEGER NOT NULL, last_used REAL NOT NULL)"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings(last_used)")
+        self._conn.commit()
+
+    def __getattr__(self, name: str) -> Any:
+        # Only reached for attributes not defined here; expose the wrapped backend's.
+        if name == "model":
+            raise AttributeError(name)
+        return getattr(self.model, name)
+
+    def _key(self, text: str, task_type: str) -> str:
+        return sha1_text(f"{self.provider}|{self.model_name}|{task_type}|{sha1_text(text)}")
+
+    def _lookup(self, keys: list[str]) -> dict[str, list[float]]:
+        found: dict[str, list[float]] = {}
+        unique_keys = list(dict.fromkeys(keys))
+        with self._lock:
+            for start in range(0, len(unique_keys), _SQLITE_MAX_PARAMS):
+                batch = unique_keys[start : start + _SQLITE_MAX_PARAMS]
+                placeholders = ",".join("?" * len(batch))
+                rows = self._conn.execute(
+                    f"SELECT key, vector FROM embeddings WHERE key IN ({placeholders})", batch
+                ).fetchall()
+                for key, blob in rows:
+                    vector = array("f")
+                    vector.frombytes(blob)
+                    found[key] = vector.tolist()
+            if found:
+                now = time.time()
+                self._conn.executemany(
+                    "UPDATE embeddings SET last_used = ? WHERE key = ?", [(now, key) for key in found]
+                )
+                self._conn.commit()
+        return found
+
+    def _store(self, items: dict[str, list[float]]) -> None:
+        now = time.time()
+        rows = []
+        for key, vector in items.items():
+            blob = array("f", vector).tobytes()
+            rows.append((key, blob, len(blob), now))
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings (key, vector, nbytes, last_used) VALUES (?, ?, ?, ?)", rows
+            )
+            self._evict()
+            self._conn.commit()
+
+    def _evict(self) -> None:
+        total = self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        # Evict least recently used entries down to 90% of the budget to avoid churning on every insert.
+        target = int(self.max_bytes * 0.9)
+        cursor = self._conn.execute("SELECT key, nbytes FROM embeddings ORDER BY last_used ASC")
+        doomed: list[tuple[str]] = []
+        for key, nbytes in cursor:
+            if total <= target:
+                break
+            doomed.append((key,))
+            total -= nbytes
+        self._conn.executemany("DELETE FROM embeddings WHERE key = ?", doomed)
+
+    def _embed_cached(self, texts: list[str], task_type: str, embed_misses) -> list[list[float]]:
+        keys = [self._key(text, task_type) for text in texts]
+        found = self._lookup(keys)
+
+        missing: dict[str, str] = {}
+        for key, text in zip(keys, texts):
+            if key not in found and key not in missing:
+                missing[key] = text
+        self.hits += len(texts) - len(missing)
+        self.misses += len(missing)
+
+        if missing:
+            vectors = embed_misses(list(missing.values()))
+            computed = {key: list(vector) for key, vector in zip(missing, vectors)}
+            self._store(computed)
+            found.update(computed)
+
+        return [found[key] for key in keys]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed_cached(texts, "document", self.model.embed_documents)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self._embed_cached([text], "query", lambda misses: [self.model.embed_query(misses[0])])[0]
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        if not texts:
+            return []
+        return self._embed_cached(texts, "query", lambda misses: embed_queries(self.model, misses))
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
@@ -1,33 +1,98 @@
 from __future__ import annotations
 
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import Any
 
-import google.generativeai as genai
-from langchain_community.embeddings import HuggingFaceEmbeddings
-from langchain_openai import OpenAIEmbeddings
-
 from src.config import AppConfig
+from src.embedding_cache import CachedEmbeddings
+
+
+class TokenBucket:
+    def __init__(self, rate_per_second: float, capacity: float | None = None) -> None:
+        self.rate = rate_per_second
+        self.capacity = capacity if capacity is not None else max(1.0, rate_per_second)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, tokens: float = 1.0) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+def _is_quota_error(exc: Exception) -> bool:
+    text = f"{type(exc).__name__} {exc}".lower()
+    return any(marker in text for marker in ("429", "quota", "resourceexhausted", "resource exhausted", "rate limit"))
 
 
 class GeminiEmbeddings:
-    def __init__(self, api_key: str, model: str) -> None:
+    def __init__(
+        self,
+        api_key: str,
+        model: str,
+        batch_size: int = 100,
+        max_workers: int = 4,
+        requests_per_minute: int = 1500,
+        max_retries: int = 5,
+        backoff_seconds: float = 1.0,
+        client: Any = None,
+    ) -> None:
         self.model = model
-        genai.configure(api_key=api_key)
+        self.batch_size = max(1, batch_size)
+        self.max_workers = max(1, max_workers)
+        self.max_retries = max_retries
+        self.backoff_seconds = backoff_seconds
+        self.rate_limiter = TokenBucket(requests_per_minute / 60.0)
+        if client is None:
+            import google.generativeai as genai
 
-    def _embed(self, text: str, task_type: str) -> list[float]:
+            genai.configure(api_key=api_key)
+            client = genai
+        self.client = client
+
+    def _models_to_try(self) -> list[str]:
         models_to_try = [self.model]
         if self.model != "models/embedding-001":
             models_to_try.append("models/embedding-001")
+        return models_to_try
 
-        last_error: Exception | None = None
-        for model_name in models_to_try:
+    def _request(self, model_name: str, texts: list[str], task_type: str) -> list[list[float]]:
+        for attempt in range(self.max_retries + 1):
+            self.rate_limiter.acquire()
             try:
-                response: Any = genai.embed_content(
+                response: Any = self.client.embed_content(
                     model=model_name,
-                    content=text,
+                    content=texts,
                     task_type=task_type,
                 )
-                return response["embedding"]
+                embeddings = response["embedding"]
+                if len(embeddings) != len(texts):
+                    raise RuntimeError(f"Expected {len(texts)} embeddings, got {len(embeddings)}")
+                return embeddings
+            except Exception as exc:  # noqa: BLE001
+                if not _is_quota_error(exc) or attempt == self.max_retries:
+                    raise
+                time.sleep(self.backoff_seconds * (2**attempt))
+        raise AssertionError("unreachable")
+
+    def _embed_batch(self, texts: list[str], task_type: str) -> list[list[float]]:
+        # The fallback model is chosen once for the whole batch, not per text.
+        last_error: Exception | None = None
+        for model_name in self._models_to_try():
+            try:
+                return self._request(model_name, texts, task_type)
             except Exception as exc:  # noqa: BLE001
                 last_error = exc
                 continue
@@ -37,17 +102,35 @@ class GeminiEmbeddings:
             f"Last error: {last_error}"
         )
 
+    def _embed(self, text: str, task_type: str) -> list[float]:
+        return self._embed_batch([text], task_type)[0]
+
+    def _embed_many(self, texts: list[str], task_type: str) -> list[list[float]]:
+        batches = [texts[i : i + self.batch_size] for i in range(0, len(texts), self.batch_size)]
+        if len(batches) <= 1 or self.max_workers == 1:
+            results = [self._embed_batch(batch, task_type) for batch in batches]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(batches))) as pool:
+                results = list(pool.map(lambda batch: self._embed_batch(batch, task_type), batches))
+        return [vector for batch in results for vector in batch]
+
     def embed_documents(self, texts: list[str]) -> list[list[float]]:
-        return [self._embed(text, "retrieval_document") for text in texts]
+        return self._embed_many(texts, "retrieval_document")
 
     def embed_query(self, text: str) -> list[float]:
         return self._embed(text, "retrieval_query")
 
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        return self._embed_many(texts, "retrieval_query")
 
-def get_embedding_model(config: AppConfig) -> Any:
+
+def _build_embedding_model(config: AppConfig) -> Any:
+    # Provider SDKs are imported on demand so unused providers cost nothing at startup.
     if config.embedding_provider == "openai":
         if not config.openai_api_key:
             raise ValueError("OPENAI_API_KEY is required when EMBEDDING_PROVIDER=openai")
+        from langchain_openai import OpenAIEmbeddings
+
         return OpenAIEmbeddings(
             api_key=config.openai_api_key,
             model=config.openai_embedding_model,
@@ -58,9 +141,35 @@ def get_embedding_model(config: AppConfig) -> Any:
         return GeminiEmbeddings(
             api_key=config.gemini_api_key,
             model=config.gemini_embedding_model,
+            batch_size=config.gemini_embedding_batch_size,
+            max_workers=config.gemini_embedding_workers,
+            requests_per_minute=config.gemini_embedding_rpm,
         )
     if config.embedding_provider == "local":
+        from langchain_community.embeddings import HuggingFaceEmbeddings
+
         return HuggingFaceEmbeddings(model_name=config.local_embedding_model)
     raise ValueError(
         "Invalid EMBEDDING_PROVIDER. Use one of: local, gemini, openai."
     )
+
+
+def _embedding_model_name(config: AppConfig) -> str:
+    if config.embedding_provider == "openai":
+        return config.openai_embedding_model
+    if config.embedding_provider == "gemini":
+        return config.gemini_embedding_model
+    return config.local_embedding_model
+
+
+def get_embedding_model(config: AppConfig) -> Any:
+    model = _build_embedding_model(config)
+    if config.embedding_cache_max_mb <= 0:
+        return model
+    return CachedEmbeddings(
+        model,
+        provider=config.embedding_provider,
+        model_name=_embedding_model_name(config),
+        cache_dir=config.embedding_cache_dir,
+        max_bytes=config.embedding_cache_max_mb * 1024 * 1024,
+    )
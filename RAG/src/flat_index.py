@@ -0,0 +1,555 @@
+from __future__ import annotations
+
+import json
+import os
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Iterator
+
+import numpy as np
+from langchain_core.documents import Document
+
+from src.scope import RetrievalScope
+
+FLAT_INDEX_DIRNAME = "flat"
+QUANTIZATION_MODES = ("none", "int8", "binary")
+_VECTORS_FILENAME = "vectors.f32"
+_ROWS_FILENAME = "rows.sqlite3"
+# Written by stores from before rows.sqlite3; imported on first open.
+_LEGACY_META_FILENAME = "meta.json"
+_DATA_FILE_PATTERN = re.compile(r"^(vectors|codes|scales)(?:\.(\d+))?\.(f32|i8|bits)$")
+_SEARCH_BLOCK_ROWS = 16384
+_SQLITE_BATCH = 500
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)",
+    # One row per vector-file row. The scope columns are copies of metadata fields for scoped search.
+    "CREATE TABLE IF NOT EXISTS rows ("
+    "row INTEGER PRIMARY KEY, id TEXT NOT NULL, document TEXT NOT NULL, metadata TEXT NOT NULL, "
+    "alive INTEGER NOT NULL DEFAULT 1, source_file TEXT, page_number REAL, uploaded_at REAL)",
+)
+
+
+def _number(value: Any) -> float:
+    return float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else np.nan
+
+
+def _nullable(value: Any) -> float | None:
+    number = _number(value)
+    return None if np.isnan(number) else number
+
+
+def _generation_name(filename: str, generation: int) -> str:
+    # Generation 0 keeps the original names, so indexes written before compaction generations open as-is.
+    if generation == 0:
+        return filename
+    stem, _, suffix = filename.rpartition(".")
+    return f"{stem}.{generation}.{suffix}"
+
+
+def _write_rows(path: Path, array: np.ndarray, start: int) -> None:
+    # Writes at the committed row count, overwriting and trimming rows a failed write left behind.
+    row_bytes = array.dtype.itemsize * (array.shape[1] if array.ndim > 1 else 1)
+    path.touch(exist_ok=True)
+    with path.open("r+b") as handle:
+        handle.seek(start * row_bytes)
+        handle.write(np.ascontiguousarray(array).tobytes())
+        handle.truncate()
+        handle.flush()
+        os.fsync(handle.fileno())
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return (matrix / norms).astype(np.float32)
+
+
+def _quantize_int8(vectors: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    # Symmetric per-row scale so each row uses the full int8 range.
+    max_abs = np.abs(vectors).max(axis=1, keepdims=True)
+    max_abs[max_abs == 0] = 1.0
+    codes = np.rint(vectors / max_abs * 127.0).astype(np.int8)
+    return codes, (max_abs[:, 0] / 127.0).astype(np.float32)
+
+
+def _quantize_binary(vectors: np.ndarray) -> np.ndarray:
+    return np.packbits(vectors > 0, axis=1)
+
+
+class FlatVectorStore:
+    def __init__(
+        self,
+        embedding_function: Any,
+        persist_directory: str | Path,
+        quantization: str = "none",
+        rescore_candidates: int = 200,
+    ) -> None:
+        if quantization not in QUANTIZATION_MODES:
+            raise ValueError(f"Invalid VECTOR_QUANTIZATION. Use one of: {', '.join(QUANTIZATION_MODES)}.")
+        self._embedding_function = embedding_function
+        self.path = Path(persist_directory) / FLAT_INDEX_DIRNAME
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.quantization = quantization
+        self.rescore_candidates = rescore_candidates
+        self._lock = threading.RLock()
+        self._dim = 0
+        # Committed row count and data file generation. Rows past the count in the data files are
+        # leftovers of a write that never committed; they are never mapped.
+        self._rows = 0
+        self._generation = 0
+        self._alive = np.zeros(0, dtype=bool)
+        self._row_of: dict[str, int] = {}
+        self._arrays: dict[str, np.ndarray] = {}
+        # Secondary metadata index for scoped search, rebuilt lazily after rows change.
+        self._columns: tuple[dict[str, int], np.ndarray, np.ndarray, np.ndarray] | None = None
+        # SQLite's data_version when the fields above were last read; None forces a reload.
+        self._data_version: int | None = None
+        # Autocommit, with explicit transactions: writes take BEGIN IMMEDIATE themselves.
+        self._conn = sqlite3.connect(
+            str(self.path / _ROWS_FILENAME), timeout=30.0, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        self._load()
+
+    @property
+    def embeddings(self) -> Any:
+        return self._embedding_function
+
+    @property
+    def _matrix(self) -> np.ndarray | None:
+        return self._arrays.get("vectors")
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._refresh()
+            return len(self._row_of)
+
+    def _layout(self, dim: int | None = None) -> dict[str, tuple[str, Any, int]]:
+        # name -> (filename, dtype, values per row) for every row-aligned file on disk.
+        dim = self._dim if dim is None else dim
+        layout: dict[str, tuple[str, Any, int]] = {"vectors": (_VECTORS_FILENAME, np.float32, dim)}
+        if self.quantization == "int8":
+            layout["codes"] = ("codes.i8", np.int8, dim)
+            layout["scales"] = ("scales.f32", np.float32, 1)
+        elif self.quantization == "binary":
+            layout["codes"] = ("codes.bits", np.uint8, (dim + 7) // 8)
+        return layout
+
+    def _data_path(self, filename: str, generation: int | None = None) -> Path:
+        return self.path / _generation_name(filename, self._generation if generation is None else generation)
+
+    def _encode(self, vectors: np.ndarray) -> dict[str, np.ndarray]:
+        encoded = {"vectors": vectors}
+        if self.quantization == "int8":
+            encoded["codes"], encoded["scales"] = _quantize_int8(vectors)
+        elif self.quantization == "binary":
+            encoded["codes"] = _quantize_binary(vectors)
+        return encoded
+
+    def _read_meta(self) -> dict[str, Any]:
+        return {key: json.loads(value) for key, value in self._conn.execute("SELECT key, value FROM meta")}
+
+    def _write_meta(self, **values: Any) -> None:
+        # Callers run this inside the transaction that changes the rows it describes.
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)",
+            [(key, json.dumps(value)) for key, value in values.items()],
+        )
+
+    @staticmethod
+    def _row_values(row: int, chunk_id: str, document: str, metadata: dict[str, Any], alive: bool = True) -> tuple:
+        return (
+            row,
+            chunk_id,
+            document,
+            json.dumps(metadata),
+            int(alive),
+            str(metadata.get("source_file")),
+            _nullable(metadata.get("page_number")),
+            _nullable(metadata.get("uploaded_at")),
+        )
+
+    def _import_legacy_meta(self) -> None:
+        legacy_path = self.path / _LEGACY_META_FILENAME
+        if not legacy_path.exists():
+            return
+        with self._writing():
+            if not self._read_meta():
+                meta = json.loads(legacy_path.read_text(encoding="utf-8"))
+                self._conn.executemany(
+                    "INSERT OR REPLACE INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    [
+                        self._row_values(row, chunk_id, document, metadata, alive)
+                        for row, (chunk_id, document, metadata, alive) in enumerate(
+                            zip(meta["ids"], meta["documents"], meta["metadatas"], meta["alive"])
+                        )
+                    ],
+                )
+                self._write_meta(
+                    dim=int(meta["dim"]),
+                    quantization=meta.get("quantization", "none"),
+                    rows=len(meta["ids"]),
+                    generation=0,
+                )
+        legacy_path.unlink(missing_ok=True)
+
+    def _load(self) -> None:
+        with self._lock:
+            self._import_legacy_meta()
+            if self._read_meta().get("quantization", self.quantization) != self.quantization:
+                with self._writing():
+                    self._rewrite_codes()
+            self._refresh()
+            self._remove_generations_before(self._generation)
+
+    @contextmanager
+    def _writing(self) -> Iterator[None]:
+        # BEGIN IMMEDIATE takes the database's write lock, shared by every handle in every process, so a
+        # write starts from the latest commit and nothing else can commit until it is done.
+        # Callers hold self._lock.
+        self._conn.execute("BEGIN IMMEDIATE")
+        try:
+            self._refresh()
+            yield
+            self._conn.execute("COMMIT")
+        except BaseException:
+            self._conn.execute("ROLLBACK")
+            # In-memory state may be ahead of what was rolled back; reload it on next use.
+            self._data_version = None
+            raise
+
+    def _refresh(self) -> None:
+        # Reloads the row map when another connection (a second handle, here or in another process) has
+        # committed since it was read. data_version is a per-connection counter, so checking is cheap.
+        while True:
+            version = self._conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return
+            try:
+                self._reload()
+            except FileNotFoundError:
+                # A compaction committed and removed the generation that was just read; read again.
+                if self._conn.execute("PRAGMA data_version").fetchone()[0] == version:
+                    raise
+                continue
+            self._data_version = version
+
+    def _reload(self) -> None:
+        # Meta and rows come from one read snapshot unless a write transaction already provides it.
+        snapshot = not self._conn.in_transaction
+        if snapshot:
+            self._conn.execute("BEGIN")
+        try:
+            meta = self._read_meta()
+            self._dim = int(meta.get("dim", 0))
+            self._rows = int(meta.get("rows", 0))
+            self._generation = int(meta.get("generation", 0))
+            self._alive = np.zeros(self._rows, dtype=bool)
+            self._row_of = {}
+            for row, chunk_id in self._conn.execute(
+                "SELECT row, id FROM rows WHERE alive = 1 AND row < ?", (self._rows,)
+            ):
+                self._row_of[chunk_id] = row
+                self._alive[row] = True
+            # Codes for another quantization mode are not on disk yet; _rewrite_codes writes and maps them.
+            if meta.get("quantization", self.quantization) == self.quantization:
+                self._open_arrays()
+            else:
+                self._arrays = {}
+                self._columns = None
+        finally:
+            if snapshot:
+                self._conn.execute("COMMIT")
+
+    def _remove_generations_before(self, generation: int) -> None:
+        # Best effort: another process may still have an old generation mapped (Windows refuses then).
+        # Newer generations are left alone; one may be a compaction another process has yet to commit.
+        for path in self.path.iterdir():
+            match = _DATA_FILE_PATTERN.match(path.name)
+            if match and int(match.group(2) or 0) < generation:
+                try:
+                    path.unlink()
+                except OSError:
+                    pass
+
+    def _open_arrays(self) -> None:
+        self._arrays = {}
+        self._columns = None
+        if self._rows == 0 or self._dim == 0:
+            return
+        # Read-only memmaps: opening is O(1) and pages are shared through the OS page cache.
+        for name, (filename, dtype, width) in self._layout().items():
+            self._arrays[name] = np.memmap(self._data_path(filename), dtype=dtype, mode="r", shape=(self._rows, width))
+
+    def _rewrite_codes(self) -> None:
+        # Re-derive quantized codes from the full-precision vectors when the mode changes. The new
+        # mode is recorded only once its codes are complete on disk.
+        vectors = np.fromfile(
+            self._data_path(_VECTORS_FILENAME), dtype=np.float32, count=self._rows * self._dim
+        ).reshape(self._rows, self._dim)
+        for name, array in self._encode(vectors).items():
+            if name != "vectors":
+                _write_rows(self._data_path(self._layout()[name][0]), array, 0)
+        self._write_meta(quantization=self.quantization)
+        self._open_arrays()
+
+    def _compact(self) -> None:
+        # Written as a new file generation and switched to in one transaction: the files readers have
+        # mapped are never replaced, and a crash before the commit leaves the old generation intact.
+        keep = np.flatnonzero(self._alive)
+        generation = self._generation + 1
+        for name, (filename, dtype, width) in self._layout().items():
+            array = self._arrays.get(name)
+            kept = np.array(array[keep]) if array is not None else np.zeros((0, width), dtype=dtype)
+            _write_rows(self._data_path(filename, generation), kept, 0)
+        moves = [(new, int(old)) for new, old in enumerate(keep) if new != old]
+        self._conn.execute("DELETE FROM rows WHERE alive = 0 OR row >= ?", (self._rows,))
+        # Ascending order never collides: each target row is free by the time it is reached.
+        self._conn.executemany("UPDATE rows SET row = ? WHERE row = ?", moves)
+        self._write_meta(rows=len(keep), generation=generation)
+        id_at = {row: chunk_id for chunk_id, row in self._row_of.items()}
+        self._row_of = {id_at[int(old)]: new for new, old in enumerate(keep)}
+        self._alive = np.ones(len(keep), dtype=bool)
+        self._rows = len(keep)
+        self._generation = generation
+        self._open_arrays()
+
+    def _maybe_compact(self) -> None:
+        # Its own transaction, after the write that triggered it has committed.
+        if len(self._alive) and (~self._alive).sum() > 0.3 * len(self._alive):
+            with self._writing():
+                self._compact()
+            self._remove_generations_before(self._generation)
+
+    def add_embeddings(
+        self,
+        texts: list[str],
+        embeddings: list[list[float]],
+        metadatas: list[dict[str, Any]],
+        ids: list[str],
+    ) -> list[str]:
+        if not ids:
+            return []
+        vectors = _normalize(np.asarray(embeddings, dtype=np.float32))
+        with self._lock:
+            with self._writing():
+                dim = self._dim or vectors.shape[1]
+                if vectors.shape[1] != dim:
+                    raise ValueError(f"Embedding dimension {vectors.shape[1]} does not match index dimension {dim}")
+                start = self._rows
+                # Serialized first, so a bad payload fails before anything is written.
+                values = [
+                    self._row_values(start + offset, chunk_id, text, metadata)
+                    for offset, (chunk_id, text, metadata) in enumerate(zip(ids, texts, metadatas))
+                ]
+                replaced = [self._row_of[chunk_id] for chunk_id in ids if chunk_id in self._row_of]
+                layout = self._layout(dim)
+                for name, array in self._encode(vectors).items():
+                    _write_rows(self._data_path(layout[name][0]), array, start)
+                # The commit is what makes the rows exist: until then readers map only the first `start`.
+                self._conn.executemany("UPDATE rows SET alive = 0 WHERE row = ?", [(row,) for row in replaced])
+                self._conn.execute("DELETE FROM rows WHERE row >= ?", (start,))
+                self._conn.executemany("INSERT INTO rows VALUES (?, ?, ?, ?, ?, ?, ?, ?)", values)
+                self._write_meta(
+                    dim=dim, quantization=self.quantization, rows=start + len(ids), generation=self._generation
+                )
+                self._dim = dim
+                self._rows = start + len(ids)
+                self._alive[replaced] = False
+                self._alive = np.concatenate([self._alive, np.ones(len(ids), dtype=bool)])
+                for offset, chunk_id in enumerate(ids):
+                    self._row_of[chunk_id] = start + offset
+                self._open_arrays()
+            self._maybe_compact()
+        return ids
+
+    def add_documents(self, documents: list[Document], ids: list[str] | None = None) -> list[str]:
+        ids = ids or [str((doc.metadata or {}).get("id")) for doc in documents]
+        texts = [doc.page_content for doc in documents]
+        embeddings = self._embedding_function.embed_documents(texts)
+        return self.add_embeddings(texts, embeddings, [dict(doc.metadata or {}) for doc in documents], ids)
+
+    def delete(self, ids: list[str] | None = None, **kwargs: Any) -> None:
+        with self._lock:
+            with self._writing():
+                rows = [self._row_of[chunk_id] for chunk_id in ids or [] if chunk_id in self._row_of]
+                if not rows:
+                    return
+                self._conn.executemany("UPDATE rows SET alive = 0 WHERE row = ?", [(row,) for row in rows])
+                for chunk_id in ids:
+                    self._row_of.pop(chunk_id, None)
+                self._alive[rows] = False
+            self._maybe_compact()
+
+    def _payloads(self, rows: list[int]) -> dict[int, tuple[str, str, dict[str, Any]]]:
+        # Texts and metadata are read per result rather than held in memory for the whole corpus.
+        found: dict[int, tuple[str, str, dict[str, Any]]] = {}
+        for start in range(0, len(rows), _SQLITE_BATCH):
+            batch = rows[start : start + _SQLITE_BATCH]
+            placeholders = ", ".join("?" * len(batch))
+            for row, chunk_id, document, metadata in self._conn.execute(
+                f"SELECT row, id, document, metadata FROM rows WHERE row IN ({placeholders})", batch
+            ):
+                found[row] = (chunk_id, document, json.loads(metadata))
+        return found
+
+    def get(self, ids: str | list[str] | None = None, include: list[str] | None = None, **kwargs: Any) -> dict:
+        with self._lock:
+            self._refresh()
+            if ids is None:
+                rows = sorted(self._row_of.values())
+            else:
+                wanted = [ids] if isinstance(ids, str) else ids
+                rows = [self._row_of[chunk_id] for chunk_id in wanted if chunk_id in self._row_of]
+            payloads = self._payloads([int(row) for row in rows])
+            return {
+                "ids": [payloads[row][0] for row in rows],
+                "documents": [payloads[row][1] for row in rows],
+                "metadatas": [payloads[row][2] for row in rows],
+            }
+
+    def _select_relevance_score_fn(self) -> Callable[[float], float]:
+        # Distances are 1 - cosine similarity.
+        return lambda distance: 1.0 - distance
+
+    def _metadata_columns(self) -> tuple[dict[str, int], np.ndarray, np.ndarray, np.ndarray]:
+        # Row-aligned columns (file code, page, upload time; NaN when missing) so a scope
+        # becomes a handful of vectorized comparisons instead of a pass over metadata dicts.
+        if self._columns is None:
+            files: dict[str, int] = {}
+            file_codes = np.full(self._rows, -1, dtype=np.int32)
+            pages = np.full(self._rows, np.nan, dtype=np.float64)
+            uploaded = np.full(self._rows, np.nan, dtype=np.float64)
+            for row, source_file, page, uploaded_at in self._conn.execute(
+                "SELECT row, source_file, page_number, uploaded_at FROM rows WHERE row < ?", (self._rows,)
+            ):
+                file_codes[row] = files.setdefault(source_file, len(files))
+                pages[row] = np.nan if page is None else page
+                uploaded[row] = np.nan if uploaded_at is None else uploaded_at
+            self._columns = (files, file_codes, pages, uploaded)
+        return self._columns
+
+    def _scope_rows(self, scope: RetrievalScope) -> np.ndarray:
+        files, file_codes, pages, uploaded = self._metadata_columns()
+        located = np.ones(self._rows, dtype=bool)
+        if scope.source_files is not None:
+            located &= np.isin(file_codes, [files[name] for name in scope.source_files if name in files])
+        # Comparisons against NaN are False, so rows missing a field fall outside any bound on it.
+        if scope.page_min is not None:
+            located &= pages >= scope.page_min
+        if scope.page_max is not None:
+            located &= pages <= scope.page_max
+        located[[self._row_of[chunk_id] for chunk_id in scope.alias_ids if chunk_id in self._row_of]] = True
+        mask = self._alive & located
+        if scope.uploaded_after is not None:
+            mask &= uploaded >= scope.uploaded_after
+        if scope.uploaded_before is not None:
+            mask &= uploaded < scope.uploaded_before
+        return np.flatnonzero(mask)
+
+    def _approximate_scores(self, query: np.ndarray, rows: np.ndarray | None = None) -> np.ndarray:
+        codes = self._arrays["codes"] if rows is None else self._arrays["codes"][rows]
+        scores = np.empty(len(codes), dtype=np.float32)
+        if self.quantization == "int8":
+            query_codes, _ = _quantize_int8(query[None, :])
+            query_codes = query_codes[0].astype(np.float32)
+            scales = self._arrays["scales"][:, 0] if rows is None else self._arrays["scales"][rows, 0]
+        else:
+            query_bits = _quantize_binary(query[None, :])[0]
+        # Blockwise so the widened temporaries stay small regardless of corpus size.
+        for start in range(0, len(codes), _SEARCH_BLOCK_ROWS):
+            block = codes[start : start + _SEARCH_BLOCK_ROWS]
+            if self.quantization == "int8":
+                scores[start : start + len(block)] = (block.astype(np.float32) @ query_codes) * scales[
+                    start : start + len(block)
+                ]
+            else:
+                hamming = _POPCOUNT[np.bitwise_xor(block, query_bits)].sum(axis=1, dtype=np.int32)
+                scores[start : start + len(block)] = -hamming
+        return scores
+
+    def _top_rows(self, query: np.ndarray, k: int, rows: np.ndarray | None = None) -> tuple[np.ndarray, np.ndarray]:
+        # Search the compact codes, then rescore a few hundred candidates with the float rows.
+        approx = self._approximate_scores(query, rows)
+        if rows is None:
+            approx[~self._alive] = -np.inf
+        candidate_count = min(max(self.rescore_candidates, k), len(self._row_of) if rows is None else len(rows))
+        candidates = np.sort(np.argpartition(-approx, candidate_count - 1)[:candidate_count])
+        if rows is not None:
+            candidates = rows[candidates]
+        exact = np.asarray(self._arrays["vectors"][candidates]) @ query
+        top = np.argpartition(-exact, k - 1)[:k]
+        return candidates[top], exact[top]
+
+    def _ranked(self, rows: np.ndarray, scores: np.ndarray) -> list[tuple[Document, float]]:
+        order = np.argsort(-scores, kind="stable")
+        payloads = self._payloads([int(row) for row in rows])
+        return [
+            (
+                Document(page_content=payloads[int(row)][1], metadata=payloads[int(row)][2]),
+                float(1.0 - score),
+            )
+            for row, score in zip(rows[order], scores[order])
+        ]
+
+    def similarity_search_by_vector_with_relevance_scores(
+        self, embedding: list[float], k: int = 4, scope: RetrievalScope | None = None, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        return self.similarity_search_by_vectors_with_relevance_scores([embedding], k=k, scope=scope)[0]
+
+    def _scoped_search(
+        self, queries: np.ndarray, k: int, scope: RetrievalScope
+    ) -> list[list[tuple[Document, float]]]:
+        rows = self._scope_rows(scope)
+        if not len(rows):
+            return [[] for _ in queries]
+        k = min(k, len(rows))
+        if self.quantization != "none" and len(rows) > self.rescore_candidates:
+            return [self._ranked(*self._top_rows(query, k, rows)) for query in queries]
+        # Small scopes skip the codes entirely: gather just those float rows and score them exactly.
+        scores = np.asarray(self._arrays["vectors"][rows]) @ queries.T
+        output: list[list[tuple[Document, float]]] = []
+        for column in scores.T:
+            top = np.argpartition(-column, k - 1)[:k]
+            output.append(self._ranked(rows[top], column[top]))
+        return output
+
+    def similarity_search_by_vectors_with_relevance_scores(
+        self, embeddings: list[list[float]], k: int = 4, scope: RetrievalScope | None = None
+    ) -> list[list[tuple[Document, float]]]:
+        with self._lock:
+            self._refresh()
+            if not self._arrays or not self._row_of:
+                return [[] for _ in embeddings]
+            queries = _normalize(np.asarray(embeddings, dtype=np.float32))
+            if scope is not None:
+                return self._scoped_search(queries, k, scope)
+            k = min(k, len(self._row_of))
+            if self.quantization != "none":
+                return [self._ranked(*self._top_rows(query, k)) for query in queries]
+
+            # Score every query in one (rows x dim) @ (dim x queries) product.
+            scores = np.asarray(self._arrays["vectors"] @ queries.T)
+            scores[~self._alive] = -np.inf
+            output: list[list[tuple[Document, float]]] = []
+            for column in scores.T:
+                top = np.argpartition(-column, k - 1)[:k]
+                output.append(self._ranked(top, column[top]))
+            return output
+
+    def similarity_search_with_relevance_scores(
+        self, query: str, k: int = 4, **kwargs: Any
+    ) -> list[tuple[Document, float]]:
+        embedding = self._embedding_function.embed_query(query)
+        relevance_fn = self._select_relevance_score_fn()
+        return [
+            (doc, relevance_fn(distance))
+            for doc, distance in self.similarity_search_by_vector_with_relevance_scores(embedding, k=k)
+        ]
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from PIL import Image
+
+from src.utils import sha1_file, sha1_text
+
+# Gemini keeps uploaded files for 48 hours; assume slightly less when the handle has no expiry.
+DEFAULT_TTL_SECONDS = 46 * 3600
+EXPIRY_MARGIN_SECONDS = 600
+
+
+@dataclass(slots=True)
+class _CachedUpload:
+    handle: Any
+    expires_at: float
+
+
+def _expires_at(handle: Any, uploaded_at: float) -> float:
+    expiration = getattr(handle, "expiration_time", None)
+    if expiration is not None and hasattr(expiration, "timestamp"):
+        return expiration.timestamp()
+    return uploaded_at + DEFAULT_TTL_SECONDS
+
+
+def _genai_upload(path: str) -> Any:
+    import google.generativeai as genai
+
+    return genai.upload_file(path)
+
+
+class GeminiUploadCache:
+    def __init__(
+        self,
+        max_workers: int = 4,
+        max_image_side: int = 2048,
+        uploader: Callable[[str], Any] | None = None,
+    ) -> None:
+        self.max_workers = max(1, max_workers)
+        self.max_image_side = max_image_side
+        self._uploader = uploader or _genai_upload
+        self._entries: dict[str, _CachedUpload] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, path: Path) -> str:
+        return sha1_text(f"{sha1_file(path)}|{self.max_image_side}")
+
+    def _upload(self, path: Path) -> _CachedUpload:
+        uploaded_at = time.time()
+        with Image.open(path) as image:
+            oversized = self.max_image_side > 0 and max(image.size) > self.max_image_side
+            if not oversized:
+                handle = self._uploader(str(path))
+                return _CachedUpload(handle=handle, expires_at=_expires_at(handle, uploaded_at))
+
+            # Downscale large phone photos before upload; the model does not need full resolution.
+            resized = image.convert("RGB")
+            resized.thumbnail((self.max_image_side, self.max_image_side))
+            fd, tmp_name = tempfile.mkstemp(suffix=".jpg")
+            os.close(fd)
+            try:
+                resized.save(tmp_name, format="JPEG", quality=90)
+                handle = self._uploader(tmp_name)
+            finally:
+                os.unlink(tmp_name)
+        return _CachedUpload(handle=handle, expires_at=_expires_at(handle, uploaded_at))
+
+    def get_files(self, image_paths: Sequence[str | Path]) -> list[Any]:
+        paths = [Path(p) for p in image_paths]
+        keys = [self._key(path) for path in paths]
+        now = time.time()
+
+        with self._lock:
+            valid = {
+                key: entry
+                for key, entry in self._entries.items()
+                if entry.expires_at - EXPIRY_MARGIN_SECONDS > now
+            }
+        missing = {key: path for key, path in zip(keys, paths) if key not in valid}
+
+        if missing:
+            workers = min(self.max_workers, len(missing))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                uploaded = dict(zip(missing, pool.map(self._upload, missing.values())))
+            with self._lock:
+                self._entries.update(uploaded)
+            valid.update(uploaded)
+
+        return [valid[key].handle for key in keys]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+@lru_cache(maxsize=None)
+def get_upload_cache(max_workers: int = 4, max_image_side: int = 2048) -> GeminiUploadCache:
+    return GeminiUploadCache(max_workers=max_workers, max_image_side=max_image_side)
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Callable, Iterator
+
+from src.dedup import drop_dedup_index
+from src.lexical_index import drop_lexical_index
+
+# Layout under the persist dir: CURRENT names the live directory in versions/. Without CURRENT
+# the persist dir itself is the index, which is how every index built before versioning looks.
+CURRENT_FILENAME = "CURRENT"
+VERSIONS_DIRNAME = "versions"
+# Named collections are index roots of their own inside the default one (see src/shards.py).
+COLLECTIONS_DIRNAME = "collections"
+# Entries of a persist dir that belong to the layout, not to the index stored in it.
+_LAYOUT_NAMES = frozenset({CURRENT_FILENAME, f"{CURRENT_FILENAME}.tmp", VERSIONS_DIRNAME, COLLECTIONS_DIRNAME})
+
+_lock = threading.Lock()
+_leases: Counter[str] = Counter()
+# Retired directory -> monotonic time after which it may be removed once its readers are gone.
+_retired: dict[str, float] = {}
+_retire_hooks: list[Callable[[Path], None]] = []
+
+
+def _key(path: str | Path) -> str:
+    return str(Path(path).resolve())
+
+
+def index_root(path: str | Path) -> Path:
+    # Every version of an index shares its persist dir's cache generation and lock.
+    path = Path(path)
+    if path.parent.name == VERSIONS_DIRNAME and (path.parent.parent / CURRENT_FILENAME).exists():
+        return path.parent.parent
+    return path
+
+
+def active_index_dir(persist_dir: str | Path) -> Path:
+    root = Path(persist_dir)
+    try:
+        name = (root / CURRENT_FILENAME).read_text(encoding="utf-8").strip()
+    except FileNotFoundError:
+        return root
+    return root / VERSIONS_DIRNAME / name if name else root
+
+
+def new_version_dir(persist_dir: str | Path, name: str | None = None) -> Path:
+    # A fixed name (e.g. per job) lets an interrupted rebuild continue in the directory it started.
+    name = name or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:8]}"
+    path = Path(persist_dir) / VERSIONS_DIRNAME / name
+    path.mkdir(parents=True, exist_ok=True)
+    return path
+
+
+def add_retire_hook(hook: Callable[[Path], None]) -> None:
+    # Process-level caches holding handles on an index directory register here to let go of it.
+    if hook not in _retire_hooks:
+        _retire_hooks.append(hook)
+
+
+def _remove_index_dir(path: Path) -> None:
+    drop_lexical_index(path)
+    drop_dedup_index(path)
+    for hook in _retire_hooks:
+        hook(path)
+    if (path / CURRENT_FILENAME).exists():
+        # A pre-versioning index lives in the persist dir itself: remove its files, keep the layout
+        # and the named collections stored beside it.
+        for child in path.iterdir():
+            if child.name in _LAYOUT_NAMES:
+                continue
+            if child.is_dir():
+                shutil.rmtree(child, ignore_errors=True)
+            else:
+                child.unlink(missing_ok=True)
+    else:
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def _collect(key: str) -> None:
+    with _lock:
+        deadline = _retired.get(key)
+        if deadline is None or _leases[key] or time.monotonic() < deadline:
+            return
+        del _retired[key]
+    _remove_index_dir(Path(key))
+
+
+def _retire(path: Path, grace_seconds: float) -> None:
+    key = _key(path)
+    with _lock:
+        _retired[key] = time.monotonic() + grace_seconds
+    if grace_seconds <= 0:
+        _collect(key)
+        return
+    # Readers in other processes re-read CURRENT on their next query; the grace period covers them.
+    timer = threading.Timer(grace_seconds, _collect, args=(key,))
+    timer.daemon = True
+    timer.start()
+
+
+def switch_version(persist_dir: str | Path, version_dir: str | Path, grace_seconds: float = 30.0) -> Path:
+    # Atomic: readers see either the old CURRENT or the new one, never a half-written index.
+    root = Path(persist_dir)
+    previous = active_index_dir(root)
+    tmp_path = root / f"{CURRENT_FILENAME}.tmp"
+    tmp_path.write_text(Path(version_dir).name, encoding="utf-8")
+    os.replace(tmp_path, root / CURRENT_FILENAME)
+    if _key(previous) != _key(version_dir):
+        _retire(previous, grace_seconds)
+    return previous
+
+
+def discard_version(version_dir: str | Path) -> None:
+    # For builds that never went live: nothing reads them, so they go immediately.
+    _remove_index_dir(Path(version_dir))
+
+
+@contextmanager
+def read_lease(index_dir: str | Path) -> Iterator[Path]:
+    # Held while a query reads an index directory, so a rebuild never deletes it mid-read.
+    key = _key(index_dir)
+    with _lock:
+        _leases[key] += 1
+    try:
+        yield Path(index_dir)
+    finally:
+        with _lock:
+            _leases[key] -= 1
+            drained = not _leases[key]
+            if drained:
+                del _leases[key]
+        if drained and key in _retired:
+            _collect(key)
@@ -0,0 +1,390 @@
+from __future__ import annotations
+
+import contextvars
+import queue
+import threading
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Collection, Iterable, Iterator
+
+from src.chunking import chunk_records
+from src.config import AppConfig
+from src.dedup import get_dedup_index
+from src.index_versions import active_index_dir, discard_version, new_version_dir, switch_version
+from src.ingestion import extract_files
+from src.lexical_index import get_lexical_index
+from src.manifest import is_file_unchanged, load_manifest, save_manifest
+from src.models import DocumentChunk, ExtractedFile
+from src.ocr import OCRSettings
+from src.shards import collection_root
+from src.telemetry import span, trace
+from src.utils import sha1_file
+from src.vector_store import (
+    VectorStore,
+    bump_index_version,
+    finalize_file,
+    load_vectorstore,
+    previous_chunk_ids,
+    upsert_chunks,
+)
+
+
+@dataclass(slots=True)
+class IngestProgress:
+    batch_index: int
+    batch_chunks: int
+    chunks_indexed: int
+    chunks_embedded: int
+    files_done: int
+    files_total: int
+    # What this batch made durable: fresh chunk ids in the vector store and files in the manifest.
+    embedded_ids: list[str] = field(default_factory=list)
+    completed_files: list[str] = field(default_factory=list)
+
+
+@dataclass(slots=True)
+class IngestSummary:
+    files_total: int = 0
+    files_skipped: int = 0
+    files_indexed: int = 0
+    chunks_indexed: int = 0
+    chunks_embedded: int = 0
+    chunks_deduplicated: int = 0
+    batches: int = 0
+    cancelled: bool = False
+    warnings: list[str] = field(default_factory=list)
+    timings: dict[str, float] = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class _Batch:
+    chunks: list[DocumentChunk]
+    # Files whose last chunk is in this batch: (source_file, content_hash, all chunk ids).
+    completed_files: list[tuple[str, str, list[str]]]
+
+
+_DONE = object()
+
+
+def _iter_file_chunks(
+    extracted_files: Iterable[ExtractedFile],
+    file_hashes: dict[str, str],
+    config: AppConfig,
+    summary: IngestSummary,
+) -> Iterator[tuple[str, str, list[DocumentChunk]]]:
+    extracted_iter = iter(extracted_files)
+    while True:
+        # Time spent waiting on the extraction pool for the next file.
+        with span("extract"):
+            extracted = next(extracted_iter, None)
+        if extracted is None:
+            return
+        name = extracted.path.name
+        if extracted.error is not None:
+            summary.warnings.append(f"{name}: {extracted.error}")
+            continue
+        if not extracted.records:
+            summary.warnings.append(f"No text extracted from {name}.")
+        with span("chunk"):
+            chunks = chunk_records(
+                extracted.records,
+                chunk_size_tokens=config.chunk_size_tokens,
+                overlap_tokens=config.chunk_overlap_tokens,
+            )
+        # Saved uploads keep their upload time as mtime, so resumed and re-run ingests agree on it.
+        uploaded_at = extracted.path.stat().st_mtime
+        for chunk in chunks:
+            chunk.metadata["uploaded_at"] = uploaded_at
+        yield name, file_hashes[name], chunks
+
+
+def _iter_batches(
+    file_chunks: Iterable[tuple[str, str, list[DocumentChunk]]],
+    batch_size: int,
+) -> Iterator[_Batch]:
+    current: list[DocumentChunk] = []
+    completed: list[tuple[str, str, list[str]]] = []
+    for source_file, content_hash, chunks in file_chunks:
+        for chunk in chunks:
+            current.append(chunk)
+            if len(current) >= batch_size:
+                yield _Batch(chunks=current, completed_files=completed)
+                current, completed = [], []
+        completed.append((source_file, content_hash, [chunk.id for chunk in chunks]))
+    if current or completed:
+        yield _Batch(chunks=current, completed_files=completed)
+
+
+def _put(out: queue.Queue, item: object, stop: threading.Event) -> bool:
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _produce(batches: Iterator[_Batch], out: queue.Queue, stop: threading.Event) -> None:
+    try:
+        for batch in batches:
+            if not _put(out, batch, stop):
+                return
+        _put(out, _DONE, stop)
+    except BaseException as exc:  # noqa: BLE001
+        _put(out, exc, stop)
+    finally:
+        # Closing the generator shuts down the extraction pool if the consumer stopped early.
+        batches.close()
+
+
+def _ingest_files(
+    paths: Iterable[str | Path],
+    embedding_model,
+    config: AppConfig,
+    batch_size: int = 64,
+    queue_depth: int = 2,
+    on_progress: Callable[[IngestProgress], None] | None = None,
+    vectorstore: VectorStore | None = None,
+    resume_chunk_ids: Collection[str] | None = None,
+    cancel: threading.Event | None = None,
+    index_dir: Path | None = None,
+) -> tuple[VectorStore, IngestSummary]:
+    persist_dir = index_dir if index_dir is not None else active_index_dir(config.chroma_persist_dir)
+    if vectorstore is None:
+        vectorstore = load_vectorstore(
+            persist_dir,
+            embedding_model,
+            config.vector_backend,
+            config.vector_quantization,
+            config.rescore_candidates,
+        )
+    manifest = load_manifest(persist_dir)
+    lexical_index = get_lexical_index(persist_dir)
+    dedup = get_dedup_index(persist_dir, config.dedup_max_distance) if config.dedup_enabled else None
+    summary = IngestSummary()
+    # Chunks an interrupted run already embedded; only trust ids the vector store still holds.
+    resumed = set(vectorstore.get(ids=list(resume_chunk_ids))["ids"]) if resume_chunk_ids else set()
+
+    file_hashes: dict[str, str] = {}
+    changed: list[Path] = []
+    for path in paths:
+        file_path = Path(path)
+        summary.files_total += 1
+        with span("hash"):
+            content_hash = sha1_file(file_path)
+        if is_file_unchanged(manifest, file_path.name, content_hash):
+            summary.files_skipped += 1
+            continue
+        file_hashes[file_path.name] = content_hash
+        changed.append(file_path)
+
+    extracted = extract_files(
+        changed,
+        max_workers=config.extraction_workers,
+        pdf_pages_per_task=config.pdf_pages_per_task,
+        ocr=OCRSettings(
+            cache_dir=config.ocr_cache_dir,
+            max_side=config.ocr_max_side,
+            target_dpi=config.ocr_target_dpi,
+            deskew=config.ocr_deskew,
+        ),
+    )
+    batches = _iter_batches(_iter_file_chunks(extracted, file_hashes, config, summary), max(1, batch_size))
+
+    # Extraction and chunking run ahead in a producer thread; the bounded queue applies
+    # backpressure so at most queue_depth batches wait for the embed/upsert stage.
+    handoff: queue.Queue = queue.Queue(maxsize=max(1, queue_depth))
+    stop = threading.Event()
+    # Run the producer in a copy of this context so its spans land in the active ingest trace.
+    producer = threading.Thread(
+        target=contextvars.copy_context().run,
+        args=(_produce, batches, handoff, stop),
+        daemon=True,
+    )
+    producer.start()
+
+    try:
+        while True:
+            item = handoff.get()
+            if item is _DONE:
+                break
+            if isinstance(item, BaseException):
+                raise item
+            if cancel is not None and cancel.is_set():
+                summary.cancelled = True
+                break
+
+            known_ids = {
+                source_file: previous_chunk_ids(manifest, source_file)
+                for source_file in {chunk.source_file for chunk in item.chunks}
+            }
+            fresh = [chunk for chunk in item.chunks if chunk.id not in known_ids[chunk.source_file]]
+            if resumed:
+                carried = [chunk for chunk in fresh if chunk.id in resumed]
+                if carried:
+                    # Already in the vector store; the lexical index is rebuilt in memory instead.
+                    fresh = [chunk for chunk in fresh if chunk.id not in resumed]
+                    lexical_index.add(carried)
+            written = upsert_chunks(vectorstore, fresh, lexical_index, dedup)
+            for source_file, content_hash, chunk_ids in item.completed_files:
+                finalize_file(vectorstore, manifest, source_file, content_hash, chunk_ids, lexical_index, dedup)
+                summary.files_indexed += 1
+            # Persist per batch so completed files survive a failure later in the run.
+            if item.completed_files:
+                with span("persist"):
+                    lexical_index.save(persist_dir)
+                    if dedup is not None:
+                        dedup.save(persist_dir)
+                    save_manifest(persist_dir, manifest)
+            if fresh or item.completed_files:
+                bump_index_version(persist_dir)
+
+            summary.batches += 1
+            summary.chunks_indexed += len(item.chunks)
+            summary.chunks_embedded += len(written)
+            summary.chunks_deduplicated += len(fresh) - len(written)
+            if on_progress is not None:
+                on_progress(
+                    IngestProgress(
+                        batch_index=summary.batches,
+                        batch_chunks=len(item.chunks),
+                        chunks_indexed=summary.chunks_indexed,
+                        chunks_embedded=summary.chunks_embedded,
+                        files_done=summary.files_skipped + summary.files_indexed,
+                        files_total=summary.files_total,
+                        embedded_ids=[chunk.id for chunk in written],
+                        completed_files=[source_file for source_file, _, _ in item.completed_files],
+                    )
+                )
+    finally:
+        stop.set()
+        producer.join()
+
+    return vectorstore, summary
+
+
+def _verify_build(vectorstore: VectorStore, index_dir: Path, config: AppConfig) -> None:
+    # A rebuild only goes live if every chunk its manifest lists is actually in the vector store.
+    manifest = load_manifest(index_dir)
+    expected = {chunk_id for entry in manifest.values() for chunk_id in entry.get("chunk_ids", [])}
+    if not expected:
+        raise RuntimeError("Rebuild produced no chunks; the current index was kept.")
+    if config.dedup_enabled:
+        # Aliases were never embedded; their canonical chunk is what the store holds.
+        expected -= get_dedup_index(index_dir, config.dedup_max_distance).aliases.keys()
+    stored = set(vectorstore.get(ids=sorted(expected))["ids"])
+    missing = len(expected - stored)
+    if missing:
+        raise RuntimeError(f"Rebuilt index is missing {missing} chunks; the current index was kept.")
+
+
+def _rebuild_files(
+    paths: Iterable[str | Path],
+    embedding_model,
+    config: AppConfig,
+    batch_size: int,
+    queue_depth: int,
+    on_progress: Callable[[IngestProgress], None] | None,
+    open_vectorstore: Callable[[Path], VectorStore] | None,
+    resume_chunk_ids: Collection[str] | None,
+    cancel: threading.Event | None,
+    version_name: str | None,
+    root: Path,
+) -> tuple[VectorStore, IngestSummary]:
+    # Builds a complete new index beside the live one, which keeps serving queries until the switch.
+    staging = new_version_dir(root, version_name)
+    try:
+        if open_vectorstore is not None:
+            vectorstore = open_vectorstore(staging)
+        else:
+            vectorstore = load_vectorstore(
+                staging,
+                embedding_model,
+                config.vector_backend,
+                config.vector_quantization,
+                config.rescore_candidates,
+            )
+        vectorstore, summary = _ingest_files(
+            paths,
+            embedding_model,
+            config,
+            batch_size,
+            queue_depth,
+            on_progress,
+            vectorstore,
+            resume_chunk_ids,
+            cancel,
+            index_dir=staging,
+        )
+        if summary.cancelled:
+            # Left in place so a resumed job with the same version name continues where it stopped.
+            return vectorstore, summary
+        with span("verify"):
+            _verify_build(vectorstore, staging, config)
+    except BaseException:
+        discard_version(staging)
+        raise
+    with span("switch"):
+        switch_version(root, staging, config.index_retire_grace_seconds)
+        bump_index_version(root)
+    return vectorstore, summary
+
+
+def ingest_files(
+    paths: Iterable[str | Path],
+    embedding_model,
+    config: AppConfig,
+    batch_size: int = 64,
+    queue_depth: int = 2,
+    on_progress: Callable[[IngestProgress], None] | None = None,
+    vectorstore: VectorStore | None = None,
+    resume_chunk_ids: Collection[str] | None = None,
+    cancel: threading.Event | None = None,
+    rebuild: bool = False,
+    version_name: str | None = None,
+    open_vectorstore: Callable[[Path], VectorStore] | None = None,
+    collection: str | None = None,
+) -> tuple[VectorStore, IngestSummary]:
+    # rebuild=True replaces the index with just these files, built in a fresh version directory;
+    # open_vectorstore opens the handle for that directory (e.g. through the shared registry).
+    # collection names the shard to write; a passed vectorstore must be that shard's handle.
+    root = collection_root(config.chroma_persist_dir, collection)
+    with trace("ingest", rebuild=rebuild) as active:
+        if rebuild:
+            vectorstore, summary = _rebuild_files(
+                paths,
+                embedding_model,
+                config,
+                batch_size,
+                queue_depth,
+                on_progress,
+                open_vectorstore,
+                resume_chunk_ids,
+                cancel,
+                version_name,
+                root,
+            )
+        else:
+            vectorstore, summary = _ingest_files(
+                paths,
+                embedding_model,
+                config,
+                batch_size,
+                queue_depth,
+                on_progress,
+                vectorstore,
+                resume_chunk_ids,
+                cancel,
+                index_dir=active_index_dir(root),
+            )
+        summary.timings = active.timings
+        active.attributes.update(
+            files_total=summary.files_total,
+            files_indexed=summary.files_indexed,
+            chunks_indexed=summary.chunks_indexed,
+            chunks_embedded=summary.chunks_embedded,
+            chunks_deduplicated=summary.chunks_deduplicated,
+            cancelled=summary.cancelled,
+        )
+    return vectorstore, summary
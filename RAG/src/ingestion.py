@@ -1,34 +1,27 @@
 from __future__ import annotations
 
-import shutil
+import io
+import multiprocessing
+import os
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterable, Iterator
 
 import pytesseract
 from PIL import Image
 from pypdf import PdfReader
 
-SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".png", ".jpg", ".jpeg", ".webp"}
-
-
-def _configure_tesseract() -> None:
-    # Prefer PATH if available; otherwise try common Windows install locations.
-    path_cmd = shutil.which("tesseract")
-    if path_cmd:
-        pytesseract.pytesseract.tesseract_cmd = path_cmd
-        return
+from src.models import ExtractedFile
+from src.ocr import OCRSettings, ocr_image
+from src.utils import sha1_bytes
 
-    candidates = [
-        Path(r"C:\Program Files\Tesseract-OCR\tesseract.exe"),
-        Path(r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe"),
-    ]
-    for candidate in candidates:
-        if candidate.exists():
-            pytesseract.pytesseract.tesseract_cmd = str(candidate)
-            return
+SUPPORTED_EXTENSIONS = {".pdf", ".txt", ".png", ".jpg", ".jpeg", ".webp"}
+# Embedded images smaller than this on either side are logos or rules, not scanned text.
+_MIN_OCR_IMAGE_SIDE = 64
 
 
-def extract_text_from_file(path: str | Path) -> list[dict[str, Any]]:
+def extract_text_from_file(path: str | Path, ocr: OCRSettings | None = None) -> list[dict[str, Any]]:
     file_path = Path(path)
     ext = file_path.suffix.lower()
 
@@ -36,18 +29,51 @@ def extract_text_from_file(path: str | Path) -> list[dict[str, Any]]:
         raise ValueError(f"Unsupported file type: {ext}")
 
     if ext == ".pdf":
-        return _extract_pdf(file_path)
+        return _extract_pdf(file_path, ocr=ocr)
     if ext == ".txt":
         return _extract_txt(file_path)
-    return _extract_image(file_path)
+    return _extract_image(file_path, ocr)
 
 
-def _extract_pdf(file_path: Path) -> list[dict[str, Any]]:
+def _ocr_page_images(page: Any, ocr: OCRSettings) -> str:
+    # Scanned pages have no text layer, only the page photo; OCR the embedded images instead.
+    try:
+        images = list(getattr(page, "images", []))
+    except Exception:  # noqa: BLE001
+        return ""
+    texts: list[str] = []
+    for embedded in images:
+        try:
+            image = embedded.image
+            if image is None or min(image.size) < _MIN_OCR_IMAGE_SIDE:
+                continue
+            text = ocr_image(image, sha1_bytes(embedded.data), ocr)
+        except pytesseract.TesseractNotFoundError:
+            # Without Tesseract, image-only pages stay empty, as they were before OCR fallback.
+            return ""
+        except Exception:  # noqa: BLE001
+            # Skip an undecodable image rather than failing the whole PDF.
+            continue
+        if text:
+            texts.append(text)
+    return "\n\n".join(texts)
+
+
+def _extract_pdf(
+    file_path: Path,
+    first_page: int = 1,
+    last_page: int | None = None,
+    ocr: OCRSettings | None = None,
+) -> list[dict[str, Any]]:
+    ocr = ocr or OCRSettings()
     records: list[dict[str, Any]] = []
     try:
         reader = PdfReader(str(file_path))
-        for i, page in enumerate(reader.pages, start=1):
+        pages = reader.pages[first_page - 1 : last_page]
+        for i, page in enumerate(pages, start=first_page):
             text = (page.extract_text() or "").strip()
+            if not text:
+                text = _ocr_page_images(page, ocr)
             if text:
                 records.append({"text": text, "source_file": file_path.name, "page_number": i})
     except Exception as exc:  # noqa: BLE001
@@ -65,11 +91,11 @@ def _extract_txt(file_path: Path) -> list[dict[str, Any]]:
     return [{"text": text, "source_file": file_path.name, "page_number": None}]
 
 
-def _extract_image(file_path: Path) -> list[dict[str, Any]]:
-    _configure_tesseract()
+def _extract_image(file_path: Path, ocr: OCRSettings | None = None) -> list[dict[str, Any]]:
     try:
-        with Image.open(file_path) as image:
-            text = pytesseract.image_to_string(image).strip()
+        data = file_path.read_bytes()
+        with Image.open(io.BytesIO(data)) as image:
+            text = ocr_image(image, sha1_bytes(data), ocr or OCRSettings())
     except Exception as exc:  # noqa: BLE001
         raise RuntimeError(
             f"Failed to OCR image: {file_path.name}. "
@@ -80,3 +106,83 @@ def _extract_image(file_path: Path) -> list[dict[str, Any]]:
         return []
     return [{"text": text, "source_file": file_path.name, "page_number": None}]
 
+
+def _init_worker() -> None:
+    # Tesseract's own OpenMP threads would oversubscribe cores already used by the pool.
+    os.environ.setdefault("OMP_THREAD_LIMIT", "1")
+
+
+def _extract_task(
+    path: str, first_page: int | None, last_page: int | None, ocr: OCRSettings | None = None
+) -> list[dict[str, Any]]:
+    file_path = Path(path)
+    if first_page is None:
+        return extract_text_from_file(file_path, ocr)
+    return _extract_pdf(file_path, first_page, last_page, ocr)
+
+
+def _plan_tasks(file_path: Path, pdf_pages_per_task: int) -> list[tuple[int | None, int | None]]:
+    if file_path.suffix.lower() != ".pdf" or pdf_pages_per_task <= 0:
+        return [(None, None)]
+    try:
+        page_count = len(PdfReader(str(file_path)).pages)
+    except Exception:  # noqa: BLE001
+        # Let the worker raise the usual parse error for this file.
+        return [(None, None)]
+    if page_count <= pdf_pages_per_task:
+        return [(None, None)]
+    return [
+        (start, min(start + pdf_pages_per_task - 1, page_count))
+        for start in range(1, page_count + 1, pdf_pages_per_task)
+    ]
+
+
+def _collect(path: Path, futures: list[Future]) -> ExtractedFile:
+    records: list[dict[str, Any]] = []
+    for future in futures:
+        try:
+            records.extend(future.result())
+        except Exception as exc:  # noqa: BLE001
+            # One failed page range fails the whole file, matching serial extraction.
+            return ExtractedFile(path=path, records=[], error=str(exc))
+    return ExtractedFile(path=path, records=records)
+
+
+def extract_files(
+    paths: Iterable[str | Path],
+    max_workers: int | None = None,
+    pdf_pages_per_task: int = 16,
+    ocr: OCRSettings | None = None,
+) -> Iterator[ExtractedFile]:
+    workers = max_workers if max_workers is not None else (os.cpu_count() or 1)
+    if workers <= 1:
+        for path in paths:
+            file_path = Path(path)
+            try:
+                yield ExtractedFile(path=file_path, records=extract_text_from_file(file_path, ocr))
+            except Exception as exc:  # noqa: BLE001
+                yield ExtractedFile(path=file_path, records=[], error=str(exc))
+        return
+
+    # Spawned workers avoid forking the threaded Streamlit host process.
+    context = multiprocessing.get_context("spawn")
+    max_in_flight = workers * 2
+    with ProcessPoolExecutor(max_workers=workers, mp_context=context, initializer=_init_worker) as pool:
+        pending: deque[tuple[Path, list[Future]]] = deque()
+        in_flight = 0
+        for path in paths:
+            file_path = Path(path)
+            futures = [
+                pool.submit(_extract_task, str(file_path), first_page, last_page, ocr)
+                for first_page, last_page in _plan_tasks(file_path, pdf_pages_per_task)
+            ]
+            pending.append((file_path, futures))
+            in_flight += len(futures)
+            # Results are yielded in input order; bound the work queued ahead of the consumer.
+            while pending and in_flight > max_in_flight:
+                done_path, done_futures = pending.popleft()
+                in_flight -= len(done_futures)
+                yield _collect(done_path, done_futures)
+        while pending:
+            done_path, done_futures = pending.popleft()
+            yield _collect(done_path, done_futures)
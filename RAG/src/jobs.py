@@ -0,0 +1,472 @@
+from __future__ import annotations
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Callable, Sequence
+
+from src.config import AppConfig
+from src.index_versions import VERSIONS_DIRNAME, active_index_dir, discard_version
+from src.ingest_pipeline import IngestProgress, IngestSummary, ingest_files
+from src.registry import shared_embedding_model, shared_resource, shared_vectorstore
+from src.shards import collection_root, validate_collection_name
+from src.vector_store import VectorStore
+
+JOB_STATUSES = ("queued", "running", "completed", "failed", "cancelled")
+FINISHED_STATUSES = ("completed", "failed", "cancelled")
+
+_SCHEMA = (
+    "CREATE TABLE IF NOT EXISTS jobs ("
+    "id TEXT PRIMARY KEY, status TEXT NOT NULL, paths TEXT NOT NULL, created_at REAL NOT NULL, "
+    "updated_at REAL NOT NULL, files_total INTEGER NOT NULL DEFAULT 0, files_done INTEGER NOT NULL DEFAULT 0, "
+    "batches INTEGER NOT NULL DEFAULT 0, chunks_indexed INTEGER NOT NULL DEFAULT 0, "
+    "chunks_embedded INTEGER NOT NULL DEFAULT 0, attempts INTEGER NOT NULL DEFAULT 0, "
+    "cancel_requested INTEGER NOT NULL DEFAULT 0, warnings TEXT NOT NULL DEFAULT '[]', error TEXT)",
+    "CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)",
+    "CREATE TABLE IF NOT EXISTS job_files ("
+    "job_id TEXT NOT NULL, source_file TEXT NOT NULL, status TEXT NOT NULL, PRIMARY KEY (job_id, source_file))",
+    # Chunk ids each batch wrote to the vector store: the resume checkpoint for half-finished files.
+    "CREATE TABLE IF NOT EXISTS job_chunks ("
+    "job_id TEXT NOT NULL, chunk_id TEXT NOT NULL, PRIMARY KEY (job_id, chunk_id))",
+)
+# Columns added after the first release; databases created earlier get them on open.
+_MIGRATIONS = (
+    ("rebuild", "ALTER TABLE jobs ADD COLUMN rebuild INTEGER NOT NULL DEFAULT 0"),
+    ("collection", "ALTER TABLE jobs ADD COLUMN collection TEXT"),
+    # The queue running a job and when it last said so; a lapsed heartbeat means its process died.
+    ("owner", "ALTER TABLE jobs ADD COLUMN owner TEXT"),
+    ("heartbeat_at", "ALTER TABLE jobs ADD COLUMN heartbeat_at REAL"),
+)
+
+_JOB_COLUMNS = (
+    "id, status, paths, created_at, updated_at, files_total, files_done, batches, "
+    "chunks_indexed, chunks_embedded, attempts, cancel_requested, warnings, error, rebuild, collection"
+)
+
+
+@dataclass(slots=True)
+class IngestJob:
+    id: str
+    status: str
+    paths: list[str]
+    created_at: float
+    updated_at: float
+    files_total: int = 0
+    files_done: int = 0
+    batches: int = 0
+    chunks_indexed: int = 0
+    chunks_embedded: int = 0
+    attempts: int = 0
+    cancel_requested: bool = False
+    warnings: list[str] = field(default_factory=list)
+    error: str | None = None
+    # Builds a new index version from just these files and switches to it when complete.
+    rebuild: bool = False
+    # Named collection (shard) the files go into; None is the default collection.
+    collection: str | None = None
+    # source_file -> pending, done or skipped (unchanged since the last ingest, or nothing extracted).
+    files: dict[str, str] = field(default_factory=dict)
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED_STATUSES
+
+    @property
+    def fraction(self) -> float:
+        if self.status == "completed":
+            return 1.0
+        return min(self.files_done / self.files_total, 1.0) if self.files_total else 0.0
+
+
+class JobStore:
+    def __init__(self, db_path: str | Path, lease_seconds: float = 60.0) -> None:
+        self.db_path = Path(db_path)
+        self.lease_seconds = lease_seconds
+        # Unique per store, so two queues in one process (or on one host) hold separate leases.
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, timeout=30.0)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        for statement in _SCHEMA:
+            self._conn.execute(statement)
+        columns = {row[1] for row in self._conn.execute("PRAGMA table_info(jobs)")}
+        for column, statement in _MIGRATIONS:
+            if column not in columns:
+                self._conn.execute(statement)
+        self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+    def _row_to_job(self, row: tuple) -> IngestJob:
+        job = IngestJob(
+            id=row[0],
+            status=row[1],
+            paths=json.loads(row[2]),
+            created_at=row[3],
+            updated_at=row[4],
+            files_total=row[5],
+            files_done=row[6],
+            batches=row[7],
+            chunks_indexed=row[8],
+            chunks_embedded=row[9],
+            attempts=row[10],
+            cancel_requested=bool(row[11]),
+            warnings=json.loads(row[12]),
+            error=row[13],
+            rebuild=bool(row[14]),
+            collection=row[15],
+        )
+        job.files = dict(
+            self._conn.execute(
+                "SELECT source_file, status FROM job_files WHERE job_id = ? ORDER BY rowid", (job.id,)
+            ).fetchall()
+        )
+        return job
+
+    def submit(self, paths: Sequence[str | Path], rebuild: bool = False, collection: str | None = None) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        names = [str(path) for path in paths]
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, status, paths, created_at, updated_at, files_total, rebuild, collection) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, "queued", json.dumps(names), now, now, len(names), int(rebuild), collection),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_files (job_id, source_file, status) VALUES (?, ?, 'pending')",
+                [(job_id, Path(name).name) for name in names],
+            )
+            self._conn.commit()
+        return job_id
+
+    def get(self, job_id: str) -> IngestJob | None:
+        with self._lock:
+            row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return self._row_to_job(row) if row is not None else None
+
+    def list_jobs(self, limit: int = 20) -> list[IngestJob]:
+        with self._lock:
+            rows = self._conn.execute(
+                f"SELECT {_JOB_COLUMNS} FROM jobs ORDER BY created_at DESC LIMIT ?", (limit,)
+            ).fetchall()
+            return [self._row_to_job(row) for row in rows]
+
+    def claim_next(self) -> IngestJob | None:
+        with self._lock:
+            while True:
+                row = self._conn.execute(
+                    "SELECT id FROM jobs WHERE status = 'queued' ORDER BY created_at LIMIT 1"
+                ).fetchone()
+                if row is None:
+                    return None
+                # Conditional update, so two processes sharing the database never run the same job.
+                now = time.time()
+                claimed = self._conn.execute(
+                    "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ?, owner = ?, "
+                    "heartbeat_at = ? WHERE id = ? AND status = 'queued'",
+                    (now, self.owner, now, row[0]),
+                ).rowcount
+                self._conn.commit()
+                if claimed:
+                    job_row = self._conn.execute(f"SELECT {_JOB_COLUMNS} FROM jobs WHERE id = ?", (row[0],)).fetchone()
+                    return self._row_to_job(job_row)
+
+    def heartbeat(self, job_id: str) -> bool:
+        # Renews this store's lease on a running job; False once the job is no longer ours.
+        with self._lock:
+            renewed = self._conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE id = ? AND status = 'running' AND owner = ?",
+                (time.time(), job_id, self.owner),
+            ).rowcount
+            self._conn.commit()
+            return bool(renewed)
+
+    def requeue_interrupted(self) -> int:
+        # A running job whose lease lapsed was cut off by a crash or restart. Jobs other live
+        # processes are still heartbeating stay theirs. Rows from before leases have no heartbeat.
+        with self._lock:
+            now = time.time()
+            count = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', owner = NULL, updated_at = ? "
+                "WHERE status = 'running' AND (heartbeat_at IS NULL OR heartbeat_at < ?)",
+                (now, now - self.lease_seconds),
+            ).rowcount
+            self._conn.commit()
+            return count
+
+    def record_progress(self, job_id: str, progress: IngestProgress) -> None:
+        with self._lock:
+            self._conn.execute(
+                "UPDATE jobs SET files_total = ?, files_done = ?, batches = batches + 1, "
+                "chunks_indexed = chunks_indexed + ?, chunks_embedded = chunks_embedded + ?, updated_at = ? "
+                "WHERE id = ?",
+                (
+                    progress.files_total,
+                    progress.files_done,
+                    progress.batch_chunks,
+                    len(progress.embedded_ids),
+                    time.time(),
+                    job_id,
+                ),
+            )
+            self._conn.executemany(
+                "INSERT OR IGNORE INTO job_chunks (job_id, chunk_id) VALUES (?, ?)",
+                [(job_id, chunk_id) for chunk_id in progress.embedded_ids],
+            )
+            self._conn.executemany(
+                "UPDATE job_files SET status = 'done' WHERE job_id = ? AND source_file = ?",
+                [(job_id, source_file) for source_file in progress.completed_files],
+            )
+            self._conn.commit()
+
+    def checkpointed_chunk_ids(self, job_id: str) -> set[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT chunk_id FROM job_chunks WHERE job_id = ?", (job_id,)).fetchall()
+            return {row[0] for row in rows}
+
+    def finish(
+        self,
+        job_id: str,
+        status: str,
+        summary: IngestSummary | None = None,
+        error: str | None = None,
+    ) -> None:
+        with self._lock:
+            finished = self._conn.execute(
+                "UPDATE jobs SET status = ?, error = ?, updated_at = ?, owner = NULL "
+                "WHERE id = ? AND (owner IS NULL OR owner = ?)",
+                (status, error, time.time(), job_id, self.owner),
+            ).rowcount
+            if not finished:
+                # The lease lapsed and another queue took the job over; its outcome is the one that counts.
+                self._conn.commit()
+                return
+            if summary is not None:
+                self._conn.execute(
+                    "UPDATE jobs SET files_total = ?, files_done = ?, warnings = ? WHERE id = ?",
+                    (
+                        summary.files_total,
+                        summary.files_skipped + summary.files_indexed,
+                        json.dumps(summary.warnings),
+                        job_id,
+                    ),
+                )
+            if status == "completed":
+                self._conn.execute(
+                    "UPDATE job_files SET status = 'skipped' WHERE job_id = ? AND status = 'pending'", (job_id,)
+                )
+                # Every file is in the manifest now, which makes the chunk checkpoint redundant.
+                self._conn.execute("DELETE FROM job_chunks WHERE job_id = ?", (job_id,))
+            self._conn.commit()
+
+    def request_cancel(self, job_id: str) -> bool:
+        with self._lock:
+            now = time.time()
+            # Queued jobs are cancelled on the spot; running ones stop at their next batch boundary.
+            cancelled = self._conn.execute(
+                "UPDATE jobs SET status = 'cancelled', cancel_requested = 1, updated_at = ? "
+                "WHERE id = ? AND status = 'queued'",
+                (now, job_id),
+            ).rowcount
+            flagged = self._conn.execute(
+                "UPDATE jobs SET cancel_requested = 1, updated_at = ? WHERE id = ? AND status = 'running'",
+                (now, job_id),
+            ).rowcount
+            self._conn.commit()
+            return bool(cancelled or flagged)
+
+    def is_cancel_requested(self, job_id: str) -> bool:
+        with self._lock:
+            row = self._conn.execute("SELECT cancel_requested FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            return bool(row and row[0])
+
+    def retry(self, job_id: str) -> bool:
+        # Failed and cancelled jobs keep their checkpoint, so a retry resumes rather than restarts.
+        with self._lock:
+            requeued = self._conn.execute(
+                "UPDATE jobs SET status = 'queued', cancel_requested = 0, error = NULL, updated_at = ? "
+                "WHERE id = ? AND status IN ('failed', 'cancelled')",
+                (time.time(), job_id),
+            ).rowcount
+            self._conn.commit()
+            return bool(requeued)
+
+
+class IngestJobQueue:
+    def __init__(
+        self,
+        store: JobStore,
+        config: AppConfig,
+        embedding_model: Any,
+        get_vectorstore: Callable[..., VectorStore],
+        batch_size: int = 64,
+        poll_interval: float = 1.0,
+    ) -> None:
+        self.store = store
+        self.config = config
+        self.embedding_model = embedding_model
+        # Looked up per job so a job started after a rebuild writes to the reopened index. Called
+        # with an index directory to open the handle a rebuild builds into.
+        self.get_vectorstore = get_vectorstore
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._cancel_events: dict[str, threading.Event] = {}
+        self._cancel_lock = threading.Lock()
+        self.store.requeue_interrupted()
+        # One worker: every ingest rewrites the manifest and lexical index of the same persist dir.
+        # Extraction inside a job still fans out over the process pool.
+        self._worker = threading.Thread(target=self._run, name="rag-ingest-jobs", daemon=True)
+        self._worker.start()
+
+    def submit(self, paths: Sequence[str | Path], rebuild: bool = False, collection: str | None = None) -> str:
+        # Validated here so a bad name is rejected on submit rather than failing the job later.
+        if collection is not None:
+            collection = validate_collection_name(collection)
+        job_id = self.store.submit(paths, rebuild, collection)
+        self._wake.set()
+        return job_id
+
+    def get(self, job_id: str) -> IngestJob | None:
+        return self.store.get(job_id)
+
+    def list_jobs(self, limit: int = 20) -> list[IngestJob]:
+        return self.store.list_jobs(limit)
+
+    def has_active_jobs(self) -> bool:
+        return any(not job.finished for job in self.store.list_jobs(limit=50))
+
+    def cancel(self, job_id: str) -> bool:
+        requested = self.store.request_cancel(job_id)
+        with self._cancel_lock:
+            event = self._cancel_events.get(job_id)
+        if event is not None:
+            event.set()
+        return requested
+
+    def retry(self, job_id: str) -> bool:
+        requeued = self.store.retry(job_id)
+        if requeued:
+            self._wake.set()
+        return requeued
+
+    def wait(self, job_id: str, timeout: float | None = None) -> IngestJob | None:
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.store.get(job_id)
+            if job is None or job.finished:
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(0.05)
+
+    def close(self, timeout: float | None = None) -> None:
+        self._stop.set()
+        self._wake.set()
+        with self._cancel_lock:
+            for event in self._cancel_events.values():
+                event.set()
+        self._worker.join(timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            # Also picks up jobs of queues that died while this one was running.
+            self.store.requeue_interrupted()
+            job = self.store.claim_next()
+            if job is None:
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+                continue
+            self._execute(job)
+
+    def _job_vectorstore(self, collection: str | None, root: Path) -> VectorStore:
+        # The default collection uses the live handle; a named one opens its own active directory.
+        return self.get_vectorstore() if collection is None else self.get_vectorstore(active_index_dir(root))
+
+    def _execute(self, job: IngestJob) -> None:
+        cancel = threading.Event()
+        with self._cancel_lock:
+            self._cancel_events[job.id] = cancel
+        if self.store.is_cancel_requested(job.id):
+            cancel.set()
+
+        def on_progress(progress: IngestProgress) -> None:
+            self.store.record_progress(job.id, progress)
+            # Also honours cancellations requested from another process sharing the database.
+            if self.store.is_cancel_requested(job.id):
+                cancel.set()
+
+        done = threading.Event()
+        lost = threading.Event()
+
+        def keep_lease() -> None:
+            # A batch can embed for longer than the lease, so progress callbacks alone are not enough.
+            while not done.wait(self.store.lease_seconds / 3):
+                if not self.store.heartbeat(job.id):
+                    lost.set()
+                    cancel.set()
+                    return
+
+        heartbeat = threading.Thread(target=keep_lease, name=f"rag-ingest-lease-{job.id[:8]}", daemon=True)
+        heartbeat.start()
+        root = collection_root(self.config.chroma_persist_dir, job.collection)
+        try:
+            _, summary = ingest_files(
+                [Path(path) for path in job.paths],
+                self.embedding_model,
+                self.config,
+                batch_size=self.batch_size,
+                on_progress=on_progress,
+                vectorstore=None if job.rebuild else self._job_vectorstore(job.collection, root),
+                resume_chunk_ids=self.store.checkpointed_chunk_ids(job.id),
+                cancel=cancel,
+                rebuild=job.rebuild,
+                # One directory per job, so a rebuild interrupted by a restart resumes into it.
+                version_name=f"job-{job.id}",
+                open_vectorstore=self.get_vectorstore,
+                collection=job.collection,
+            )
+        except Exception as exc:  # noqa: BLE001
+            self.store.finish(job.id, "failed", error=str(exc))
+            return
+        finally:
+            done.set()
+            with self._cancel_lock:
+                self._cancel_events.pop(job.id, None)
+        if lost.is_set():
+            # Another queue owns the job (and any half-built version) now; leave both to it.
+            return
+        if summary.cancelled and self._stop.is_set() and not self.store.is_cancel_requested(job.id):
+            # Shutting down, not a user cancellation: leave it queued to resume on the next start.
+            self.store.finish(job.id, "queued", summary)
+        elif summary.cancelled and job.rebuild:
+            # The live index was never touched; drop the half-built version.
+            discard_version(root / VERSIONS_DIRNAME / f"job-{job.id}")
+            self.store.finish(job.id, "cancelled", summary)
+        else:
+            self.store.finish(job.id, "cancelled" if summary.cancelled else "completed", summary)
+
+
+def shared_job_queue(config: AppConfig) -> IngestJobQueue:
+    # One queue per database per process, so Streamlit reruns and sessions share a single worker.
+    def factory() -> IngestJobQueue:
+        embedding_model = shared_embedding_model(config)
+        return IngestJobQueue(
+            JobStore(config.ingest_jobs_db, config.ingest_job_lease_seconds),
+            config,
+            embedding_model,
+            lambda index_dir=None: shared_vectorstore(config, embedding_model, index_dir),
+        )
+
+    return shared_resource(("ingest_jobs", str(Path(config.ingest_jobs_db).resolve())), factory)
@@ -0,0 +1,248 @@
+from __future__ import annotations
+
+import math
+import os
+import re
+import threading
+from collections import Counter
+from pathlib import Path
+from typing import Mapping
+
+import numpy as np
+
+from src.models import DocumentChunk
+from src.utils import file_lock, file_signature
+
+LEXICAL_INDEX_FILENAME = "bm25_index.npz"
+_TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    # Alphanumeric runs keep course codes such as M23BCS502 as a single term.
+    return _TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25Index:
+    def __init__(self, k1: float = 1.5, b: float = 0.75) -> None:
+        self.k1 = k1
+        self.b = b
+        self.vocab: dict[str, int] = {}
+        self.chunk_ids: list[str] = []
+        self._row_of: dict[str, int] = {}
+        # Forward index in CSR layout: row r owns doc_terms/doc_tfs[doc_offsets[r]:doc_offsets[r + 1]].
+        self._doc_offsets = np.zeros(1, dtype=np.int64)
+        self._doc_terms = np.zeros(0, dtype=np.int32)
+        self._doc_tfs = np.zeros(0, dtype=np.float32)
+        self._doc_lengths = np.zeros(0, dtype=np.float32)
+        self._alive = np.zeros(0, dtype=bool)
+        self._pending: list[tuple[str, np.ndarray, np.ndarray, int]] = []
+        # Inverted index in CSR layout, rebuilt lazily after writes.
+        self._term_offsets = np.zeros(1, dtype=np.int64)
+        self._post_rows = np.zeros(0, dtype=np.int32)
+        self._post_tfs = np.zeros(0, dtype=np.float32)
+        self._dirty = False
+        self._lock = threading.RLock()
+        # The saved file this copy was read from or last wrote, and the chunk ids changed since then.
+        # A save that finds the file replaced by another writer replays these onto the newer copy.
+        self._signature: tuple[int, int, int] | None = None
+        self._added: set[str] = set()
+        self._deleted: set[str] = set()
+
+    def __len__(self) -> int:
+        with self._lock:
+            self._merge_pending()
+            return int(self._alive.sum())
+
+    def add(self, chunks: list[DocumentChunk]) -> None:
+        with self._lock:
+            self.delete([chunk.id for chunk in chunks])
+            for chunk in chunks:
+                self._append(chunk.id, Counter(tokenize(chunk.text)))
+            self._added.update(chunk.id for chunk in chunks)
+            self._dirty = True
+
+    def _append(self, chunk_id: str, counts: Mapping[str, int]) -> None:
+        vocab = self.vocab
+        for term in counts:
+            if term not in vocab:
+                vocab[term] = len(vocab)
+        term_ids = np.array(list(map(vocab.__getitem__, counts)), dtype=np.int32)
+        tfs = np.array(list(counts.values()), dtype=np.float32)
+        self._pending.append((chunk_id, term_ids, tfs, sum(counts.values())))
+
+    def delete(self, chunk_ids: list[str]) -> None:
+        with self._lock:
+            doomed = set(chunk_ids)
+            self._deleted |= doomed
+            self._added -= doomed
+            if self._pending and doomed:
+                self._pending = [entry for entry in self._pending if entry[0] not in doomed]
+            for chunk_id in doomed:
+                row = self._row_of.pop(chunk_id, None)
+                if row is not None:
+                    self._alive[row] = False
+                    self._dirty = True
+
+    def _merge_pending(self) -> None:
+        if not self._pending:
+            return
+        start_row = len(self.chunk_ids)
+        lengths = np.array([len(terms) for _, terms, _, _ in self._pending], dtype=np.int64)
+        self._doc_offsets = np.concatenate([self._doc_offsets, self._doc_offsets[-1] + np.cumsum(lengths)])
+        self._doc_terms = np.concatenate([self._doc_terms, *[terms for _, terms, _, _ in self._pending]])
+        self._doc_tfs = np.concatenate([self._doc_tfs, *[tfs for _, _, tfs, _ in self._pending]])
+        self._doc_lengths = np.concatenate(
+            [self._doc_lengths, np.array([length for *_, length in self._pending], dtype=np.float32)]
+        )
+        self._alive = np.concatenate([self._alive, np.ones(len(self._pending), dtype=bool)])
+        for offset, (chunk_id, _, _, _) in enumerate(self._pending):
+            self.chunk_ids.append(chunk_id)
+            self._row_of[chunk_id] = start_row + offset
+        self._pending = []
+
+    def _compact(self) -> None:
+        self._merge_pending()
+        if self._alive.all():
+            return
+        keep_rows = np.flatnonzero(self._alive)
+        lengths = np.diff(self._doc_offsets)[keep_rows]
+        row_of_posting = np.repeat(np.arange(len(self._alive)), np.diff(self._doc_offsets))
+        keep_postings = self._alive[row_of_posting]
+        self._doc_terms = self._doc_terms[keep_postings]
+        self._doc_tfs = self._doc_tfs[keep_postings]
+        self._doc_offsets = np.concatenate([[0], np.cumsum(lengths)]).astype(np.int64)
+        self._doc_lengths = self._doc_lengths[keep_rows]
+        self.chunk_ids = [self.chunk_ids[row] for row in keep_rows]
+        self._row_of = {chunk_id: row for row, chunk_id in enumerate(self.chunk_ids)}
+        self._alive = np.ones(len(self.chunk_ids), dtype=bool)
+
+    def _ensure_inverted(self) -> None:
+        if not self._dirty:
+            return
+        self._merge_pending()
+        if len(self._alive) and (~self._alive).sum() > 0.3 * len(self._alive):
+            self._compact()
+        rows = np.repeat(np.arange(len(self._alive), dtype=np.int32), np.diff(self._doc_offsets))
+        live = self._alive[rows]
+        terms = self._doc_terms[live]
+        order = np.argsort(terms, kind="stable")
+        self._post_rows = rows[live][order]
+        self._post_tfs = self._doc_tfs[live][order]
+        counts = np.bincount(terms, minlength=len(self.vocab))
+        self._term_offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        self._dirty = False
+
+    def search(self, query: str, k: int = 5) -> list[tuple[str, float]]:
+        with self._lock:
+            self._ensure_inverted()
+            term_ids = {self.vocab[term] for term in tokenize(query) if term in self.vocab}
+            doc_count = int(self._alive.sum())
+            if not term_ids or doc_count == 0:
+                return []
+
+            avg_length = float(self._doc_lengths[self._alive].mean()) or 1.0
+            scores = np.zeros(len(self._alive), dtype=np.float32)
+            for term_id in term_ids:
+                start, end = self._term_offsets[term_id], self._term_offsets[term_id + 1]
+                if start == end:
+                    continue
+                rows = self._post_rows[start:end]
+                tfs = self._post_tfs[start:end]
+                df = end - start
+                idf = math.log(1.0 + (doc_count - df + 0.5) / (df + 0.5))
+                norm = self.k1 * (1.0 - self.b + self.b * self._doc_lengths[rows] / avg_length)
+                # Each term posts a row at most once, so fancy-index accumulation is safe.
+                scores[rows] += idf * tfs * (self.k1 + 1.0) / (tfs + norm)
+
+            candidates = np.flatnonzero(scores > 0)
+            if len(candidates) > k:
+                candidates = candidates[np.argpartition(-scores[candidates], k - 1)[:k]]
+            ranked = candidates[np.argsort(-scores[candidates], kind="stable")]
+            return [(self.chunk_ids[row], float(scores[row])) for row in ranked]
+
+    def _rebase(self, base: "BM25Index") -> None:
+        # Replays this copy's unsaved changes onto `base`, the newer saved index, and takes its state.
+        self._merge_pending()
+        terms = sorted(self.vocab, key=self.vocab.__getitem__)
+        base.delete(list(self._deleted | self._added))
+        for chunk_id in self._added:
+            row = self._row_of.get(chunk_id)
+            if row is None:
+                continue
+            start, end = self._doc_offsets[row], self._doc_offsets[row + 1]
+            counts = {terms[term]: int(tf) for term, tf in zip(self._doc_terms[start:end], self._doc_tfs[start:end])}
+            base._append(chunk_id, counts)
+        base._merge_pending()
+        self.vocab, self.chunk_ids, self._row_of = base.vocab, base.chunk_ids, base._row_of
+        self._doc_offsets, self._doc_terms, self._doc_tfs = base._doc_offsets, base._doc_terms, base._doc_tfs
+        self._doc_lengths, self._alive = base._doc_lengths, base._alive
+        self._dirty = True
+
+    def _is_stale(self, path: Path) -> bool:
+        # Safe to replace with the saved file: it changed since this copy read it, and nothing here is unsaved.
+        return not self._added and not self._deleted and file_signature(path) != self._signature
+
+    def save(self, persist_dir: str | Path) -> None:
+        path = Path(persist_dir) / LEXICAL_INDEX_FILENAME
+        with self._lock, file_lock(path.with_name(path.name + ".lock")):
+            if file_signature(path) != self._signature:
+                # Another writer (process or stale cached copy) saved since this copy was read.
+                self._rebase(BM25Index.load(persist_dir))
+            self._compact()
+            vocab_terms = sorted(self.vocab, key=self.vocab.__getitem__)
+            tmp_path = path.with_name(path.name + ".tmp.npz")
+            np.savez(
+                tmp_path,
+                vocab=np.array(vocab_terms, dtype=str),
+                chunk_ids=np.array(self.chunk_ids, dtype=str),
+                doc_offsets=self._doc_offsets,
+                doc_terms=self._doc_terms,
+                doc_tfs=self._doc_tfs,
+                doc_lengths=self._doc_lengths,
+                params=np.array([self.k1, self.b], dtype=np.float64),
+            )
+            os.replace(tmp_path, path)
+            self._signature = file_signature(path)
+            self._added.clear()
+            self._deleted.clear()
+
+    @classmethod
+    def load(cls, persist_dir: str | Path) -> "BM25Index":
+        path = Path(persist_dir) / LEXICAL_INDEX_FILENAME
+        # Taken before reading: a replace in between leaves this copy marked stale, never wrongly current.
+        signature = file_signature(path)
+        if signature is None:
+            return cls()
+        with np.load(path, allow_pickle=False) as data:
+            k1, b = data["params"].tolist()
+            index = cls(k1=k1, b=b)
+            index.vocab = {str(term): i for i, term in enumerate(data["vocab"].tolist())}
+            index.chunk_ids = [str(chunk_id) for chunk_id in data["chunk_ids"].tolist()]
+            index._doc_offsets = data["doc_offsets"].astype(np.int64)
+            index._doc_terms = data["doc_terms"].astype(np.int32)
+            index._doc_tfs = data["doc_tfs"].astype(np.float32)
+            index._doc_lengths = data["doc_lengths"].astype(np.float32)
+        index._row_of = {chunk_id: row for row, chunk_id in enumerate(index.chunk_ids)}
+        index._alive = np.ones(len(index.chunk_ids), dtype=bool)
+        index._dirty = True
+        index._signature = signature
+        return index
+
+
+_INDEXES: dict[str, BM25Index] = {}
+_INDEXES_LOCK = threading.Lock()
+
+
+def get_lexical_index(persist_dir: str | Path) -> BM25Index:
+    key = str(Path(persist_dir).resolve())
+    with _INDEXES_LOCK:
+        index = _INDEXES.get(key)
+        # Picks up saves from other processes; a copy with unsaved changes merges them when it saves.
+        if index is None or index._is_stale(Path(persist_dir) / LEXICAL_INDEX_FILENAME):
+            index = _INDEXES[key] = BM25Index.load(persist_dir)
+        return index
+
+
+def drop_lexical_index(persist_dir: str | Path) -> None:
+    with _INDEXES_LOCK:
+        _INDEXES.pop(str(Path(persist_dir).resolve()), None)
@@ -1,12 +1,53 @@
 from __future__ import annotations
 
-from typing import Sequence
-
-import google.generativeai as genai
-from groq import Groq
+import threading
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Iterator, Sequence
 
 from src.config import AppConfig
+from src.gemini_uploads import get_upload_cache
 from src.models import RetrievalResult
+from src.telemetry import record_tokens, span
+
+if TYPE_CHECKING:
+    from groq import Groq
+
+_NO_RESPONSE = "No response generated."
+_GEMINI_CONFIGURE_LOCK = threading.Lock()
+_gemini_configured_key: str | None = None
+
+
+def _groq_client_class() -> type[Groq]:
+    # SDKs load on first use so importing this module stays cheap for unused providers.
+    from groq import Groq
+
+    return Groq
+
+
+def _genai() -> Any:
+    import google.generativeai as genai
+
+    return genai
+
+
+@lru_cache(maxsize=None)
+def get_groq_client(api_key: str) -> Groq:
+    # One client per key for the whole process so HTTP connections are pooled and reused.
+    return _groq_client_class()(api_key=api_key)
+
+
+def _configure_gemini(api_key: str) -> None:
+    global _gemini_configured_key
+    with _GEMINI_CONFIGURE_LOCK:
+        if _gemini_configured_key != api_key:
+            _genai().configure(api_key=api_key)
+            _gemini_configured_key = api_key
+
+
+@lru_cache(maxsize=None)
+def get_gemini_model(api_key: str, model_name: str) -> Any:
+    _configure_gemini(api_key)
+    return _genai().GenerativeModel(model_name)
 
 
 def _build_context(chunks: Sequence[RetrievalResult]) -> str:
@@ -19,36 +60,35 @@ def _build_context(chunks: Sequence[RetrievalResult]) -> str:
     return "\n\n".join(lines)
 
 
-def generate_with_groq(query: str, context_chunks: Sequence[RetrievalResult], config: AppConfig) -> str:
-    client = Groq(api_key=config.groq_api_key)
+def _record_groq_usage(usage) -> None:
+    if usage is not None:
+        record_tokens(getattr(usage, "prompt_tokens", None), getattr(usage, "completion_tokens", None))
+
+
+def _record_gemini_usage(usage) -> None:
+    if usage is not None:
+        record_tokens(getattr(usage, "prompt_token_count", None), getattr(usage, "candidates_token_count", None))
+
+
+def _groq_messages(query: str, context_chunks: Sequence[RetrievalResult]) -> list[dict[str, str]]:
     context = _build_context(context_chunks)
     prompt = (
         "You are a college helper assistant. Use only the provided context. "
         "If context is insufficient, clearly say so. Cite supporting chunks as [S1], [S2], etc.\n\n"
         f"Question: {query}\n\nContext:\n{context}"
     )
-
-    response = client.chat.completions.create(
-        model=config.groq_model,
-        messages=[
-            {"role": "system", "content": "Answer with concise, factual responses and explicit citations."},
-            {"role": "user", "content": prompt},
-        ],
-        temperature=0.2,
-    )
-
-    return response.choices[0].message.content or "No response generated."
+    return [
+        {"role": "system", "content": "Answer with concise, factual responses and explicit citations."},
+        {"role": "user", "content": prompt},
+    ]
 
 
-def generate_with_gemini_multimodal(
+def _gemini_parts(
     query: str,
     context_chunks: Sequence[RetrievalResult],
     images: Sequence[str] | None,
     config: AppConfig,
-) -> str:
-    genai.configure(api_key=config.gemini_api_key)
-    model = genai.GenerativeModel(config.gemini_model)
-
+) -> list:
     context = _build_context(context_chunks)
     prompt = (
         "Use only the provided context and attached images. "
@@ -57,9 +97,97 @@ def generate_with_gemini_multimodal(
     )
 
     parts: list = [prompt]
-    for image_path in images or []:
-        parts.append(genai.upload_file(image_path))
+    if images:
+        upload_cache = get_upload_cache(config.gemini_upload_workers, config.gemini_upload_max_side)
+        with span("upload_images"):
+            parts.extend(upload_cache.get_files(images))
+    return parts
 
-    response = model.generate_content(parts)
+
+def generate_with_groq(query: str, context_chunks: Sequence[RetrievalResult], config: AppConfig) -> str:
+    client = get_groq_client(config.groq_api_key)
+    with span("build_prompt"):
+        messages = _groq_messages(query, context_chunks)
+    with span("llm"):
+        response = client.chat.completions.create(
+            model=config.groq_model,
+            messages=messages,
+            temperature=0.2,
+        )
+    _record_groq_usage(getattr(response, "usage", None))
+
+    return response.choices[0].message.content or _NO_RESPONSE
+
+
+def stream_with_groq(
+    query: str,
+    context_chunks: Sequence[RetrievalResult],
+    config: AppConfig,
+) -> Iterator[str]:
+    client = get_groq_client(config.groq_api_key)
+    with span("build_prompt"):
+        messages = _groq_messages(query, context_chunks)
+    stream = client.chat.completions.create(
+        model=config.groq_model,
+        messages=messages,
+        temperature=0.2,
+        stream=True,
+    )
+
+    produced = False
+    for chunk in stream:
+        # Groq reports usage on the final chunk under x_groq.
+        _record_groq_usage(getattr(getattr(chunk, "x_groq", None), "usage", None))
+        if not chunk.choices:
+            continue
+        delta = chunk.choices[0].delta.content
+        if delta:
+            produced = True
+            yield delta
+    if not produced:
+        yield _NO_RESPONSE
+
+
+def generate_with_gemini_multimodal(
+    query: str,
+    context_chunks: Sequence[RetrievalResult],
+    images: Sequence[str] | None,
+    config: AppConfig,
+) -> str:
+    model = get_gemini_model(config.gemini_api_key, config.gemini_model)
+    with span("build_prompt"):
+        parts = _gemini_parts(query, context_chunks, images, config)
+    with span("llm"):
+        response = model.generate_content(parts)
+    _record_gemini_usage(getattr(response, "usage_metadata", None))
     text = getattr(response, "text", None)
-    return text or "No response generated."
+    return text or _NO_RESPONSE
+
+
+def stream_with_gemini_multimodal(
+    query: str,
+    context_chunks: Sequence[RetrievalResult],
+    images: Sequence[str] | None,
+    config: AppConfig,
+) -> Iterator[str]:
+    model = get_gemini_model(config.gemini_api_key, config.gemini_model)
+    with span("build_prompt"):
+        parts = _gemini_parts(query, context_chunks, images, config)
+    response = model.generate_content(parts, stream=True)
+
+    produced = False
+    usage = None
+    for chunk in response:
+        # Every chunk carries cumulative usage; only the last one is recorded.
+        usage = getattr(chunk, "usage_metadata", None) or usage
+        try:
+            text = chunk.text
+        except ValueError:
+            # Chunks without text parts (e.g. safety metadata) raise on .text.
+            continue
+        if text:
+            produced = True
+            yield text
+    _record_gemini_usage(usage)
+    if not produced:
+        yield _NO_RESPONSE
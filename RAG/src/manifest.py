@@ -0,0 +1,37 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+from typing import Any
+
+MANIFEST_FILENAME = "index_manifest.json"
+
+
+def manifest_path(persist_dir: str | Path) -> Path:
+    return Path(persist_dir) / MANIFEST_FILENAME
+
+
+def load_manifest(persist_dir: str | Path) -> dict[str, dict[str, Any]]:
+    path = manifest_path(persist_dir)
+    if not path.exists():
+        return {}
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    return data.get("files", {}) if isinstance(data, dict) else {}
+
+
+def save_manifest(persist_dir: str | Path, manifest: dict[str, dict[str, Any]]) -> None:
+    path = manifest_path(persist_dir)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps({"version": 1, "files": manifest}, indent=2), encoding="utf-8")
+    # Atomic replace so a crash mid-write never leaves a truncated manifest.
+    os.replace(tmp_path, path)
+
+
+def is_file_unchanged(manifest: dict[str, dict[str, Any]], source_file: str, content_hash: str) -> bool:
+    entry = manifest.get(source_file)
+    return bool(entry) and entry.get("content_hash") == content_hash
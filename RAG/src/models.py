@@ -1,7 +1,8 @@
 from __future__ import annotations
 
 from dataclasses import dataclass, field
-from typing import Any
+from pathlib import Path
+from typing import Any, Iterator
 
 
 @dataclass(slots=True)
@@ -26,3 +27,26 @@ class RAGAnswer:
     sources: list[RetrievalResult]
     used_model: str
     warnings: list[str] = field(default_factory=list)
+    # Per-stage milliseconds recorded by src.telemetry spans.
+    timings: dict[str, float] = field(default_factory=dict)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+@dataclass(slots=True)
+class StreamingAnswer:
+    tokens: Iterator[str]
+    sources: list[RetrievalResult]
+    used_model: str
+    warnings: list[str] = field(default_factory=list)
+    # Filled in as the token stream is consumed.
+    timings: dict[str, float] = field(default_factory=dict)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+
+
+@dataclass(slots=True)
+class ExtractedFile:
+    path: Path
+    records: list[dict[str, Any]]
+    error: str | None = None
@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import shutil
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from functools import lru_cache
+from pathlib import Path
+
+import numpy as np
+import pytesseract
+from PIL import Image, ImageOps
+
+from src.utils import sha1_text
+
+# Bump when preprocessing changes in a way that alters OCR output, so stale cache entries miss.
+OCR_PIPELINE_VERSION = 2
+# Scanners record their real resolution; cameras and editors stamp 72 or 96 whatever the pixel count.
+_MIN_SCAN_DPI = 150
+
+
+@dataclass(frozen=True, slots=True)
+class OCRSettings:
+    # Picklable, so it travels to the spawned extraction workers with each task.
+    cache_dir: Path | None = None
+    max_side: int = 2000
+    target_dpi: int = 300
+    deskew: bool = True
+
+    @property
+    def fingerprint(self) -> str:
+        # Only settings that change the recognized text; the cache location is not part of the key.
+        return f"v{OCR_PIPELINE_VERSION}|{self.max_side}|{self.target_dpi}|{int(self.deskew)}"
+
+
+@lru_cache(maxsize=None)
+def _configure_tesseract() -> str | None:
+    # Resolved once per process. Prefer PATH if available; otherwise try common Windows install locations.
+    path_cmd = shutil.which("tesseract")
+    if path_cmd:
+        pytesseract.pytesseract.tesseract_cmd = path_cmd
+        return path_cmd
+
+    candidates = [
+        Path(r"C:\Program Files\Tesseract-OCR\tesseract.exe"),
+        Path(r"C:\Program Files (x86)\Tesseract-OCR\tesseract.exe"),
+    ]
+    for candidate in candidates:
+        if candidate.exists():
+            pytesseract.pytesseract.tesseract_cmd = str(candidate)
+            return str(candidate)
+    return None
+
+
+def _downscale_factor(size: tuple[int, int], dpi: float | None, settings: OCRSettings) -> float:
+    # Tesseract gains nothing above ~300 DPI. A scan's DPI says how far to go, so a 300 DPI A4 page
+    # (2480x3508) is left alone. Without a usable DPI (phone photos are often 4000px wide) the
+    # longest side is capped at max_side instead.
+    if dpi and dpi >= _MIN_SCAN_DPI:
+        return settings.target_dpi / dpi if 0 < settings.target_dpi < dpi else 1.0
+    if settings.max_side > 0 and max(size) > settings.max_side:
+        return settings.max_side / max(size)
+    return 1.0
+
+
+def estimate_skew(image: Image.Image, max_angle: float = 5.0, step: float = 0.5) -> float:
+    # Projection profile: when text lines are horizontal, row ink sums jump sharply between
+    # lines and gaps. Returns the rotation (degrees, counter-clockwise) that best levels them.
+    small = image.convert("L")
+    small.thumbnail((600, 600))
+    pixels = np.asarray(small, dtype=np.float32)
+    if pixels.size == 0 or pixels.std() < 1.0:
+        return 0.0
+    ink = Image.fromarray(((pixels < pixels.mean() - 0.5 * pixels.std()) * 255).astype(np.uint8))
+    # Smallest rotations first, and a larger one must clearly win, so clean scans are left untouched.
+    angles = sorted(np.arange(-max_angle, max_angle + step / 2, step), key=abs)
+    best_angle, best_score = 0.0, -1.0
+    for angle in angles:
+        rows = np.asarray(ink.rotate(float(angle), resample=Image.Resampling.NEAREST), dtype=np.float64).sum(axis=1)
+        score = float(np.square(np.diff(rows)).sum())
+        if score > best_score * 1.001:
+            best_angle, best_score = float(angle), score
+    return best_angle
+
+
+def preprocess(image: Image.Image, settings: OCRSettings) -> Image.Image:
+    dpi = image.info.get("dpi")
+    image = ImageOps.exif_transpose(image).convert("L")
+    factor = _downscale_factor(image.size, float(dpi[0]) if dpi else None, settings)
+    if factor < 1.0:
+        size = (max(1, round(image.width * factor)), max(1, round(image.height * factor)))
+        image = image.resize(size, Image.Resampling.LANCZOS)
+    if settings.deskew:
+        angle = estimate_skew(image)
+        if angle:
+            image = image.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=255)
+    return image
+
+
+class OCRCache:
+    def __init__(self, cache_dir: str | Path) -> None:
+        cache_path = Path(cache_dir)
+        cache_path.mkdir(parents=True, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        # Several extraction worker processes share the file; WAL plus a busy timeout serializes writers.
+        self._conn = sqlite3.connect(str(cache_path / "ocr.sqlite3"), timeout=30.0, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS ocr (key TEXT PRIMARY KEY, text TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str) -> str | None:
+        with self._lock:
+            row = self._conn.execute("SELECT text FROM ocr WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return row[0]
+
+    def set(self, key: str, text: str) -> None:
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO ocr (key, text, created_at) VALUES (?, ?, ?)", (key, text, time.time())
+            )
+            self._conn.commit()
+
+    def close(self) -> None:
+        with self._lock:
+            self._conn.close()
+
+
+_CACHES: dict[str, OCRCache] = {}
+_CACHES_LOCK = threading.Lock()
+
+
+def get_ocr_cache(cache_dir: str | Path) -> OCRCache:
+    key = str(Path(cache_dir).resolve())
+    with _CACHES_LOCK:
+        if key not in _CACHES:
+            _CACHES[key] = OCRCache(cache_dir)
+        return _CACHES[key]
+
+
+def drop_ocr_cache(cache_dir: str | Path) -> None:
+    with _CACHES_LOCK:
+        cache = _CACHES.pop(str(Path(cache_dir).resolve()), None)
+    if cache is not None:
+        cache.close()
+
+
+def ocr_image(image: Image.Image, content_hash: str, settings: OCRSettings) -> str:
+    # Keyed by the encoded image bytes, so a re-uploaded or renamed copy of a photo is free.
+    cache = get_ocr_cache(settings.cache_dir) if settings.cache_dir is not None else None
+    key = sha1_text(f"{settings.fingerprint}|{content_hash}")
+    if cache is not None:
+        cached = cache.get(key)
+        if cached is not None:
+            return cached
+    _configure_tesseract()
+    text = pytesseract.image_to_string(preprocess(image, settings)).strip()
+    if cache is not None:
+        cache.set(key, text)
+    return text
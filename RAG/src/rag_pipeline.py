@@ -1,41 +1,218 @@
 from __future__ import annotations
 
-from typing import Sequence
+import time
+import weakref
+from typing import Iterator, Sequence
 
 from src.config import AppConfig
-from src.llm import generate_with_gemini_multimodal, generate_with_groq
-from src.models import RAGAnswer
-from src.retriever import retrieve
+from src.context_packing import pack_context
+from src.index_versions import active_index_dir
+from src.llm import (
+    generate_with_gemini_multimodal,
+    generate_with_groq,
+    stream_with_gemini_multimodal,
+    stream_with_groq,
+)
+from src.models import RAGAnswer, RetrievalResult, StreamingAnswer
+from src.reranker import get_reranker
+from src.retrieval_cache import RetrievalCache
+from src.scope import RetrievalScope
+from src.shards import retrieve_collections, search_index
+from src.telemetry import Trace, activate, begin_trace, finish_trace, span, trace
+from src.vector_store import get_index_version, index_dir_of
 
+_NO_CONTEXT_ANSWER = "I could not find relevant context in the indexed documents."
 
-def answer_query(
+
+def _candidate_k(config: AppConfig) -> int:
+    # Over-fetch candidates when a reranker will pick the final top-k.
+    if config.rerank_enabled:
+        return max(config.rerank_candidates, config.retriever_top_k)
+    return config.retriever_top_k
+
+
+def dense_fetch_k(config: AppConfig) -> int:
+    # How many dense hits a single question pulls from the vector store.
+    candidate_k = _candidate_k(config)
+    if config.retrieval_mode == "hybrid":
+        return max(4 * candidate_k, 20)
+    return candidate_k
+
+
+def _passes_threshold(result: RetrievalResult, config: AppConfig) -> bool:
+    # Hybrid scores rank-fuse two lists, so they say nothing about similarity; the threshold applies
+    # to the dense similarity each hit carries. A hit only BM25 found has none and is kept: ranking
+    # it into the top k on exact terms is the evidence it counts on.
+    if "rrf_score" in result.chunk.metadata:
+        dense_score = result.chunk.metadata.get("dense_score")
+        return dense_score is None or dense_score >= config.retrieval_score_threshold
+    return result.score >= config.retrieval_score_threshold
+
+
+def _select_context(
     query: str,
     vectorstore,
     config: AppConfig,
-    use_multimodal: bool = False,
-    images: Sequence[str] | None = None,
-) -> RAGAnswer:
+    cache: RetrievalCache | None,
+    scope: RetrievalScope | None = None,
+    collections: Sequence[str] | None = None,
+) -> tuple[list[RetrievalResult], list[str]]:
     warnings: list[str] = []
-    results = retrieve(query=query, vectorstore=vectorstore, k=config.retriever_top_k)
+    fetch_k = _candidate_k(config)
+    with span("retrieve"):
+        if collections:
+            # Fan out to the selected shards; the handle passed in only lends its embedding model.
+            results = retrieve_collections(
+                query, collections, vectorstore.embeddings, config, fetch_k, dense_fetch_k(config), cache, scope
+            )
+        else:
+            index_dir = index_dir_of(vectorstore) or active_index_dir(config.chroma_persist_dir)
+            index_version = get_index_version(config.chroma_persist_dir)
+            results = search_index(
+                query, vectorstore, index_dir, config, fetch_k, dense_fetch_k(config), cache, index_version, scope
+            )
 
-    filtered = [r for r in results if r.score >= config.retrieval_score_threshold]
+    with span("threshold_filter"):
+        filtered = [r for r in results if _passes_threshold(r, config)]
     if not filtered:
         filtered = results
         warnings.append("No chunks met the score threshold; using best available matches.")
 
-    if not filtered:
-        return RAGAnswer(
-            answer_text="I could not find relevant context in the indexed documents.",
-            sources=[],
-            used_model="none",
-            warnings=["Vector store returned no results."],
-        )
+    if config.rerank_enabled and filtered:
+        reranker = get_reranker(config.rerank_model, config.rerank_batch_size)
+        with span("rerank"):
+            filtered = reranker.rerank(query, filtered, top_k=config.retriever_top_k)
+    with span("pack_context"):
+        filtered = pack_context(filtered, config.context_token_budget, config.context_dedup_threshold)
+    return filtered, warnings
+
 
+def _generate(
+    query: str,
+    context: list[RetrievalResult],
+    config: AppConfig,
+    use_multimodal: bool,
+    images: Sequence[str] | None,
+) -> tuple[str, str]:
     if use_multimodal and images:
-        text = generate_with_gemini_multimodal(query, filtered, images, config)
-        used_model = "gemini"
-    else:
-        text = generate_with_groq(query, filtered, config)
-        used_model = "groq"
+        return generate_with_gemini_multimodal(query, context, images, config), "gemini"
+    return generate_with_groq(query, context, config), "groq"
+
+
+def answer_query(
+    query: str,
+    vectorstore,
+    config: AppConfig,
+    use_multimodal: bool = False,
+    images: Sequence[str] | None = None,
+    cache: RetrievalCache | None = None,
+    scope: RetrievalScope | None = None,
+    collections: Sequence[str] | None = None,
+) -> RAGAnswer:
+    with trace("query", retrieval_mode=config.retrieval_mode) as active:
+        filtered, warnings = _select_context(query, vectorstore, config, cache, scope, collections)
+
+        if not filtered:
+            answer = RAGAnswer(
+                answer_text=_NO_CONTEXT_ANSWER,
+                sources=[],
+                used_model="none",
+                warnings=["Vector store returned no results."],
+            )
+        else:
+            text, used_model = _generate(query, filtered, config, use_multimodal, images)
+            answer = RAGAnswer(answer_text=text, sources=filtered, used_model=used_model, warnings=warnings)
+
+        answer.timings = active.timings
+        answer.prompt_tokens = active.prompt_tokens
+        answer.completion_tokens = active.completion_tokens
+        active.attributes.update(used_model=answer.used_model, sources=len(answer.sources))
+    return answer
+
+
+class _TracedTokens:
+    # Generation happens lazily inside next(), so the trace is re-entered around each pull. The trace
+    # finishes when the stream ends, fails or is closed, or, if it is dropped unread, when it is collected.
+    def __init__(self, tokens: Iterator[str], active: Trace, answer: StreamingAnswer) -> None:
+        self._tokens = tokens
+        self._active = active
+        self._answer = answer
+        self._first = True
+        self._finish = weakref.finalize(self, finish_trace, active)
+
+    def __iter__(self) -> Iterator[str]:
+        return self
+
+    def __next__(self) -> str:
+        if not self._finish.alive:
+            raise StopIteration
+        try:
+            with activate(self._active), span("llm"):
+                token = next(self._tokens, None)
+        except BaseException:
+            self.close()
+            raise
+        if token is None:
+            self.close()
+            raise StopIteration
+        if self._first:
+            self._active.add("time_to_first_token", time.perf_counter() - self._active.started)
+            self._first = False
+        return token
+
+    def close(self) -> None:
+        if not self._finish.alive:
+            return
+        close = getattr(self._tokens, "close", None)
+        if close is not None:
+            close()
+        self._answer.prompt_tokens = self._active.prompt_tokens
+        self._answer.completion_tokens = self._active.completion_tokens
+        self._finish()
+
+
+def stream_answer_query(
+    query: str,
+    vectorstore,
+    config: AppConfig,
+    use_multimodal: bool = False,
+    images: Sequence[str] | None = None,
+    cache: RetrievalCache | None = None,
+    scope: RetrievalScope | None = None,
+    collections: Sequence[str] | None = None,
+) -> StreamingAnswer:
+    active = begin_trace("query_stream", retrieval_mode=config.retrieval_mode)
+    try:
+        with activate(active):
+            filtered, warnings = _select_context(query, vectorstore, config, cache, scope, collections)
+
+        if not filtered:
+            answer = StreamingAnswer(
+                tokens=iter([_NO_CONTEXT_ANSWER]),
+                sources=[],
+                used_model="none",
+                warnings=["Vector store returned no results."],
+            )
+        elif use_multimodal and images:
+            answer = StreamingAnswer(
+                tokens=stream_with_gemini_multimodal(query, filtered, images, config),
+                sources=filtered,
+                used_model="gemini",
+                warnings=warnings,
+            )
+        else:
+            answer = StreamingAnswer(
+                tokens=stream_with_groq(query, filtered, config),
+                sources=filtered,
+                used_model="groq",
+                warnings=warnings,
+            )
+    except BaseException:
+        # No token iterator exists yet to finish the trace, so a failed retrieval finishes it here.
+        finish_trace(active)
+        raise
 
-    return RAGAnswer(answer_text=text, sources=filtered, used_model=used_model, warnings=warnings)
+    active.attributes.update(used_model=answer.used_model, sources=len(answer.sources))
+    answer.timings = active.timings
+    answer.tokens = _TracedTokens(answer.tokens, active, answer)
+    return answer
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Hashable
+
+from src.chunking import get_chunker
+from src.config import AppConfig
+from src.embeddings import _embedding_model_name, get_embedding_model
+from src.index_versions import active_index_dir, add_retire_hook
+from src.lexical_index import get_lexical_index
+from src.llm import get_gemini_model, get_groq_client
+from src.models import DocumentChunk, RetrievalResult
+from src.reranker import get_reranker
+from src.vector_store import VectorStore, load_vectorstore, unwrap_embeddings
+
+
+class ResourceRegistry:
+    def __init__(self) -> None:
+        self._items: dict[Hashable, Any] = {}
+        self._key_locks: dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get_or_create(self, key: Hashable, factory: Callable[[], Any]) -> Any:
+        if key in self._items:
+            return self._items[key]
+        with self._lock:
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        # Per-key lock: concurrent sessions wait for one load instead of each loading the model.
+        with key_lock:
+            if key not in self._items:
+                self._items[key] = factory()
+            return self._items[key]
+
+    def drop_where(self, predicate: Callable[[Hashable], bool]) -> None:
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                del self._items[key]
+
+
+_REGISTRY = ResourceRegistry()
+
+
+def _embedding_key(config: AppConfig) -> tuple:
+    return (
+        "embedding",
+        config.embedding_provider,
+        _embedding_model_name(config),
+        str(Path(config.embedding_cache_dir).resolve()),
+        config.embedding_cache_max_mb,
+        config.gemini_embedding_batch_size,
+        config.gemini_embedding_workers,
+        config.gemini_embedding_rpm,
+    )
+
+
+def _vectorstore_key(config: AppConfig, embedding_model: Any, index_dir: Path) -> tuple:
+    return (
+        "vectorstore",
+        str(Path(index_dir).resolve()),
+        config.vector_backend,
+        config.vector_quantization,
+        config.rescore_candidates,
+        id(unwrap_embeddings(embedding_model)),
+    )
+
+
+def shared_resource(key: Hashable, factory: Callable[[], Any]) -> Any:
+    # One instance per key for the whole process, created once even when requested concurrently.
+    return _REGISTRY.get_or_create(key, factory)
+
+
+def shared_embedding_model(config: AppConfig) -> Any:
+    return _REGISTRY.get_or_create(_embedding_key(config), lambda: get_embedding_model(config))
+
+
+def shared_vectorstore(
+    config: AppConfig, embedding_model: Any | None = None, index_dir: Path | None = None
+) -> VectorStore:
+    # Keyed by the index version directory: after a rebuild switches CURRENT, the next lookup gets
+    # the new handle (opened while it was built) and in-flight queries keep the old one.
+    embedding_model = embedding_model if embedding_model is not None else shared_embedding_model(config)
+    index_dir = index_dir if index_dir is not None else active_index_dir(config.chroma_persist_dir)
+    return _REGISTRY.get_or_create(
+        _vectorstore_key(config, embedding_model, index_dir),
+        lambda: load_vectorstore(
+            index_dir,
+            embedding_model,
+            config.vector_backend,
+            config.vector_quantization,
+            config.rescore_candidates,
+        ),
+    )
+
+
+def drop_vectorstores(persist_dir: str | Path) -> None:
+    # Call after clearing an index on disk so the next request opens a fresh handle.
+    resolved = {str(Path(persist_dir).resolve()), str(active_index_dir(persist_dir).resolve())}
+    _REGISTRY.drop_where(lambda key: key[0] == "vectorstore" and key[1] in resolved)
+
+
+add_retire_hook(drop_vectorstores)
+
+
+def warmup(config: AppConfig) -> dict[str, float]:
+    # Pays every first-use cost up front: model weights, index files, tokenizer and SDK clients.
+    timings: dict[str, float] = {}
+
+    def timed(stage: str, fn: Callable[[], Any]) -> Any:
+        started = time.perf_counter()
+        try:
+            return fn()
+        finally:
+            timings[stage] = (time.perf_counter() - started) * 1000.0
+
+    embedding_model = timed("embedding_model", lambda: shared_embedding_model(config))
+    timed("embed_query", lambda: embedding_model.embed_query("warmup"))
+    timed("vectorstore", lambda: shared_vectorstore(config, embedding_model))
+
+    timed("lexical_index", lambda: len(get_lexical_index(active_index_dir(config.chroma_persist_dir))))
+    timed("tokenizer", lambda: get_chunker(config.chunk_size_tokens, config.chunk_overlap_tokens).split("warmup"))
+    if config.groq_api_key:
+        timed("groq_client", lambda: get_groq_client(config.groq_api_key))
+    if config.gemini_api_key:
+        timed("gemini_model", lambda: get_gemini_model(config.gemini_api_key, config.gemini_model))
+    if config.rerank_enabled:
+        probe = [RetrievalResult(DocumentChunk("warmup", "warmup", "warmup", None, 0), 0.0)]
+        reranker = get_reranker(config.rerank_model, config.rerank_batch_size)
+        timed("reranker", lambda: reranker.rerank("warmup", probe, top_k=1))
+    return timings
@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+from dataclasses import replace
+from functools import lru_cache
+from typing import Any
+
+from src.models import RetrievalResult
+from src.retrieval_cache import TTLCache
+from src.utils import sha1_text
+
+DEFAULT_RERANK_MODEL = "cross-encoder/ms-marco-MiniLM-L-6-v2"
+
+
+class CrossEncoderReranker:
+    def __init__(
+        self,
+        model_name: str = DEFAULT_RERANK_MODEL,
+        batch_size: int = 32,
+        cache_size: int = 4096,
+        model: Any = None,
+    ) -> None:
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._model = model
+        # Scores only depend on (query, chunk text), so they never go stale for a chunk id.
+        self._scores = TTLCache(max_entries=cache_size, ttl_seconds=0)
+
+    def _get_model(self) -> Any:
+        if self._model is None:
+            from sentence_transformers import CrossEncoder
+
+            self._model = CrossEncoder(self.model_name, device="cpu")
+        return self._model
+
+    def score(self, query: str, results: list[RetrievalResult]) -> list[float]:
+        query_hash = sha1_text(query)
+        scores: list[float | None] = [self._scores.get((query_hash, r.chunk.id)) for r in results]
+        missing = [i for i, value in enumerate(scores) if value is None]
+        if missing:
+            pairs = [(query, results[i].chunk.text) for i in missing]
+            predicted = self._get_model().predict(pairs, batch_size=self.batch_size, show_progress_bar=False)
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                self._scores.set((query_hash, results[i].chunk.id), float(value))
+        return [float(value) for value in scores]
+
+    def rerank(self, query: str, results: list[RetrievalResult], top_k: int) -> list[RetrievalResult]:
+        if not results:
+            return []
+        scores = self.score(query, results)
+        ranked = sorted(zip(results, scores), key=lambda pair: pair[1], reverse=True)[:top_k]
+        return [
+            RetrievalResult(
+                chunk=replace(result.chunk, metadata={**result.chunk.metadata, "retrieval_score": result.score}),
+                score=score,
+            )
+            for result, score in ranked
+        ]
+
+
+@lru_cache(maxsize=None)
+def get_reranker(model_name: str = DEFAULT_RERANK_MODEL, batch_size: int = 32) -> CrossEncoderReranker:
+    return CrossEncoderReranker(model_name=model_name, batch_size=batch_size)
@@ -0,0 +1,71 @@
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+from src.models import RetrievalResult
+
+
+def normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+class TTLCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0) -> None:
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: Hashable) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            stored_at, value = entry
+            if self.ttl_seconds > 0 and time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        if self.max_entries <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class RetrievalCache:
+    def __init__(self, max_entries: int = 1024, ttl_seconds: float = 600.0) -> None:
+        self.query_embeddings = TTLCache(max_entries, ttl_seconds)
+        self.results = TTLCache(max_entries, ttl_seconds)
+
+    def get_results(
+        self, query: str, k: int, index_version: Hashable, scope: Hashable | None = None
+    ) -> list[RetrievalResult] | None:
+        cached = self.results.get((normalize_query(query), k, index_version, scope))
+        return list(cached) if cached is not None else None
+
+    def set_results(
+        self, query: str, k: int, index_version: Hashable, results: list[RetrievalResult], scope: Hashable | None = None
+    ) -> None:
+        self.results.set((normalize_query(query), k, index_version, scope), list(results))
+
+    def get_embedding(self, query: str) -> list[float] | None:
+        return self.query_embeddings.get(normalize_query(query))
+
+    def set_embedding(self, query: str, embedding: list[float]) -> None:
+        self.query_embeddings.set(normalize_query(query), embedding)
@@ -1,12 +1,18 @@
 from __future__ import annotations
 
+from typing import Hashable
+
 from langchain_core.documents import Document
 
+from src.embedding_cache import embed_queries
+from src.lexical_index import BM25Index
 from src.models import DocumentChunk, RetrievalResult
+from src.retrieval_cache import RetrievalCache
+from src.scope import RetrievalScope
+from src.telemetry import span
 
 
-def retrieve(query: str, vectorstore, k: int = 5) -> list[RetrievalResult]:
-    raw_results: list[tuple[Document, float]] = vectorstore.similarity_search_with_relevance_scores(query, k=k)
+def _to_results(raw_results: list[tuple[Document, float]]) -> list[RetrievalResult]:
     output: list[RetrievalResult] = []
 
     for doc, score in raw_results:
@@ -22,3 +28,191 @@ def retrieve(query: str, vectorstore, k: int = 5) -> list[RetrievalResult]:
         output.append(RetrievalResult(chunk=chunk, score=float(score)))
 
     return output
+
+
+def _scope_kwargs(vectorstore, scope: RetrievalScope | None) -> dict:
+    # Push the scope down to the store: a row mask for the flat index, a where filter for Chroma.
+    if scope is None:
+        return {}
+    if hasattr(vectorstore, "similarity_search_by_vectors_with_relevance_scores"):
+        return {"scope": scope}
+    return {"filter": scope.to_chroma_where()}
+
+
+def _search_by_vector(
+    vectorstore, embedding: list[float], k: int, scope: RetrievalScope | None = None
+) -> list[tuple[Document, float]]:
+    # The by-vector search returns raw distances; map them like the text search does.
+    relevance_fn = vectorstore._select_relevance_score_fn()
+    raw_results = vectorstore.similarity_search_by_vector_with_relevance_scores(
+        embedding, k=k, **_scope_kwargs(vectorstore, scope)
+    )
+    return [(doc, relevance_fn(distance)) for doc, distance in raw_results]
+
+
+def _search_many_by_vector(
+    vectorstore, embeddings: list[list[float]], k: int, scope: RetrievalScope | None = None
+) -> list[list[tuple[Document, float]]]:
+    relevance_fn = vectorstore._select_relevance_score_fn()
+    batched = getattr(vectorstore, "similarity_search_by_vectors_with_relevance_scores", None)
+    if batched is not None:
+        raw_lists = batched(embeddings, k=k, **_scope_kwargs(vectorstore, scope))
+    else:
+        # Chroma's collection API accepts many query embeddings in a single call.
+        raw = vectorstore._collection.query(
+            query_embeddings=embeddings,
+            n_results=k,
+            where=scope.to_chroma_where() if scope is not None else None,
+            include=["documents", "metadatas", "distances"],
+        )
+        raw_lists = [
+            [
+                (Document(page_content=text, metadata=metadata or {}, id=chunk_id), distance)
+                for text, metadata, chunk_id, distance in zip(texts, metadatas, ids, distances)
+                if text is not None
+            ]
+            for texts, metadatas, ids, distances in zip(
+                raw["documents"], raw["metadatas"], raw["ids"], raw["distances"]
+            )
+        ]
+    return [[(doc, relevance_fn(distance)) for doc, distance in raw_results] for raw_results in raw_lists]
+
+
+def retrieve_many(
+    queries: list[str],
+    vectorstore,
+    k: int = 5,
+    cache: RetrievalCache | None = None,
+    index_version: Hashable = 0,
+    scope: RetrievalScope | None = None,
+) -> list[list[RetrievalResult]]:
+    if scope is not None and scope.source_files is not None and not scope.source_files:
+        return [[] for _ in queries]
+    cache = cache or RetrievalCache()
+    output: list[list[RetrievalResult] | None] = [
+        cache.get_results(query, k, index_version, scope) for query in queries
+    ]
+    pending = list(dict.fromkeys(query for query, results in zip(queries, output) if results is None))
+    if pending:
+        embeddings = {query: cache.get_embedding(query) for query in pending}
+        to_embed = [query for query, embedding in embeddings.items() if embedding is None]
+        if to_embed:
+            with span("embed_query"):
+                embedded = embed_queries(vectorstore.embeddings, to_embed)
+            for query, embedding in zip(to_embed, embedded):
+                cache.set_embedding(query, embedding)
+                embeddings[query] = embedding
+
+        with span("vector_search"):
+            searched = _search_many_by_vector(vectorstore, [embeddings[query] for query in pending], k, scope)
+        fresh = {query: _to_results(raw_results) for query, raw_results in zip(pending, searched)}
+        for query, results in fresh.items():
+            cache.set_results(query, k, index_version, results, scope)
+        output = [results if results is not None else fresh[query] for query, results in zip(queries, output)]
+    return output
+
+
+def retrieve(
+    query: str,
+    vectorstore,
+    k: int = 5,
+    cache: RetrievalCache | None = None,
+    index_version: Hashable = 0,
+    scope: RetrievalScope | None = None,
+) -> list[RetrievalResult]:
+    if scope is not None and scope.source_files is not None and not scope.source_files:
+        return []
+    if cache is None:
+        with span("embed_query"):
+            embedding = vectorstore.embeddings.embed_query(query)
+        with span("vector_search"):
+            return _to_results(_search_by_vector(vectorstore, embedding, k, scope))
+
+    cached = cache.get_results(query, k, index_version, scope)
+    if cached is not None:
+        return cached
+
+    embedding = cache.get_embedding(query)
+    if embedding is None:
+        with span("embed_query"):
+            embedding = vectorstore.embeddings.embed_query(query)
+        cache.set_embedding(query, embedding)
+
+    with span("vector_search"):
+        results = _to_results(_search_by_vector(vectorstore, embedding, k, scope))
+    cache.set_results(query, k, index_version, results, scope)
+    return results
+
+
+def _fetch_by_ids(vectorstore, ids: list[str]) -> dict[str, Document]:
+    if not ids:
+        return {}
+    raw = vectorstore.get(ids=ids, include=["documents", "metadatas"])
+    return {
+        chunk_id: Document(page_content=text or "", metadata=metadata or {"id": chunk_id})
+        for chunk_id, text, metadata in zip(raw["ids"], raw["documents"], raw["metadatas"])
+    }
+
+
+def hybrid_retrieve(
+    query: str,
+    vectorstore,
+    lexical_index: BM25Index,
+    k: int = 5,
+    fetch_k: int | None = None,
+    rrf_k: int = 60,
+    cache: RetrievalCache | None = None,
+    index_version: Hashable = 0,
+    scope: RetrievalScope | None = None,
+) -> list[RetrievalResult]:
+    fetch = fetch_k or max(4 * k, 20)
+    dense = retrieve(query, vectorstore, k=fetch, cache=cache, index_version=index_version, scope=scope)
+    with span("lexical_search"):
+        # BM25 has no metadata, so a scoped search over-fetches and drops out-of-scope hits below.
+        lexical = lexical_index.search(query, k=fetch if scope is None else 4 * fetch)
+    if scope is not None:
+        dense_ids = {result.chunk.id for result in dense}
+        outside = [chunk_id for chunk_id, _ in lexical if chunk_id not in dense_ids]
+        fetched = _fetch_by_ids(vectorstore, outside)
+        allowed = dense_ids | {chunk_id for chunk_id, doc in fetched.items() if scope.matches(doc.metadata)}
+        lexical = [(chunk_id, score) for chunk_id, score in lexical if chunk_id in allowed][:fetch]
+
+    # Reciprocal rank fusion: each list contributes 1 / (rrf_k + rank).
+    fused: dict[str, float] = {}
+    for rank, result in enumerate(dense, start=1):
+        fused[result.chunk.id] = fused.get(result.chunk.id, 0.0) + 1.0 / (rrf_k + rank)
+    for rank, (chunk_id, _) in enumerate(lexical, start=1):
+        fused[chunk_id] = fused.get(chunk_id, 0.0) + 1.0 / (rrf_k + rank)
+
+    top_ids = sorted(fused, key=fused.__getitem__, reverse=True)[:k]
+    dense_by_id = {result.chunk.id: result for result in dense}
+    lexical_scores = dict(lexical)
+    missing = _fetch_by_ids(vectorstore, [chunk_id for chunk_id in top_ids if chunk_id not in dense_by_id])
+
+    # Scale so a chunk ranked first by both retrievers scores 1.0. This orders and compares hits only;
+    # the score threshold reads the dense similarity kept in the metadata.
+    best_possible = 2.0 / (rrf_k + 1)
+    output: list[RetrievalResult] = []
+    for chunk_id in top_ids:
+        if chunk_id in dense_by_id:
+            base = dense_by_id[chunk_id]
+        elif chunk_id in missing:
+            base = _to_results([(missing[chunk_id], 0.0)])[0]
+        else:
+            continue
+        metadata = {
+            **base.chunk.metadata,
+            "dense_score": base.score if chunk_id in dense_by_id else None,
+            "lexical_score": lexical_scores.get(chunk_id),
+            "rrf_score": fused[chunk_id],
+        }
+        chunk = DocumentChunk(
+            id=chunk_id,
+            text=base.chunk.text,
+            source_file=base.chunk.source_file,
+            page_number=base.chunk.page_number,
+            chunk_index=base.chunk.chunk_index,
+            metadata=metadata,
+        )
+        output.append(RetrievalResult(chunk=chunk, score=fused[chunk_id] / best_possible))
+    return output
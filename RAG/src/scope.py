@@ -0,0 +1,101 @@
+from __future__ import annotations
+
+from dataclasses import dataclass
+from typing import Any
+
+
+@dataclass(frozen=True, slots=True)
+class RetrievalScope:
+    # None means unrestricted. Hashable, so it can be part of retrieval cache keys.
+    source_files: frozenset[str] | None = None
+    page_min: int | None = None
+    page_max: int | None = None
+    uploaded_after: float | None = None
+    uploaded_before: float | None = None
+    # Chunks stored under another file that deduplication aliased to one of source_files. They pass
+    # the file and page bounds by id; the upload bounds still apply to them.
+    alias_ids: frozenset[str] = frozenset()
+
+    def __post_init__(self) -> None:
+        if self.source_files is not None and not isinstance(self.source_files, frozenset):
+            object.__setattr__(self, "source_files", frozenset(self.source_files))
+        if not isinstance(self.alias_ids, frozenset):
+            object.__setattr__(self, "alias_ids", frozenset(self.alias_ids))
+
+    @property
+    def is_empty(self) -> bool:
+        return (
+            self.source_files is None
+            and self.page_min is None
+            and self.page_max is None
+            and self.uploaded_after is None
+            and self.uploaded_before is None
+        )
+
+    def matches_page(self, page: Any) -> bool:
+        if self.page_min is not None and (page is None or page < self.page_min):
+            return False
+        if self.page_max is not None and (page is None or page > self.page_max):
+            return False
+        return True
+
+    def matches(self, metadata: dict[str, Any]) -> bool:
+        if metadata.get("id") not in self.alias_ids:
+            if self.source_files is not None and metadata.get("source_file") not in self.source_files:
+                return False
+            if not self.matches_page(metadata.get("page_number")):
+                return False
+        uploaded = metadata.get("uploaded_at")
+        if self.uploaded_after is not None and (uploaded is None or uploaded < self.uploaded_after):
+            return False
+        if self.uploaded_before is not None and (uploaded is None or uploaded >= self.uploaded_before):
+            return False
+        return True
+
+    def to_chroma_where(self) -> dict[str, Any] | None:
+        located: list[dict[str, Any]] = []
+        if self.source_files is not None:
+            located.append({"source_file": {"$in": sorted(self.source_files)}})
+        if self.page_min is not None:
+            located.append({"page_number": {"$gte": self.page_min}})
+        if self.page_max is not None:
+            located.append({"page_number": {"$lte": self.page_max}})
+        clauses = _all_of(located)
+        if clauses and self.alias_ids:
+            clauses = [{"$or": [*clauses, {"id": {"$in": sorted(self.alias_ids)}}]}]
+        if self.uploaded_after is not None:
+            clauses.append({"uploaded_at": {"$gte": self.uploaded_after}})
+        if self.uploaded_before is not None:
+            clauses.append({"uploaded_at": {"$lt": self.uploaded_before}})
+        clauses = _all_of(clauses)
+        return clauses[0] if clauses else None
+
+    @classmethod
+    def from_dict(cls, payload: dict[str, Any] | None) -> RetrievalScope | None:
+        if not payload:
+            return None
+        if not isinstance(payload, dict):
+            raise ValueError("scope must be an object.")
+        files = payload.get("source_files")
+        if files is not None and (not isinstance(files, list) or not all(isinstance(f, str) for f in files)):
+            raise ValueError("scope.source_files must be a list of file names.")
+        try:
+            scope = cls(
+                source_files=files,
+                page_min=_optional(payload.get("page_min"), int),
+                page_max=_optional(payload.get("page_max"), int),
+                uploaded_after=_optional(payload.get("uploaded_after"), float),
+                uploaded_before=_optional(payload.get("uploaded_before"), float),
+            )
+        except (TypeError, ValueError) as exc:
+            raise ValueError(f"Invalid scope: {exc}") from exc
+        return None if scope.is_empty else scope
+
+
+def _optional(value: Any, kind: type) -> Any:
+    return None if value is None else kind(value)
+
+
+def _all_of(clauses: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    # Chroma rejects $and with fewer than two operands.
+    return clauses if len(clauses) <= 1 else [{"$and": clauses}]
@@ -0,0 +1,499 @@
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from functools import partial
+from pathlib import Path
+from typing import Any, AsyncIterator, Hashable, Sequence
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, Response, StreamingResponse
+from starlette.routing import Route
+
+from src.chunking import chunk_records
+from src.citations import source_to_record
+from src.config import AppConfig
+from src.dedup import get_dedup_index
+from src.index_versions import active_index_dir
+from src.ingest_pipeline import ingest_files
+from src.models import RAGAnswer
+from src.rag_pipeline import answer_query, stream_answer_query
+from src.registry import shared_embedding_model, shared_vectorstore, warmup
+from src.retrieval_cache import RetrievalCache, normalize_query
+from src.scope import RetrievalScope
+from src.shards import DEFAULT_COLLECTION, collection_root, validate_collection_name
+from src.telemetry import configure_telemetry
+from src.utils import sha1_text
+from src.vector_store import VectorStore, build_or_update_vectorstore, delete_document, index_dir_of
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _answer_payload(answer: RAGAnswer) -> dict[str, Any]:
+    return {
+        "answer": answer.answer_text,
+        "used_model": answer.used_model,
+        "warnings": answer.warnings,
+        "sources": [source_to_record(result) for result in answer.sources],
+        "timings": answer.timings,
+        "prompt_tokens": answer.prompt_tokens,
+        "completion_tokens": answer.completion_tokens,
+    }
+
+
+def _error(status_code: int, message: str, headers: dict[str, str] | None = None) -> JSONResponse:
+    return JSONResponse({"error": message}, status_code=status_code, headers=headers)
+
+
+def _overloaded() -> JSONResponse:
+    return _error(503, "Server is at capacity, retry shortly.", {"Retry-After": "1"})
+
+
+def _sse(event: str, data: dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+async def _read_json(request: Request) -> dict[str, Any]:
+    try:
+        payload = await request.json()
+    except (json.JSONDecodeError, UnicodeDecodeError) as exc:
+        raise BadRequest(f"Invalid JSON body: {exc}") from exc
+    if not isinstance(payload, dict):
+        raise BadRequest("Expected a JSON object.")
+    return payload
+
+
+def _collection_arg(value: Any) -> str | None:
+    if value is None:
+        return None
+    if not isinstance(value, str):
+        raise BadRequest("'collection' must be a string.")
+    try:
+        return validate_collection_name(value)
+    except ValueError as exc:
+        raise BadRequest(str(exc)) from exc
+
+
+def _upload_path(upload_dir: Path, raw: str) -> Path:
+    path = (upload_dir / raw).resolve()
+    # Only files the operator placed in the upload directory can be read on a client's behalf.
+    if not path.is_relative_to(upload_dir):
+        raise BadRequest(f"{raw}: path is outside the upload directory.")
+    if not path.is_file():
+        raise BadRequest(f"{raw}: file not found in the upload directory.")
+    return path
+
+
+def _query_args(
+    payload: dict[str, Any], upload_dir: Path
+) -> tuple[str, bool, list[str], RetrievalScope | None, tuple[str, ...]]:
+    question = payload.get("question") or payload.get("query")
+    if not isinstance(question, str) or not question.strip():
+        raise BadRequest("Expected a non-empty 'question' field.")
+    images = payload.get("images") or []
+    if not isinstance(images, list) or not all(isinstance(image, str) for image in images):
+        raise BadRequest("'images' must be a list of file paths.")
+    images = [str(_upload_path(upload_dir, image)) for image in images]
+    try:
+        scope = RetrievalScope.from_dict(payload.get("scope"))
+    except ValueError as exc:
+        raise BadRequest(str(exc)) from exc
+    collections = payload.get("collections") or []
+    if not isinstance(collections, list) or not all(isinstance(name, str) for name in collections):
+        raise BadRequest("'collections' must be a list of collection names.")
+    collections = tuple(dict.fromkeys(_collection_arg(name) for name in collections))
+    use_multimodal = bool(payload.get("use_multimodal", bool(images))) and bool(images)
+    return question.strip(), use_multimodal, images, scope, collections
+
+
+class RAGService:
+    def __init__(
+        self,
+        config: AppConfig,
+        embedding_model: Any | None = None,
+        vectorstore: VectorStore | None = None,
+    ) -> None:
+        self.config = config
+        self.embedding_model = embedding_model if embedding_model is not None else shared_embedding_model(config)
+        # Without an injected store, each request looks up the index version CURRENT points at, so a
+        # rebuild's switch is picked up without a restart. Opened once here to pay for it up front.
+        self._vectorstore = vectorstore
+        if vectorstore is None:
+            shared_vectorstore(config, self.embedding_model)
+        self.cache = RetrievalCache(config.retrieval_cache_size, config.retrieval_cache_ttl_seconds)
+        # Query embedding, search and reranking are CPU-bound; the pool caps how many run at once
+        # so a burst of requests queues here instead of oversubscribing the cores.
+        self.query_pool = ThreadPoolExecutor(max_workers=max(1, config.service_workers), thread_name_prefix="rag-query")
+        # One writer at a time: the manifest and lexical index are rewritten by every ingest.
+        self.ingest_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="rag-ingest")
+        self.max_inflight = max(1, config.service_max_inflight)
+        self.max_pending_ingest = max(1, config.service_max_pending_ingest)
+        # Counters and the in-flight map are only touched on the event loop thread.
+        self.active_queries = 0
+        self.pending_ingests = 0
+        self.coalesced = 0
+        self._inflight: dict[Hashable, asyncio.Future[RAGAnswer]] = {}
+
+    @property
+    def vectorstore(self) -> VectorStore:
+        if self._vectorstore is not None:
+            return self._vectorstore
+        return shared_vectorstore(self.config, self.embedding_model)
+
+    def _index_dir(self, vectorstore: VectorStore) -> Path:
+        return index_dir_of(vectorstore) or active_index_dir(self.config.chroma_persist_dir)
+
+    def _collection_store(self, collection: str | None) -> tuple[VectorStore, Path]:
+        # The default collection keeps the injected or shared handle; named ones always go through
+        # the registry, keyed by their active version directory.
+        if collection is None or collection == DEFAULT_COLLECTION:
+            vectorstore = self.vectorstore
+            return vectorstore, self._index_dir(vectorstore)
+        index_dir = active_index_dir(collection_root(self.config.chroma_persist_dir, collection))
+        return shared_vectorstore(self.config, self.embedding_model, index_dir), index_dir
+
+    def _check_collections(self, collections: tuple[str, ...]) -> None:
+        for name in collections:
+            if name != DEFAULT_COLLECTION and not collection_root(self.config.chroma_persist_dir, name).exists():
+                raise BadRequest(f"Unknown collection: {name}")
+
+    def close(self) -> None:
+        self.query_pool.shutdown(wait=False, cancel_futures=True)
+        self.ingest_pool.shutdown(wait=True)
+
+    def _query_key(
+        self,
+        question: str,
+        use_multimodal: bool,
+        images: list[str],
+        scope: RetrievalScope | None,
+        collections: tuple[str, ...] = (),
+    ) -> Hashable:
+        config = self.config
+        return (
+            normalize_query(question),
+            use_multimodal,
+            tuple(images),
+            scope,
+            collections,
+            config.retrieval_mode,
+            config.retriever_top_k,
+            config.rerank_enabled,
+        )
+
+    async def answer(
+        self,
+        question: str,
+        use_multimodal: bool,
+        images: list[str],
+        scope: RetrievalScope | None = None,
+        collections: tuple[str, ...] = (),
+    ) -> RAGAnswer | None:
+        # Identical questions already in flight share one pipeline run instead of each paying
+        # for retrieval and an LLM call. Returns None when the service is saturated.
+        key = self._query_key(question, use_multimodal, images, scope, collections)
+        shared = self._inflight.get(key)
+        if shared is not None:
+            self.coalesced += 1
+            return await asyncio.shield(shared)
+        if self.active_queries >= self.max_inflight:
+            return None
+
+        self.active_queries += 1
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.query_pool,
+            partial(
+                answer_query,
+                question,
+                self.vectorstore,
+                self.config,
+                use_multimodal,
+                images or None,
+                self.cache,
+                scope,
+                collections or None,
+            ),
+        )
+        self._inflight[key] = future
+        try:
+            # Shielded so a disconnecting client does not cancel the run other callers wait on.
+            return await asyncio.shield(future)
+        finally:
+            self.active_queries -= 1
+            self._inflight.pop(key, None)
+
+    def _ingest_documents(self, documents: list[dict[str, Any]], collection: str | None = None) -> dict[str, Any]:
+        config = self.config
+        records: list[dict[str, Any]] = []
+        texts: dict[str, list[str]] = defaultdict(list)
+        for document in documents:
+            source_file = str(document.get("source_file") or "")
+            text = document.get("text")
+            if not source_file or not isinstance(text, str):
+                raise BadRequest("Each document needs 'source_file' and 'text'.")
+            records.append({"text": text, "source_file": source_file, "page_number": document.get("page_number")})
+            texts[source_file].append(text)
+        chunks = chunk_records(
+            records,
+            chunk_size_tokens=config.chunk_size_tokens,
+            overlap_tokens=config.chunk_overlap_tokens,
+        )
+        vectorstore, index_dir = self._collection_store(collection)
+        dedup = get_dedup_index(index_dir, config.dedup_max_distance) if config.dedup_enabled else None
+        # Hashing the posted text lets re-posting an unchanged document skip re-embedding.
+        file_hashes = {source_file: sha1_text("\n".join(parts)) for source_file, parts in texts.items()}
+        build_or_update_vectorstore(
+            chunks,
+            self.embedding_model,
+            index_dir,
+            file_hashes,
+            config.vector_backend,
+            vectorstore=vectorstore,
+            dedup=dedup,
+        )
+        return {"files_indexed": len(file_hashes), "chunks_indexed": len(chunks), "warnings": []}
+
+    def _ingest_paths(self, paths: list[str], rebuild: bool = False, collection: str | None = None) -> dict[str, Any]:
+        upload_dir = Path(self.config.upload_dir).resolve()
+        resolved = [_upload_path(upload_dir, raw) for raw in paths]
+        _, summary = ingest_files(
+            resolved,
+            self.embedding_model,
+            self.config,
+            vectorstore=None if rebuild else self._collection_store(collection)[0],
+            rebuild=rebuild,
+            # The new version's handle goes into the shared registry, so the first query after the
+            # switch does not pay to open it.
+            open_vectorstore=(
+                partial(shared_vectorstore, self.config, self.embedding_model)
+                if self._vectorstore is None or collection is not None
+                else None
+            ),
+            collection=collection,
+        )
+        return {
+            "files_total": summary.files_total,
+            "files_skipped": summary.files_skipped,
+            "files_indexed": summary.files_indexed,
+            "chunks_indexed": summary.chunks_indexed,
+            "chunks_embedded": summary.chunks_embedded,
+            "chunks_deduplicated": summary.chunks_deduplicated,
+            "warnings": summary.warnings,
+            "timings": summary.timings,
+        }
+
+    async def health(self, request: Request) -> Response:
+        return JSONResponse(
+            {
+                "status": "ok",
+                "active_queries": self.active_queries,
+                "pending_ingests": self.pending_ingests,
+                "coalesced_queries": self.coalesced,
+            }
+        )
+
+    async def query(self, request: Request) -> Response:
+        try:
+            question, use_multimodal, images, scope, collections = _query_args(
+                await _read_json(request), Path(self.config.upload_dir).resolve()
+            )
+            self._check_collections(collections)
+            answer = await self.answer(question, use_multimodal, images, scope, collections)
+        except BadRequest as exc:
+            return _error(400, str(exc))
+        except Exception as exc:  # noqa: BLE001
+            return _error(500, f"Failed to answer: {exc}")
+        if answer is None:
+            return _overloaded()
+        return JSONResponse(_answer_payload(answer))
+
+    async def query_stream(self, request: Request) -> Response:
+        # Streams are per client, so they are not coalesced; each holds a slot until it ends.
+        try:
+            question, use_multimodal, images, scope, collections = _query_args(
+                await _read_json(request), Path(self.config.upload_dir).resolve()
+            )
+            self._check_collections(collections)
+        except BadRequest as exc:
+            return _error(400, str(exc))
+        if self.active_queries >= self.max_inflight:
+            return _overloaded()
+
+        self.active_queries += 1
+        loop = asyncio.get_running_loop()
+        try:
+            answer = await loop.run_in_executor(
+                self.query_pool,
+                partial(
+                    stream_answer_query,
+                    question,
+                    self.vectorstore,
+                    self.config,
+                    use_multimodal,
+                    images or None,
+                    self.cache,
+                    scope,
+                    collections or None,
+                ),
+            )
+        except Exception as exc:  # noqa: BLE001
+            self.active_queries -= 1
+            return _error(500, f"Failed to answer: {exc}")
+
+        async def events() -> AsyncIterator[str]:
+            tokens = iter(answer.tokens)
+            try:
+                yield _sse(
+                    "sources",
+                    {
+                        "used_model": answer.used_model,
+                        "warnings": answer.warnings,
+                        "sources": [source_to_record(result) for result in answer.sources],
+                    },
+                )
+                while True:
+                    token = await loop.run_in_executor(self.query_pool, next, tokens, None)
+                    if token is None:
+                        break
+                    yield _sse("token", {"text": token})
+                yield _sse(
+                    "done",
+                    {
+                        "timings": answer.timings,
+                        "prompt_tokens": answer.prompt_tokens,
+                        "completion_tokens": answer.completion_tokens,
+                    },
+                )
+            except Exception as exc:  # noqa: BLE001
+                yield _sse("error", {"error": f"Failed to answer: {exc}"})
+            finally:
+                self.active_queries -= 1
+                close = getattr(tokens, "close", None)
+                if close is not None:
+                    # Closing finishes the trace and releases the LLM stream if the client left early.
+                    try:
+                        await loop.run_in_executor(self.query_pool, close)
+                    except Exception:  # noqa: BLE001
+                        pass
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    async def ingest(self, request: Request) -> Response:
+        try:
+            payload = await _read_json(request)
+            documents = payload.get("documents")
+            paths = payload.get("paths")
+            if documents is None and paths is None:
+                raise BadRequest("Expected 'documents' or 'paths'.")
+            if documents is not None and not isinstance(documents, list):
+                raise BadRequest("'documents' must be a list.")
+            if paths is not None and not isinstance(paths, list):
+                raise BadRequest("'paths' must be a list.")
+            rebuild = bool(payload.get("rebuild", False))
+            collection = _collection_arg(payload.get("collection"))
+            if rebuild and paths is None:
+                raise BadRequest("'rebuild' needs 'paths': the new index is built from files in the upload directory.")
+        except BadRequest as exc:
+            return _error(400, str(exc))
+        if self.pending_ingests >= self.max_pending_ingest:
+            return _overloaded()
+
+        self.pending_ingests += 1
+        loop = asyncio.get_running_loop()
+        try:
+            if documents is not None:
+                result = await loop.run_in_executor(self.ingest_pool, self._ingest_documents, documents, collection)
+            else:
+                result = await loop.run_in_executor(
+                    self.ingest_pool, self._ingest_paths, [str(p) for p in paths], rebuild, collection
+                )
+        except BadRequest as exc:
+            return _error(400, str(exc))
+        except Exception as exc:  # noqa: BLE001
+            return _error(500, f"Failed to ingest: {exc}")
+        finally:
+            self.pending_ingests -= 1
+        return JSONResponse(result)
+
+    def _delete_document(self, source_file: str, collection: str | None = None) -> list[str] | None:
+        vectorstore, index_dir = self._collection_store(collection)
+        config = self.config
+        dedup = get_dedup_index(index_dir, config.dedup_max_distance) if config.dedup_enabled else None
+        return delete_document(vectorstore, index_dir, source_file, dedup)
+
+    async def delete(self, request: Request) -> Response:
+        source_file = request.path_params["source_file"]
+        try:
+            collection = _collection_arg(request.query_params.get("collection"))
+            self._check_collections((collection,) if collection else ())
+        except BadRequest as exc:
+            return _error(400, str(exc))
+        if self.pending_ingests >= self.max_pending_ingest:
+            return _overloaded()
+        # Runs on the ingest worker, so it never interleaves with an ingest rewriting the manifest.
+        self.pending_ingests += 1
+        loop = asyncio.get_running_loop()
+        try:
+            removed = await loop.run_in_executor(self.ingest_pool, self._delete_document, source_file, collection)
+        except Exception as exc:  # noqa: BLE001
+            return _error(500, f"Failed to delete: {exc}")
+        finally:
+            self.pending_ingests -= 1
+        if removed is None:
+            return _error(404, f"{source_file} is not in the index.")
+        return JSONResponse({"source_file": source_file, "chunks_removed": len(removed)})
+
+
+def create_app(
+    config: AppConfig,
+    embedding_model: Any | None = None,
+    vectorstore: VectorStore | None = None,
+) -> Starlette:
+    service = RAGService(config, embedding_model, vectorstore)
+
+    @asynccontextmanager
+    async def lifespan(app: Starlette) -> AsyncIterator[None]:
+        try:
+            yield
+        finally:
+            service.close()
+
+    app = Starlette(
+        routes=[
+            Route("/health", service.health, methods=["GET"]),
+            Route("/query", service.query, methods=["POST"]),
+            Route("/query/stream", service.query_stream, methods=["POST"]),
+            Route("/ingest", service.ingest, methods=["POST"]),
+            Route("/documents/{source_file:path}", service.delete, methods=["DELETE"]),
+        ],
+        lifespan=lifespan,
+    )
+    app.state.service = service
+    return app
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description="Serve ingest and question answering over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args(argv)
+
+    config = AppConfig.from_env()
+    configure_telemetry(config.trace_log_path, config.metrics_port)
+    if config.warmup_on_start:
+        warmup(config)
+    uvicorn.run(create_app(config), host=args.host, port=args.port)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
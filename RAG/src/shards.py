@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import heapq
+import math
+import re
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import replace
+from functools import lru_cache
+from pathlib import Path
+from typing import Any, Hashable, Sequence
+
+from src.config import AppConfig
+from src.dedup import annotate_sources, get_dedup_index
+from src.index_versions import COLLECTIONS_DIRNAME, active_index_dir, read_lease
+from src.models import RetrievalResult
+from src.registry import shared_vectorstore
+from src.retrieval_cache import RetrievalCache
+from src.retriever import hybrid_retrieve, retrieve
+from src.scope import RetrievalScope
+from src.telemetry import activate, current_trace, span
+from src.vector_store import get_index_version, lexical_index_for
+
+# Named collections (one per course or department) each live in their own index root under
+# collections/, with the same CURRENT/versions layout. The default collection is the persist dir.
+DEFAULT_COLLECTION = "default"
+SCORE_NORMALIZATIONS = ("none", "minmax", "zscore")
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9][A-Za-z0-9_.-]{0,63}$")
+
+
+def validate_collection_name(name: str) -> str:
+    name = str(name).strip()
+    # Names become directory names, so anything that could climb out of collections/ is rejected.
+    if not _NAME_PATTERN.match(name) or ".." in name:
+        raise ValueError(f"Invalid collection name: {name!r}")
+    return name
+
+
+def collection_root(persist_dir: str | Path, collection: str | None = None) -> Path:
+    if not collection or collection == DEFAULT_COLLECTION:
+        return Path(persist_dir)
+    return Path(persist_dir) / COLLECTIONS_DIRNAME / validate_collection_name(collection)
+
+
+def list_collections(persist_dir: str | Path) -> list[str]:
+    shard_dir = Path(persist_dir) / COLLECTIONS_DIRNAME
+    named = sorted(path.name for path in shard_dir.iterdir() if path.is_dir()) if shard_dir.exists() else []
+    return [DEFAULT_COLLECTION, *named]
+
+
+def normalize_scores(results: list[RetrievalResult], method: str) -> list[RetrievalResult]:
+    # Per-shard rescaling before the merge. Dense scores from one embedding model are already on a
+    # common scale ("none"); min-max and z-score help when shards score on different scales.
+    if method == "none" or not results:
+        return results
+    scores = [result.score for result in results]
+    if method == "minmax":
+        low, high = min(scores), max(scores)
+        scaled = [1.0 if high == low else (score - low) / (high - low) for score in scores]
+    elif method == "zscore":
+        mean = sum(scores) / len(scores)
+        std = math.sqrt(sum((score - mean) ** 2 for score in scores) / len(scores))
+        # Squashed through a logistic so scores stay in (0, 1) and the score threshold still applies.
+        scaled = [0.5 if std == 0 else 1.0 / (1.0 + math.exp(-(score - mean) / std)) for score in scores]
+    else:
+        raise ValueError(f"Invalid SHARD_SCORE_NORMALIZATION. Use one of: {', '.join(SCORE_NORMALIZATIONS)}.")
+    return [replace(result, score=score) for result, score in zip(results, scaled)]
+
+
+def merge_top_k(per_shard: Sequence[list[RetrievalResult]], k: int) -> list[RetrievalResult]:
+    # k-way heap merge of the score-sorted shard lists; stops as soon as the global top-k is known.
+    ordered = [sorted(results, key=lambda result: result.score, reverse=True) for results in per_shard]
+    merged: list[RetrievalResult] = []
+    seen: set[str] = set()
+    for result in heapq.merge(*ordered, key=lambda result: result.score, reverse=True):
+        # Chunk ids are content hashes, so the same text in two collections is kept once.
+        if result.chunk.id in seen:
+            continue
+        seen.add(result.chunk.id)
+        merged.append(result)
+        if len(merged) >= k:
+            break
+    return merged
+
+
+def search_index(
+    query: str,
+    vectorstore,
+    index_dir: Path,
+    config: AppConfig,
+    k: int,
+    fetch_k: int,
+    cache: RetrievalCache | None,
+    index_version: Hashable,
+    scope: RetrievalScope | None = None,
+) -> list[RetrievalResult]:
+    # One shard's candidates. The lease keeps a rebuild from deleting this index version mid-read.
+    with read_lease(index_dir):
+        dedup = get_dedup_index(index_dir, config.dedup_max_distance) if config.dedup_enabled else None
+        if dedup is not None and scope is not None and scope.source_files is not None:
+            # Text deduplicated into another file's chunk still belongs to the scoped file.
+            scope = replace(scope, alias_ids=dedup.scope_aliases(scope))
+        if config.retrieval_mode == "hybrid":
+            results = hybrid_retrieve(
+                query=query,
+                vectorstore=vectorstore,
+                lexical_index=lexical_index_for(vectorstore, index_dir),
+                k=k,
+                fetch_k=fetch_k,
+                rrf_k=config.rrf_k,
+                cache=cache,
+                index_version=index_version,
+                scope=scope,
+            )
+        else:
+            results = retrieve(
+                query=query, vectorstore=vectorstore, k=k, cache=cache, index_version=index_version, scope=scope
+            )
+        if dedup is not None and results:
+            results = annotate_sources(results, dedup)
+    return results
+
+
+@lru_cache(maxsize=None)
+def _fanout_pool(workers: int) -> ThreadPoolExecutor:
+    # Shared across queries: ANN and matrix search release the GIL, so shards really run in parallel.
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix="rag-shard")
+
+
+def _search_collection(
+    query: str,
+    collection: str,
+    embedding_model: Any,
+    config: AppConfig,
+    k: int,
+    fetch_k: int,
+    cache: RetrievalCache,
+    scope: RetrievalScope | None,
+) -> list[RetrievalResult]:
+    root = collection_root(config.chroma_persist_dir, collection)
+    index_dir = active_index_dir(root)
+    vectorstore = shared_vectorstore(config, embedding_model, index_dir)
+    # Cached results are per shard: its root and index generation both go into the key.
+    version = (str(root), get_index_version(root))
+    results = search_index(query, vectorstore, index_dir, config, k, fetch_k, cache, version, scope)
+    results = normalize_scores(results, config.shard_score_normalization)
+    return [
+        replace(result, chunk=replace(result.chunk, metadata={**result.chunk.metadata, "collection": collection}))
+        for result in results
+    ]
+
+
+def retrieve_collections(
+    query: str,
+    collections: Sequence[str],
+    embedding_model: Any,
+    config: AppConfig,
+    k: int,
+    fetch_k: int,
+    cache: RetrievalCache | None = None,
+    scope: RetrievalScope | None = None,
+) -> list[RetrievalResult]:
+    names = list(dict.fromkeys(validate_collection_name(name) for name in collections))
+    for name in names:
+        if name != DEFAULT_COLLECTION and not collection_root(config.chroma_persist_dir, name).exists():
+            raise ValueError(f"Unknown collection: {name}")
+    cache = cache or RetrievalCache()
+    # Embed once up front; every shard then finds the query vector in the cache.
+    if cache.get_embedding(query) is None:
+        with span("embed_query"):
+            cache.set_embedding(query, embedding_model.embed_query(query))
+
+    active = current_trace()
+
+    def run(name: str) -> list[RetrievalResult]:
+        with activate(active), span(f"shard:{name}"):
+            return _search_collection(query, name, embedding_model, config, k, fetch_k, cache, scope)
+
+    if len(names) == 1:
+        per_shard = [run(names[0])]
+    else:
+        pool = _fanout_pool(max(1, config.shard_workers))
+        per_shard = [future.result() for future in [pool.submit(run, name) for name in names]]
+    with span("merge_shards"):
+        return merge_top_k(per_shard, k)
@@ -0,0 +1,224 @@
+from __future__ import annotations
+
+import json
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Iterator
+
+STAGE_BUCKETS_SECONDS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+@dataclass(slots=True)
+class Trace:
+    kind: str
+    # Milliseconds per stage, summed when a stage runs more than once (e.g. per ingest batch).
+    timings: dict[str, float] = field(default_factory=dict)
+    prompt_tokens: int | None = None
+    completion_tokens: int | None = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    started_at: float = field(default_factory=time.time)
+    started: float = field(default_factory=time.perf_counter)
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    def add(self, stage: str, seconds: float) -> None:
+        with self.lock:
+            self.timings[stage] = self.timings.get(stage, 0.0) + seconds * 1000.0
+
+    def add_tokens(self, prompt: int | None, completion: int | None) -> None:
+        with self.lock:
+            if prompt is not None:
+                self.prompt_tokens = (self.prompt_tokens or 0) + int(prompt)
+            if completion is not None:
+                self.completion_tokens = (self.completion_tokens or 0) + int(completion)
+
+
+_CURRENT: ContextVar[Trace | None] = ContextVar("rag_trace", default=None)
+
+
+def current_trace() -> Trace | None:
+    return _CURRENT.get()
+
+
+@contextmanager
+def activate(trace_: Trace) -> Iterator[Trace]:
+    token = _CURRENT.set(trace_)
+    try:
+        yield trace_
+    finally:
+        _CURRENT.reset(token)
+
+
+def begin_trace(kind: str, **attributes: Any) -> Trace:
+    return Trace(kind=kind, attributes=attributes)
+
+
+def finish_trace(trace_: Trace) -> None:
+    trace_.add("total", time.perf_counter() - trace_.started)
+    if _EXPORTER.enabled:
+        _EXPORTER.export(trace_)
+
+
+@contextmanager
+def trace(kind: str, **attributes: Any) -> Iterator[Trace]:
+    trace_ = begin_trace(kind, **attributes)
+    try:
+        with activate(trace_):
+            yield trace_
+    finally:
+        finish_trace(trace_)
+
+
+@contextmanager
+def span(stage: str) -> Iterator[None]:
+    # Outside a trace this is a ContextVar lookup and nothing else.
+    trace_ = _CURRENT.get()
+    if trace_ is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        trace_.add(stage, time.perf_counter() - started)
+
+
+def record_tokens(prompt: int | None, completion: int | None) -> None:
+    trace_ = _CURRENT.get()
+    if trace_ is not None:
+        trace_.add_tokens(prompt, completion)
+
+
+def _labels(**labels: str) -> str:
+    return ",".join(f'{key}="{value}"' for key, value in labels.items())
+
+
+class MetricsRegistry:
+    def __init__(self, buckets: tuple[float, ...] = STAGE_BUCKETS_SECONDS) -> None:
+        self.buckets = buckets
+        self._histograms: dict[tuple[str, str], list[float]] = {}
+        self._tokens: dict[tuple[str, str], int] = {}
+        self._traces: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, trace_: Trace) -> None:
+        with self._lock:
+            self._traces[trace_.kind] = self._traces.get(trace_.kind, 0) + 1
+            for stage, milliseconds in trace_.timings.items():
+                # Layout: one cumulative count per bucket, then +Inf count, then the sum.
+                state = self._histograms.setdefault((trace_.kind, stage), [0.0] * (len(self.buckets) + 2))
+                seconds = milliseconds / 1000.0
+                for index, bound in enumerate(self.buckets):
+                    if seconds <= bound:
+                        state[index] += 1
+                state[-2] += 1
+                state[-1] += seconds
+            for token_type, count in (("prompt", trace_.prompt_tokens), ("completion", trace_.completion_tokens)):
+                if count:
+                    key = (trace_.kind, token_type)
+                    self._tokens[key] = self._tokens.get(key, 0) + count
+
+    def render(self) -> str:
+        with self._lock:
+            lines = [
+                "# HELP rag_traces_total Completed traces by kind.",
+                "# TYPE rag_traces_total counter",
+                *(f"rag_traces_total{{{_labels(kind=kind)}}} {count}" for kind, count in sorted(self._traces.items())),
+                "# HELP rag_stage_duration_seconds Time spent in each pipeline stage.",
+                "# TYPE rag_stage_duration_seconds histogram",
+            ]
+            for (kind, stage), state in sorted(self._histograms.items()):
+                labels = _labels(kind=kind, stage=stage)
+                for bound, count in zip(self.buckets, state):
+                    lines.append(f'rag_stage_duration_seconds_bucket{{{labels},le="{bound}"}} {int(count)}')
+                lines.append(f'rag_stage_duration_seconds_bucket{{{labels},le="+Inf"}} {int(state[-2])}')
+                lines.append(f"rag_stage_duration_seconds_sum{{{labels}}} {state[-1]}")
+                lines.append(f"rag_stage_duration_seconds_count{{{labels}}} {int(state[-2])}")
+            lines.append("# HELP rag_llm_tokens_total LLM tokens by kind and type.")
+            lines.append("# TYPE rag_llm_tokens_total counter")
+            for (kind, token_type), count in sorted(self._tokens.items()):
+                lines.append(f"rag_llm_tokens_total{{{_labels(kind=kind, type=token_type)}}} {count}")
+        return "\n".join(lines) + "\n"
+
+
+class _Exporter:
+    def __init__(self) -> None:
+        self.trace_log_path: Path | None = None
+        self.metrics: MetricsRegistry | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.trace_log_path is not None or self.metrics is not None
+
+    def export(self, trace_: Trace) -> None:
+        if self.metrics is not None:
+            self.metrics.observe(trace_)
+        if self.trace_log_path is not None:
+            record = {
+                "kind": trace_.kind,
+                "started_at": trace_.started_at,
+                "timings_ms": trace_.timings,
+                "prompt_tokens": trace_.prompt_tokens,
+                "completion_tokens": trace_.completion_tokens,
+                **trace_.attributes,
+            }
+            line = json.dumps(record, default=str) + "\n"
+            with self._lock, self.trace_log_path.open("a", encoding="utf-8") as handle:
+                handle.write(line)
+
+
+_EXPORTER = _Exporter()
+_SERVERS: dict[tuple[str, int], ThreadingHTTPServer] = {}
+
+
+def _metrics_handler(registry: MetricsRegistry) -> type[BaseHTTPRequestHandler]:
+    class MetricsHandler(BaseHTTPRequestHandler):
+        def do_GET(self) -> None:  # noqa: N802
+            if self.path.split("?", 1)[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = registry.render().encode("utf-8")
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args: Any) -> None:  # noqa: A002
+            return
+
+    return MetricsHandler
+
+
+def start_metrics_server(port: int, host: str = "127.0.0.1") -> ThreadingHTTPServer:
+    # Idempotent so Streamlit reruns do not try to bind the port again.
+    key = (host, port)
+    if key not in _SERVERS:
+        if _EXPORTER.metrics is None:
+            _EXPORTER.metrics = MetricsRegistry()
+        server = ThreadingHTTPServer((host, port), _metrics_handler(_EXPORTER.metrics))
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        _SERVERS[key] = server
+    return _SERVERS[key]
+
+
+def configure_telemetry(
+    trace_log_path: str | Path | None = None,
+    metrics_port: int = 0,
+    metrics_host: str = "127.0.0.1",
+) -> None:
+    if trace_log_path:
+        path = Path(trace_log_path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _EXPORTER.trace_log_path = path
+    if metrics_port > 0:
+        start_metrics_server(metrics_port, metrics_host)
+
+
+def get_metrics_registry() -> MetricsRegistry | None:
+    return _EXPORTER.metrics
@@ -1,55 +1,282 @@
 from __future__ import annotations
 
+import threading
+import time
+from collections import defaultdict
 from pathlib import Path
+from typing import TYPE_CHECKING, Any, TypeAlias
 
-from langchain_chroma import Chroma
 from langchain_core.documents import Document
 
+from src.dedup import DedupIndex
+from src.flat_index import FlatVectorStore
+from src.index_versions import index_root
+from src.lexical_index import BM25Index, get_lexical_index
+from src.manifest import load_manifest, save_manifest
 from src.models import DocumentChunk
+from src.telemetry import current_trace, span
+
+if TYPE_CHECKING:
+    from langchain_chroma import Chroma
+
+VECTOR_BACKENDS = ("chroma", "flat")
+VectorStore: TypeAlias = "Chroma | FlatVectorStore"
+
+_INDEX_VERSIONS: dict[str, int] = {}
+_INDEX_VERSIONS_LOCK = threading.Lock()
+_BACKFILL_LOCK = threading.Lock()
+
+
+def get_index_version(persist_dir: str | Path) -> int:
+    return _INDEX_VERSIONS.get(str(index_root(persist_dir).resolve()), 0)
+
+
+def bump_index_version(persist_dir: str | Path) -> int:
+    # Process-wide counter used to invalidate cached retrieval results after writes. Keyed by the
+    # persist dir, so writes to any version of an index (and switching versions) invalidate it.
+    key = str(index_root(persist_dir).resolve())
+    with _INDEX_VERSIONS_LOCK:
+        _INDEX_VERSIONS[key] = _INDEX_VERSIONS.get(key, 0) + 1
+        return _INDEX_VERSIONS[key]
+
+
+def _to_documents(chunks: list[DocumentChunk]) -> list[Document]:
+    # uploaded_at backs date-scoped retrieval; the ingest pipeline stamps the file's upload time.
+    uploaded_at = time.time()
+    return [
+        Document(page_content=chunk.text, metadata={"uploaded_at": uploaded_at, **chunk.metadata, "id": chunk.id})
+        for chunk in chunks
+    ]
+
+
+def upsert_chunks(
+    vectorstore: VectorStore,
+    chunks: list[DocumentChunk],
+    lexical_index: BM25Index | None = None,
+    dedup: DedupIndex | None = None,
+) -> list[DocumentChunk]:
+    plan = None
+    if dedup is not None:
+        # Near-duplicates of already indexed text are recorded as aliases instead of embedded.
+        with span("dedup"):
+            plan = dedup.plan(chunks)
+            chunks = plan.unique
+    if not chunks:
+        if plan is not None:
+            dedup.commit(plan)
+        return chunks
+    documents = _to_documents(chunks)
+    texts = [doc.page_content for doc in documents]
+    metadatas = [doc.metadata for doc in documents]
+    ids = [chunk.id for chunk in chunks]
+    if isinstance(vectorstore, FlatVectorStore):
+        # Embed explicitly rather than through add_documents so the two costs are traced separately.
+        with span("embed"):
+            embeddings = vectorstore.embeddings.embed_documents(texts)
+        with span("vector_write"):
+            vectorstore.add_embeddings(texts, embeddings, metadatas, ids)
+    else:
+        # add_texts upserts by id. It embeds internally; load_vectorstore wraps Chroma's embedding
+        # function in _TimedEmbeddings, so that part is booked as "embed" and only the rest as the write.
+        trace_ = current_trace()
+        embed_ms = trace_.timings.get("embed", 0.0) if trace_ is not None else 0.0
+        started = time.perf_counter()
+        vectorstore.add_texts(texts, metadatas=metadatas, ids=ids)
+        if trace_ is not None:
+            embedded = (trace_.timings.get("embed", 0.0) - embed_ms) / 1000.0
+            trace_.add("vector_write", max(time.perf_counter() - started - embedded, 0.0))
+    # Registered only once the vectors exist: if embedding or the write raises, nothing was planned in.
+    if plan is not None:
+        dedup.commit(plan)
+    if lexical_index is not None:
+        with span("lexical_index"):
+            lexical_index.add(chunks)
+    return chunks
+
+
+def previous_chunk_ids(manifest: dict[str, dict[str, Any]], source_file: str) -> set[str]:
+    return set(manifest.get(source_file, {}).get("chunk_ids", []))
+
+
+def finalize_file(
+    vectorstore: VectorStore,
+    manifest: dict[str, dict[str, Any]],
+    source_file: str,
+    content_hash: str,
+    chunk_ids: list[str],
+    lexical_index: BM25Index | None = None,
+    dedup: DedupIndex | None = None,
+) -> list[str]:
+    stale_ids = sorted(previous_chunk_ids(manifest, source_file) - set(chunk_ids))
+    # Aliases have no vectors, and canonical chunks other files still alias must stay.
+    removable = dedup.release(stale_ids) if dedup is not None and stale_ids else stale_ids
+    if removable:
+        vectorstore.delete(ids=removable)
+        if lexical_index is not None:
+            lexical_index.delete(removable)
+    manifest[source_file] = {"content_hash": content_hash, "chunk_ids": chunk_ids}
+    return stale_ids
+
+
+def delete_document(
+    vectorstore: VectorStore,
+    persist_dir: str | Path,
+    source_file: str,
+    dedup: DedupIndex | None = None,
+) -> list[str] | None:
+    # Removes one file's chunks from the vector store, lexical index and manifest. Returns its
+    # chunk ids, or None when the file is not in the index.
+    manifest = load_manifest(persist_dir)
+    entry = manifest.pop(source_file, None)
+    if entry is None:
+        return None
+    chunk_ids = list(entry.get("chunk_ids", []))
+    removable = dedup.release(chunk_ids) if dedup is not None and chunk_ids else chunk_ids
+    lexical_index = get_lexical_index(persist_dir)
+    if removable:
+        vectorstore.delete(ids=removable)
+        lexical_index.delete(removable)
+    lexical_index.save(persist_dir)
+    if dedup is not None:
+        dedup.save(persist_dir)
+    save_manifest(persist_dir, manifest)
+    bump_index_version(persist_dir)
+    return chunk_ids
+
+
+def sync_file_chunks(
+    vectorstore: VectorStore,
+    manifest: dict[str, dict[str, Any]],
+    source_file: str,
+    content_hash: str,
+    chunks: list[DocumentChunk],
+    lexical_index: BM25Index | None = None,
+    dedup: DedupIndex | None = None,
+) -> int:
+    # Chunk ids hash the chunk text, so ids already in the manifest are already embedded.
+    previous_ids = previous_chunk_ids(manifest, source_file)
+    fresh = [chunk for chunk in chunks if chunk.id not in previous_ids]
+    written = upsert_chunks(vectorstore, fresh, lexical_index, dedup)
+    chunk_ids = [chunk.id for chunk in chunks]
+    finalize_file(vectorstore, manifest, source_file, content_hash, chunk_ids, lexical_index, dedup)
+    return len(written)
 
 
 def build_or_update_vectorstore(
     chunks: list[DocumentChunk],
     embedding_model,
     persist_dir: str | Path,
-) -> Chroma:
-    vectorstore = Chroma(
-        embedding_function=embedding_model,
-        persist_directory=str(persist_dir),
-    )
+    file_hashes: dict[str, str] | None = None,
+    backend: str = "chroma",
+    vectorstore: VectorStore | None = None,
+    dedup: DedupIndex | None = None,
+) -> VectorStore:
+    if vectorstore is None:
+        vectorstore = load_vectorstore(persist_dir, embedding_model, backend)
 
-    if not chunks:
+    lexical_index = get_lexical_index(persist_dir)
+    if file_hashes is None:
+        upsert_chunks(vectorstore, chunks, lexical_index, dedup)
+        lexical_index.save(persist_dir)
+        if dedup is not None:
+            dedup.save(persist_dir)
+        bump_index_version(persist_dir)
         return vectorstore
 
-    docs = [
-        Document(page_content=chunk.text, metadata={**chunk.metadata, "id": chunk.id})
-        for chunk in chunks
-    ]
-    ids = [chunk.id for chunk in chunks]
+    by_file: dict[str, list[DocumentChunk]] = defaultdict(list)
+    untracked: list[DocumentChunk] = []
+    for chunk in chunks:
+        if chunk.source_file in file_hashes:
+            by_file[chunk.source_file].append(chunk)
+        else:
+            untracked.append(chunk)
+
+    manifest = load_manifest(persist_dir)
+    for source_file, content_hash in file_hashes.items():
+        sync_file_chunks(
+            vectorstore, manifest, source_file, content_hash, by_file.get(source_file, []), lexical_index, dedup
+        )
+    save_manifest(persist_dir, manifest)
 
-    # Chroma handles upsert-like behavior by id.
-    vectorstore.add_documents(documents=docs, ids=ids)
+    upsert_chunks(vectorstore, untracked, lexical_index, dedup)
+    lexical_index.save(persist_dir)
+    if dedup is not None:
+        dedup.save(persist_dir)
+    bump_index_version(persist_dir)
     return vectorstore
 
 
-def load_vectorstore(persist_dir: str | Path, embedding_model) -> Chroma:
-    return Chroma(
-        embedding_function=embedding_model,
-        persist_directory=str(persist_dir),
-    )
-
-
-def clear_vectorstore(persist_dir: str | Path) -> None:
-    path = Path(persist_dir)
-    if not path.exists():
-        return
-    for child in path.iterdir():
-        if child.is_file():
-            child.unlink()
-        elif child.is_dir():
-            for nested in child.rglob("*"):
-                if nested.is_file():
-                    nested.unlink()
-            for nested_dir in sorted([p for p in child.rglob("*") if p.is_dir()], reverse=True):
-                nested_dir.rmdir()
-            child.rmdir()
+def lexical_index_for(vectorstore: VectorStore, persist_dir: str | Path) -> BM25Index:
+    # An index built before hybrid retrieval, or one that lost its BM25 file, has vectors but no
+    # lexical index. Rebuild it once from the stored texts instead of fusing with an empty list.
+    lexical_index = get_lexical_index(persist_dir)
+    if len(lexical_index) or not load_manifest(persist_dir):
+        return lexical_index
+    with _BACKFILL_LOCK:
+        if not len(lexical_index):
+            with span("lexical_backfill"):
+                raw = vectorstore.get(include=["documents"])
+                lexical_index.add(
+                    [
+                        DocumentChunk(id=chunk_id, text=text or "", source_file="", page_number=None, chunk_index=0)
+                        for chunk_id, text in zip(raw["ids"], raw["documents"])
+                    ]
+                )
+                lexical_index.save(persist_dir)
+    return lexical_index
+
+
+class _TimedEmbeddings:
+    # Records document embedding as the "embed" stage for stores that embed internally (Chroma).
+    def __init__(self, model: Any) -> None:
+        self.model = model
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self.model, name)
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        with span("embed"):
+            return self.model.embed_documents(texts)
+
+    def embed_query(self, text: str) -> list[float]:
+        return self.model.embed_query(text)
+
+
+def unwrap_embeddings(model: Any) -> Any:
+    # The model a Chroma handle was opened with, for callers that pass vectorstore.embeddings on.
+    return model.model if isinstance(model, _TimedEmbeddings) else model
+
+
+def load_vectorstore(
+    persist_dir: str | Path,
+    embedding_model,
+    backend: str = "chroma",
+    quantization: str = "none",
+    rescore_candidates: int = 200,
+) -> VectorStore:
+    if backend == "flat":
+        return FlatVectorStore(
+            embedding_function=embedding_model,
+            persist_directory=persist_dir,
+            quantization=quantization,
+            rescore_candidates=rescore_candidates,
+        )
+    if backend == "chroma":
+        # chromadb takes over a second to import, so only pay for it when it is the backend.
+        from langchain_chroma import Chroma
+
+        return Chroma(
+            embedding_function=_TimedEmbeddings(unwrap_embeddings(embedding_model)),
+            persist_directory=str(persist_dir),
+        )
+    raise ValueError(f"Invalid VECTOR_BACKEND. Use one of: {', '.join(VECTOR_BACKENDS)}.")
+
+
+def index_dir_of(vectorstore: VectorStore) -> Path | None:
+    # The directory a handle was opened on, so a query reads the lexical and dedup indexes of the
+    # same index version as its vectors even if a rebuild switches versions mid-query.
+    if isinstance(vectorstore, FlatVectorStore):
+        return vectorstore.path.parent
+    client = getattr(vectorstore, "_client", None)
+    persist_directory = client.get_settings().persist_directory if client is not None else None
+    return Path(persist_directory) if persist_directory else None
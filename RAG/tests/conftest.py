@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from typing import Any, Callable
+
+import pytest
+
+from src.config import AppConfig
+
+
+class KeywordEmbeddings:
+    # One dimension per vocabulary word plus a constant one, so similarity follows keyword overlap.
+    def __init__(self, vocabulary: tuple[str, ...]) -> None:
+        self.vocabulary = list(vocabulary)
+        self.queries: list[str] = []
+        self.batch_calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.queries.append(text)
+        return self._vector(text)
+
+    def embed_queries(self, texts: list[str]) -> list[list[float]]:
+        self.batch_calls += 1
+        return [self._vector(text) for text in texts]
+
+    def _vector(self, text: str) -> list[float]:
+        lowered = text.lower()
+        return [1.0 if word in lowered else 0.0 for word in self.vocabulary] + [0.1]
+
+
+@pytest.fixture
+def keyword_embeddings() -> Callable[..., KeywordEmbeddings]:
+    def make(*vocabulary: str) -> KeywordEmbeddings:
+        return KeywordEmbeddings(vocabulary or ("calculus", "biology", "chemistry", "history"))
+
+    return make
+
+
+@pytest.fixture
+def make_config(tmp_path) -> Callable[..., AppConfig]:
+    # Local, offline settings rooted in tmp_path; tests override only what they exercise.
+    def make(**overrides: Any) -> AppConfig:
+        settings: dict[str, Any] = {
+            "openai_api_key": "x",
+            "groq_api_key": "groq-key",
+            "gemini_api_key": "gemini-key",
+            "embedding_provider": "local",
+            "local_embedding_model": "fake",
+            "chroma_persist_dir": tmp_path / "db",
+            "upload_dir": tmp_path / "uploads",
+            "chunk_size_tokens": 500,
+            "chunk_overlap_tokens": 0,
+            "retriever_top_k": 2,
+            "retrieval_score_threshold": 0.0,
+            "openai_embedding_model": "fake",
+            "gemini_embedding_model": "fake",
+            "groq_model": "fake-model",
+            "gemini_model": "fake-gemini",
+            "extraction_workers": 1,
+            "vector_backend": "flat",
+            "ingest_jobs_db": tmp_path / "jobs.sqlite3",
+        }
+        return AppConfig(**{**settings, **overrides})
+
+    return make
@@ -0,0 +1,81 @@
+from __future__ import annotations
+
+import json
+import time
+
+import pytest
+
+from src import rag_pipeline
+from src.batch_qa import read_questions, run_batch
+from src.chunking import chunk_records
+from src.retriever import retrieve, retrieve_many
+from src.vector_store import build_or_update_vectorstore
+
+
+RECORDS = [
+    {"text": "Calculus covers derivatives.", "source_file": "math.txt", "page_number": None},
+    {"text": "Biology covers cells.", "source_file": "bio.txt", "page_number": None},
+    {"text": "Chemistry covers reactions.", "source_file": "chem.txt", "page_number": 3},
+]
+
+
+@pytest.mark.parametrize("backend", ["chroma", "flat"])
+def test_retrieve_many_matches_single_queries(tmp_path, backend, keyword_embeddings) -> None:
+    embeddings = keyword_embeddings()
+    vs = build_or_update_vectorstore(chunk_records(RECORDS), embeddings, tmp_path / "db", backend=backend)
+    queries = ["biology cells", "chemistry", "biology cells"]
+
+    batched = retrieve_many(queries, vs, k=2)
+    assert embeddings.batch_calls == 1
+    for query, results in zip(queries, batched):
+        single = retrieve(query, vs, k=2)
+        assert [r.chunk.id for r in results] == [r.chunk.id for r in single]
+        assert abs(results[0].score - single[0].score) < 1e-5
+
+
+def test_run_batch_keeps_input_order_and_isolates_failures(
+    tmp_path, monkeypatch, make_config, keyword_embeddings
+) -> None:
+    embeddings = keyword_embeddings()
+    config = make_config()
+    vs = build_or_update_vectorstore(chunk_records(RECORDS), embeddings, config.chroma_persist_dir, backend="flat")
+
+    def fake_generate(query, context_chunks, config):
+        if "history" in query:
+            raise RuntimeError("rate limited")
+        # Later questions finish first, so ordering must come from the writer.
+        time.sleep(0.05 if "calculus" in query else 0.0)
+        return f"{query} -> {context_chunks[0].chunk.source_file}"
+
+    monkeypatch.setattr(rag_pipeline, "generate_with_groq", fake_generate)
+    questions = tmp_path / "questions.jsonl"
+    questions.write_text(
+        "\n".join(
+            [
+                json.dumps({"id": 1, "question": "calculus"}),
+                json.dumps({"id": 2, "question": "biology"}),
+                "",
+                json.dumps("history"),
+                json.dumps({"id": 4, "query": "chemistry"}),
+            ]
+        ),
+        encoding="utf-8",
+    )
+    output = tmp_path / "answers.jsonl"
+
+    assert run_batch(questions, output, vs, config, concurrency=3) == 4
+    rows = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [row["question"] for row in rows] == ["calculus", "biology", "history", "chemistry"]
+    assert rows[0]["answer"] == "calculus -> math.txt"
+    assert rows[1]["sources"][0]["source_file"] == "bio.txt"
+    assert rows[2]["used_model"] == "none" and "rate limited" in rows[2]["warnings"][0]
+    # One batched embedding call for the whole window; no per-question query embeddings.
+    assert embeddings.batch_calls == 1
+    assert embeddings.queries == []
+
+
+def test_read_questions_rejects_missing_question(tmp_path) -> None:
+    path = tmp_path / "bad.jsonl"
+    path.write_text(json.dumps({"id": 1}) + "\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="bad.jsonl:1"):
+        list(read_questions(path))
@@ -0,0 +1,26 @@
+from __future__ import annotations
+
+from pypdf import PdfReader
+
+from benchmarks.corpus import build_corpus
+from benchmarks.run import compare, run_benchmarks
+
+
+def test_synthetic_pdf_is_readable(tmp_path) -> None:
+    corpus = build_corpus(tmp_path, text_files=0, pdf_files=1, pdf_pages=3, image_files=0, queries=2)
+    reader = PdfReader(str(corpus.pdf_files[0]))
+    assert len(reader.pages) == 3
+    assert reader.pages[0].extract_text().strip()
+
+
+def test_run_benchmarks_small_offline(tmp_path) -> None:
+    results = run_benchmarks(
+        tmp_path, text_files=2, pdf_files=1, pdf_pages=2, image_files=0, words_per_page=120, queries=8
+    )
+    stages = results["stages"]
+    assert stages["chunk"]["chunks"] > 0
+    for backend in ("chroma", "flat"):
+        assert stages[backend]["retrieve_dense"]["count"] == 8
+        assert stages[backend]["answer_hybrid"]["p99_ms"] >= stages[backend]["answer_hybrid"]["p50_ms"]
+    assert results["meta"]["params"]["queries"] == 8
+    assert any("flat.retrieve_dense.p95_ms" in line for line in compare(results, results))
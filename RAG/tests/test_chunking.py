@@ -2,7 +2,7 @@ from __future__ import annotations
 
 import pytest
 
-from src.chunking import chunk_records
+from src.chunking import CHUNKER_VERSION, chunk_records, get_chunker
 
 
 def test_chunk_records_preserves_metadata() -> None:
@@ -17,3 +17,29 @@ def test_chunk_records_preserves_metadata() -> None:
 def test_chunk_records_ignores_empty() -> None:
     chunks = chunk_records([{"text": "", "source_file": "x.txt", "page_number": None}])
     assert chunks == []
+
+
+def test_chunk_records_offsets_and_overlap() -> None:
+    text = " ".join(f"word{i}" for i in range(300))
+    chunks = chunk_records([{"text": text, "source_file": "a.txt", "page_number": 2}], 50, 10)
+
+    assert len(chunks) > 1
+    for chunk in chunks:
+        assert text[chunk.metadata["char_start"] : chunk.metadata["char_end"]] == chunk.text
+    first, second = chunks[0].metadata, chunks[1].metadata
+    assert second["char_start"] < first["char_end"]
+    assert chunks[-1].metadata["char_end"] == len(text)
+
+
+def test_chunk_ids_are_versioned_and_deterministic() -> None:
+    records = [{"text": "Unit 1: Cryptography basics.", "source_file": "cns.pdf", "page_number": 1}]
+    first = chunk_records(records)
+    again = chunk_records(records)
+    assert [c.id for c in first] == [c.id for c in again]
+    assert first[0].metadata["chunker_version"] == CHUNKER_VERSION
+
+
+def test_get_chunker_is_cached() -> None:
+    assert get_chunker(100, 10) is get_chunker(100, 10)
+    with pytest.raises(ValueError):
+        get_chunker(10, 10)
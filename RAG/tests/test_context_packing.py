@@ -0,0 +1,53 @@
+from __future__ import annotations
+
+from src.chunking import DEFAULT_ENCODING, _get_encoding, chunk_records
+from src.context_packing import pack_context
+from src.models import DocumentChunk, RetrievalResult
+
+TEXT = " ".join(f"Week {i}: the lecture covers topic number {i} with worked examples." for i in range(60))
+
+
+def _results(scores: dict[int, float]) -> list[RetrievalResult]:
+    chunks = chunk_records([{"text": TEXT, "source_file": "notes.txt", "page_number": 1}], 40, 10)
+    return [RetrievalResult(chunks[index], score) for index, score in scores.items()]
+
+
+def test_adjacent_chunks_merge_without_repeating_overlap() -> None:
+    results = _results({2: 0.9, 3: 0.7, 4: 0.5, 7: 0.8})
+    packed = pack_context(results, token_budget=0)
+
+    assert [result.chunk.metadata["chunk_indices"] for result in packed[:1]] == [[2, 3, 4]]
+    merged = packed[0]
+    start, end = results[0].chunk.metadata["char_start"], results[2].chunk.metadata["char_end"]
+    assert merged.chunk.text == TEXT[start:end]
+    assert merged.score == 0.9
+    assert packed[1].chunk.chunk_index == 7
+
+
+def test_near_duplicates_are_dropped_keeping_the_best_copy() -> None:
+    text = "Assignment two is due on Friday at noon in the main office."
+    results = [
+        RetrievalResult(DocumentChunk("a", text, "a.txt", None, 0), 0.6),
+        RetrievalResult(DocumentChunk("b", text + " Late work", "b.txt", None, 0), 0.9),
+        RetrievalResult(DocumentChunk("c", "Lab reports go to room 4.", "c.txt", None, 0), 0.5),
+    ]
+    packed = pack_context(results, token_budget=0, dedup_threshold=0.7)
+    assert [result.chunk.source_file for result in packed] == ["b.txt", "c.txt"]
+
+
+def test_budget_is_filled_by_score_and_never_left_empty() -> None:
+    encoding = _get_encoding(DEFAULT_ENCODING)
+    results = [
+        RetrievalResult(DocumentChunk("a", "Fees are due in March. " * 4, "a.txt", None, 0), 0.9),
+        RetrievalResult(DocumentChunk("b", "The library opens at eight every weekday. " * 8, "b.txt", None, 0), 0.8),
+        RetrievalResult(DocumentChunk("c", "Parking permits cost ten dollars.", "c.txt", None, 0), 0.7),
+    ]
+    sizes = [len(encoding.encode_ordinary(result.chunk.text)) for result in results]
+
+    # The second passage does not fit, so the shorter third one fills the remaining budget.
+    packed = pack_context(results, token_budget=sizes[0] + sizes[2])
+    assert [result.chunk.source_file for result in packed] == ["a.txt", "c.txt"]
+
+    truncated = pack_context(results, token_budget=5)
+    assert len(truncated) == 1 and truncated[0].chunk.metadata["truncated"]
+    assert len(encoding.encode_ordinary(truncated[0].chunk.text)) <= 5
@@ -0,0 +1,130 @@
+from __future__ import annotations
+
+import pytest
+
+from src.chunking import chunk_records
+from src.citations import source_to_record
+from src.dedup import DedupIndex, annotate_sources, get_dedup_index, simhash
+from src.flat_index import FlatVectorStore
+from src.retriever import retrieve
+from src.vector_store import build_or_update_vectorstore, upsert_chunks
+
+BOILERPLATE = (
+    "Answer all questions. Write your student number on every page. Calculators are permitted. "
+    "Mobile phones must be switched off and left at the front of the examination hall."
+)
+
+
+@pytest.fixture
+def embeddings(keyword_embeddings):
+    return keyword_embeddings("calculators", "integrals", "enzymes")
+
+
+def _records(name: str, body: str) -> list[dict]:
+    return [
+        {"text": BOILERPLATE, "source_file": name, "page_number": 1},
+        {"text": body, "source_file": name, "page_number": 2},
+    ]
+
+
+def test_simhash_is_close_for_near_duplicates_only() -> None:
+    signature = simhash(BOILERPLATE)
+    near = simhash(BOILERPLATE.replace("every page", "each page"))
+    assert (signature ^ simhash(BOILERPLATE)).bit_count() == 0
+    assert (signature ^ near).bit_count() < (signature ^ simhash("Integrals of x")).bit_count()
+
+
+def test_boilerplate_is_stored_once_and_cited_for_every_file(tmp_path, embeddings) -> None:
+    persist_dir = tmp_path / "db"
+    vectorstore = FlatVectorStore(embeddings, persist_dir)
+    dedup = get_dedup_index(persist_dir)
+    chunks = chunk_records(_records("math_2023.pdf", "Evaluate the integrals.")) + chunk_records(
+        _records("bio_2024.pdf", "Describe how enzymes work.")
+    )
+    hashes = {"math_2023.pdf": "a", "bio_2024.pdf": "b"}
+    build_or_update_vectorstore(chunks, embeddings, persist_dir, hashes, "flat", vectorstore=vectorstore, dedup=dedup)
+
+    assert len(vectorstore) == 3
+    results = annotate_sources(retrieve("calculators", vectorstore, k=1), dedup)
+    record = source_to_record(results[0])
+    assert record["source_file"] == "math_2023.pdf"
+    assert record["also_in"] == [{"source_file": "bio_2024.pdf", "page_number": 1}]
+
+    # The first file changes: its copy of the boilerplate goes, but bio_2024 still needs the vector.
+    changed = chunk_records([{"text": "Evaluate the integrals again.", "source_file": "math_2023.pdf"}])
+    build_or_update_vectorstore(
+        changed, embeddings, persist_dir, {"math_2023.pdf": "c"}, "flat", vectorstore=vectorstore, dedup=dedup
+    )
+    results = annotate_sources(retrieve("calculators", vectorstore, k=1), dedup)
+    assert results[0].chunk.source_file == "bio_2024.pdf"
+    assert results[0].chunk.metadata["also_in"] == []
+
+    reloaded = DedupIndex.load(persist_dir)
+    assert reloaded.sources(results[0].chunk.id) == dedup.sources(results[0].chunk.id)
+
+    # Once no file holds the text, the vector is deleted.
+    build_or_update_vectorstore(
+        [], embeddings, persist_dir, {"bio_2024.pdf": "d"}, "flat", vectorstore=vectorstore, dedup=dedup
+    )
+    assert "calculators" not in " ".join(vectorstore.get()["documents"]).lower()
+
+
+class FailingEmbeddings:
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        raise RuntimeError("embedding service unavailable")
+
+
+def test_failed_vector_write_registers_nothing(tmp_path, embeddings) -> None:
+    persist_dir = tmp_path / "db"
+    dedup = DedupIndex()
+    chunks = chunk_records(_records("math_2023.pdf", "Evaluate the integrals."))
+    failing = FlatVectorStore(FailingEmbeddings(), persist_dir)
+    with pytest.raises(RuntimeError):
+        upsert_chunks(failing, chunks, dedup=dedup)
+    assert len(dedup) == 0 and not dedup.aliases
+
+    # A retry embeds the chunks again instead of treating them as already stored.
+    vectorstore = FlatVectorStore(embeddings, persist_dir)
+    assert len(upsert_chunks(vectorstore, chunks, dedup=dedup)) == 2
+    assert len(vectorstore) == 2 and len(dedup) == 2
+    # Copies of stored text become aliases.
+    again = chunk_records(_records("bio_2024.pdf", "Evaluate the integrals.")) + chunk_records(
+        _records("chem_2024.pdf", "Balance the equations.")
+    )
+    written = upsert_chunks(vectorstore, again, dedup=dedup)
+    assert [chunk.source_file for chunk in written] == ["chem_2024.pdf"]
+    assert len(dedup.aliases) == 3
+
+
+def test_plan_aliases_duplicates_within_one_batch() -> None:
+    dedup = DedupIndex()
+    chunks = chunk_records(_records("math_2023.pdf", "Evaluate the integrals.")) + chunk_records(
+        _records("bio_2024.pdf", "Describe how enzymes work.")
+    )
+    plan = dedup.plan(chunks)
+    texts = [chunk.text for chunk in plan.unique]
+    assert texts == [BOILERPLATE, "Evaluate the integrals.", "Describe how enzymes work."]
+    assert len(dedup) == 0
+    dedup.commit(plan)
+    assert len(dedup) == 3 and len(dedup.sources(plan.unique[0].id)) == 2
+
+
+def test_save_from_a_stale_copy_keeps_the_other_writers_entries(tmp_path) -> None:
+    math = chunk_records(_records("math_2023.pdf", "Evaluate the integrals."))
+    bio = chunk_records(_records("bio_2024.pdf", "Describe how enzymes work."))
+    first, second = DedupIndex.load(tmp_path), DedupIndex.load(tmp_path)
+    first.commit(first.plan(math))
+    first.save(tmp_path)
+    # `second` was read before that save, like a copy cached in another process.
+    second.commit(second.plan(bio))
+    second.save(tmp_path)
+
+    # Neither copy saw the other's boilerplate when planning, so both were stored and both are kept.
+    saved = DedupIndex.load(tmp_path)
+    assert set(saved.signatures) == {chunk.id for chunk in math + bio}
+
+    cached = get_dedup_index(tmp_path)
+    first.release([chunk.id for chunk in math])
+    first.save(tmp_path)
+    assert get_dedup_index(tmp_path) is not cached
+    assert set(get_dedup_index(tmp_path).signatures) == {chunk.id for chunk in bio}
@@ -0,0 +1,51 @@
+from __future__ import annotations
+
+from src.embedding_cache import CachedEmbeddings
+
+
+class CountingModel:
+    def __init__(self) -> None:
+        self.document_calls: list[list[str]] = []
+        self.query_calls = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.document_calls.append(list(texts))
+        return [[float(len(t)), 0.5, -1.0] for t in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        self.query_calls += 1
+        return [1.0, 2.0, 3.0]
+
+
+def test_only_misses_reach_backend(tmp_path) -> None:
+    model = CountingModel()
+    cache = CachedEmbeddings(model, provider="local", model_name="m", cache_dir=tmp_path)
+
+    first = cache.embed_documents(["alpha", "beta", "alpha"])
+    second = cache.embed_documents(["beta", "gamma"])
+
+    assert model.document_calls == [["alpha", "beta"], ["gamma"]]
+    assert first[0] == first[2] == [5.0, 0.5, -1.0]
+    assert second[0] == first[1]
+
+
+def test_cache_persists_and_separates_task_types(tmp_path) -> None:
+    model = CountingModel()
+    CachedEmbeddings(model, provider="gemini", model_name="m", cache_dir=tmp_path).embed_query("q")
+
+    reopened = CachedEmbeddings(model, provider="gemini", model_name="m", cache_dir=tmp_path)
+    assert reopened.embed_query("q") == [1.0, 2.0, 3.0]
+    assert model.query_calls == 1
+
+    reopened.embed_documents(["q"])
+    assert model.document_calls == [["q"]]
+
+
+def test_eviction_keeps_cache_within_budget(tmp_path) -> None:
+    model = CountingModel()
+    cache = CachedEmbeddings(model, provider="local", model_name="m", cache_dir=tmp_path, max_bytes=12 * 4)
+
+    cache.embed_documents([f"text-{i}" for i in range(10)])
+
+    total = cache._conn.execute("SELECT SUM(nbytes) FROM embeddings").fetchone()[0]
+    assert total <= 12 * 4
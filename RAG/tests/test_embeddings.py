@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from src.embeddings import GeminiEmbeddings
+
+
+class FakeGenai:
+    def __init__(self, failing_models: set[str] | None = None, quota_failures: int = 0) -> None:
+        self.failing_models = failing_models or set()
+        self.quota_failures = quota_failures
+        self.calls: list[tuple[str, int, str]] = []
+        self._lock = threading.Lock()
+
+    def embed_content(self, model: str, content, task_type: str):
+        with self._lock:
+            self.calls.append((model, len(content), task_type))
+            if self.quota_failures:
+                self.quota_failures -= 1
+                raise RuntimeError("429 Resource has been exhausted (e.g. check quota).")
+        if model in self.failing_models:
+            raise RuntimeError(f"{model} not found")
+        return {"embedding": [[float(len(text)), 1.0] for text in content]}
+
+
+def _embedder(fake: FakeGenai, **kwargs) -> GeminiEmbeddings:
+    kwargs.setdefault("backoff_seconds", 0.0)
+    return GeminiEmbeddings(api_key="x", model="models/text-embedding-004", client=fake, **kwargs)
+
+
+def test_embed_documents_batches_and_preserves_order() -> None:
+    fake = FakeGenai()
+    texts = [f"t{'x' * i}" for i in range(25)]
+    vectors = _embedder(fake, batch_size=10, max_workers=3).embed_documents(texts)
+
+    assert [v[0] for v in vectors] == [float(len(t)) for t in texts]
+    assert sorted(size for _, size, _ in fake.calls) == [5, 10, 10]
+
+
+def test_fallback_model_decided_once_per_batch() -> None:
+    fake = FakeGenai(failing_models={"models/text-embedding-004"})
+    vectors = _embedder(fake, batch_size=50).embed_documents(["a", "b", "c"])
+
+    assert len(vectors) == 3
+    assert [model for model, _, _ in fake.calls] == ["models/text-embedding-004", "models/embedding-001"]
+
+
+def test_quota_errors_are_retried_with_backoff() -> None:
+    fake = FakeGenai(quota_failures=2)
+    assert _embedder(fake).embed_query("hello") == [5.0, 1.0]
+    assert len(fake.calls) == 3
+    assert fake.calls[-1][2] == "retrieval_query"
+
+
+def test_all_models_failing_raises() -> None:
+    fake = FakeGenai(failing_models={"models/text-embedding-004", "models/embedding-001"})
+    with pytest.raises(RuntimeError, match="fallback models"):
+        _embedder(fake).embed_documents(["a"])
@@ -0,0 +1,133 @@
+from __future__ import annotations
+
+import numpy as np
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.chunking import chunk_records
+from src.flat_index import FlatVectorStore
+from src.retriever import retrieve
+from src.retrieval_cache import RetrievalCache
+from src.vector_store import build_or_update_vectorstore, load_vectorstore
+
+
+RECORDS = [
+    {"text": "Calculus covers derivatives.", "source_file": "math.txt", "page_number": None},
+    {"text": "Biology covers cells.", "source_file": "bio.txt", "page_number": None},
+    {"text": "Chemistry covers reactions.", "source_file": "chem.txt", "page_number": 3},
+]
+
+
+def test_flat_backend_exact_top_k_and_reopen(tmp_path, keyword_embeddings) -> None:
+    db = tmp_path / "db"
+    chunks = chunk_records(RECORDS)
+    build_or_update_vectorstore(chunks, keyword_embeddings(), db, backend="flat")
+
+    reopened = load_vectorstore(db, keyword_embeddings(), backend="flat")
+    assert isinstance(reopened, FlatVectorStore)
+    results = retrieve("Tell me about biology", reopened, k=2)
+    assert results[0].chunk.source_file == "bio.txt"
+    assert results[0].score > results[1].score
+
+    cached = retrieve("Tell me about biology", reopened, k=2, cache=RetrievalCache())
+    assert [r.chunk.id for r in cached] == [r.chunk.id for r in results]
+    assert abs(cached[0].score - results[0].score) < 1e-6
+
+
+def test_flat_backend_delete_upsert_and_compaction(tmp_path) -> None:
+    store = FlatVectorStore(FakeEmbeddings(size=8), tmp_path)
+    chunks = chunk_records(RECORDS)
+    build_or_update_vectorstore(chunks, store.embeddings, tmp_path, backend="flat")
+    store = load_vectorstore(tmp_path, store.embeddings, backend="flat")
+
+    store.delete(ids=[chunks[0].id, chunks[1].id])
+    assert len(store) == 1
+    assert store.get()["ids"] == [chunks[2].id]
+    assert store.get(ids=[chunks[2].id])["metadatas"][0]["page_number"] == 3
+
+    reopened = FlatVectorStore(store.embeddings, tmp_path)
+    assert len(reopened) == 1
+    assert reopened._matrix.shape[0] == 1
+
+
+def test_quantized_search_rescores_to_exact_top_k(tmp_path) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(500, 64)).astype(np.float32)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    texts = [f"chunk {i}" for i in range(len(vectors))]
+    exact = FlatVectorStore(None, tmp_path / "none")
+    exact.add_embeddings(texts, vectors.tolist(), [{} for _ in ids], ids)
+
+    for mode in ("int8", "binary"):
+        store = FlatVectorStore(None, tmp_path / mode, quantization=mode, rescore_candidates=150)
+        store.add_embeddings(texts, vectors.tolist(), [{} for _ in ids], ids)
+        for query in rng.normal(size=(5, 64)):
+            expected = exact.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=5)
+            found = store.similarity_search_by_vector_with_relevance_scores(query.tolist(), k=5)
+            if mode == "int8":
+                assert [d.page_content for d, _ in found] == [d.page_content for d, _ in expected]
+            else:
+                overlap = {d.page_content for d, _ in found} & {d.page_content for d, _ in expected}
+                assert len(overlap) >= 3
+            # Returned distances always come from the full-precision rows.
+            assert abs(found[0][1] - min(dist for _, dist in expected + found)) < 1e-5
+
+
+def test_quantization_mode_change_rebuilds_codes(tmp_path, keyword_embeddings) -> None:
+    chunks = chunk_records(RECORDS)
+    build_or_update_vectorstore(chunks, keyword_embeddings(), tmp_path, backend="flat")
+
+    store = load_vectorstore(tmp_path, keyword_embeddings(), backend="flat", quantization="int8")
+    assert (tmp_path / "flat" / "codes.i8").exists()
+    results = retrieve("Tell me about chemistry", store, k=1)
+    assert results[0].chunk.source_file == "chem.txt"
+
+    store.delete(ids=[chunks[0].id, chunks[1].id])
+    assert FlatVectorStore(keyword_embeddings(), tmp_path, quantization="int8")._arrays["codes"].shape == (1, 5)
+
+
+def test_failed_append_leaves_no_orphan_rows(tmp_path) -> None:
+    store = FlatVectorStore(None, tmp_path)
+    store.add_embeddings(["a"], [[1.0, 0.0, 0.0]], [{"source_file": "a.txt"}], ["a1"])
+    with pytest.raises(TypeError):
+        store.add_embeddings(["b"], [[0.0, 1.0, 0.0]], [{"source_file": object()}], ["b1"])
+
+    reopened = FlatVectorStore(None, tmp_path)
+    assert len(reopened) == 1
+    reopened.add_embeddings(["c"], [[0.0, 0.0, 1.0]], [{"source_file": "c.txt"}], ["c1"])
+    # The new row sits right after the committed one, so its payload matches its vector.
+    found = reopened.similarity_search_by_vector_with_relevance_scores([0.0, 0.0, 1.0], k=1)
+    assert found[0][0].page_content == "c"
+    assert reopened._matrix.shape[0] == 2
+
+
+def test_compaction_switches_file_generation_and_survives_reopen(tmp_path) -> None:
+    store = FlatVectorStore(None, tmp_path, quantization="int8")
+    vectors = np.eye(4, dtype=np.float32).tolist()
+    store.add_embeddings(list("wxyz"), vectors, [{"source_file": f"{c}.txt"} for c in "wxyz"], list("wxyz"))
+    store.delete(ids=["w", "x"])
+
+    files = {path.name for path in (tmp_path / "flat").iterdir()}
+    assert "vectors.1.f32" in files and "vectors.f32" not in files and "codes.1.i8" in files
+    reopened = FlatVectorStore(None, tmp_path, quantization="int8")
+    assert reopened.get()["ids"] == ["y", "z"]
+    found = reopened.similarity_search_by_vector_with_relevance_scores(vectors[3], k=1)
+    assert found[0][0].metadata == {"source_file": "z.txt"}
+    reopened.add_embeddings(["v"], [vectors[0]], [{}], ["v"])
+    assert reopened.get(ids="v")["documents"] == ["v"]
+
+
+def test_second_handle_sees_and_keeps_rows_written_through_the_first(tmp_path) -> None:
+    first = FlatVectorStore(None, tmp_path)
+    second = FlatVectorStore(None, tmp_path)
+    first.add_embeddings(["A"], [[1.0, 0.0, 0.0]], [{"source_file": "a.txt"}], ["A"])
+    second.add_embeddings(["B"], [[0.0, 1.0, 0.0]], [{"source_file": "b.txt"}], ["B"])
+    assert FlatVectorStore(None, tmp_path).get()["documents"] == ["A", "B"]
+
+    # A compaction through one handle renumbers rows; the other remaps before reading payloads.
+    first.add_embeddings(["C"], [[0.0, 0.0, 1.0]], [{}], ["C"])
+    first.delete(ids=["A", "B"])
+    assert second.get()["ids"] == ["C"]
+    found = second.similarity_search_by_vector_with_relevance_scores([0.0, 0.0, 1.0], k=1)
+    assert found[0][0].page_content == "C"
+    assert len(second) == 1
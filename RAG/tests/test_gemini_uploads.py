@@ -0,0 +1,57 @@
+from __future__ import annotations
+
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from types import SimpleNamespace
+
+from PIL import Image
+
+from src.gemini_uploads import GeminiUploadCache
+
+
+class FakeUploader:
+    def __init__(self, expires_in: timedelta = timedelta(hours=48)) -> None:
+        self.expires_in = expires_in
+        self.sizes: list[tuple[int, int]] = []
+
+    def __call__(self, path: str):
+        with Image.open(path) as image:
+            self.sizes.append(image.size)
+        expiration = datetime.now(timezone.utc) + self.expires_in
+        return SimpleNamespace(name=f"files/{len(self.sizes)}", expiration_time=expiration)
+
+
+def _image(tmp_path: Path, name: str, size: tuple[int, int], color: str = "white") -> Path:
+    path = tmp_path / name
+    Image.new("RGB", size, color=color).save(path)
+    return path
+
+
+def test_uploads_are_reused_across_questions(tmp_path: Path) -> None:
+    uploader = FakeUploader()
+    cache = GeminiUploadCache(uploader=uploader)
+    a = _image(tmp_path, "a.png", (20, 20))
+    b = _image(tmp_path, "b.png", (20, 20), color="black")
+
+    first = cache.get_files([a, b])
+    second = cache.get_files([b, a])
+
+    assert len(uploader.sizes) == 2
+    assert [h.name for h in second] == [first[1].name, first[0].name]
+
+
+def test_expired_handles_are_reuploaded(tmp_path: Path) -> None:
+    uploader = FakeUploader(expires_in=timedelta(seconds=5))
+    cache = GeminiUploadCache(uploader=uploader)
+    path = _image(tmp_path, "a.png", (20, 20))
+
+    cache.get_files([path])
+    cache.get_files([path])
+    assert len(uploader.sizes) == 2
+
+
+def test_oversized_images_are_downscaled(tmp_path: Path) -> None:
+    uploader = FakeUploader()
+    cache = GeminiUploadCache(uploader=uploader, max_image_side=100)
+    cache.get_files([_image(tmp_path, "photo.jpg", (400, 200))])
+    assert uploader.sizes == [(100, 50)]
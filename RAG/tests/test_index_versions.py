@@ -0,0 +1,123 @@
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+from src.flat_index import FlatVectorStore
+from src.index_versions import CURRENT_FILENAME, active_index_dir, read_lease, switch_version
+from src.ingest_pipeline import ingest_files
+from src.jobs import IngestJobQueue, JobStore
+from src.lexical_index import get_lexical_index
+from src.manifest import load_manifest
+from src.registry import shared_vectorstore
+from src.retriever import retrieve
+from src.vector_store import delete_document, get_index_version
+
+
+@pytest.fixture
+def config(make_config):
+    return make_config(chunk_size_tokens=40, retriever_top_k=3, index_retire_grace_seconds=0.0)
+
+
+@pytest.fixture
+def embeddings(keyword_embeddings):
+    return keyword_embeddings("exam", "lab", "fees", "library")
+
+
+@pytest.fixture
+def files(tmp_path):
+    paths = {}
+    for name, text in {
+        "exams.txt": "The exam timetable is posted in week ten.",
+        "labs.txt": "Lab reports are due every Friday.",
+        "fees.txt": "Tuition fees are due in March at the library desk.",
+    }.items():
+        paths[name] = tmp_path / name
+        paths[name].write_text(text, encoding="utf-8")
+    return paths
+
+
+def test_rebuild_switches_atomically_and_retires_after_readers(config, embeddings, files) -> None:
+    root = config.chroma_persist_dir
+    # An index from before versioning lives directly in the persist dir.
+    ingest_files([files["exams.txt"], files["labs.txt"]], embeddings, config)
+    old = shared_vectorstore(config, embeddings)
+    assert active_index_dir(root) == root and old.path.parent == root
+    version = get_index_version(root)
+
+    with read_lease(root):
+        new, summary = ingest_files(
+            [files["fees.txt"]],
+            embeddings,
+            config,
+            rebuild=True,
+            open_vectorstore=lambda index_dir: shared_vectorstore(config, embeddings, index_dir),
+        )
+        assert summary.files_indexed == 1
+        assert (root / CURRENT_FILENAME).exists()
+        # The switch is visible at once; the old files stay while a reader holds them.
+        assert shared_vectorstore(config, embeddings) is new
+        assert [r.chunk.source_file for r in retrieve("exam", old, k=1)] == ["exams.txt"]
+        assert (root / "flat").exists()
+    assert not (root / "flat").exists()
+    assert get_index_version(root) > version
+
+    index_dir = active_index_dir(root)
+    assert index_dir.parent.name == "versions"
+    assert set(load_manifest(index_dir)) == {"fees.txt"}
+    assert {r.chunk.source_file for r in retrieve("exam fees", new, k=3)} == {"fees.txt"}
+
+
+def test_failed_rebuild_keeps_the_live_index(tmp_path, config, embeddings, files) -> None:
+    ingest_files([files["exams.txt"]], embeddings, config)
+    empty = tmp_path / "blank.txt"
+    empty.write_text("", encoding="utf-8")
+
+    with pytest.raises(RuntimeError, match="current index was kept"):
+        ingest_files([empty], embeddings, config, rebuild=True)
+    root = config.chroma_persist_dir
+    assert active_index_dir(root) == root
+    assert not any((root / "versions").iterdir())
+    assert set(load_manifest(root)) == {"exams.txt"}
+
+
+def test_switch_version_waits_for_grace_and_leases(tmp_path) -> None:
+    root = tmp_path / "db"
+    first, second = root / "versions" / "a", root / "versions" / "b"
+    for path in (first, second):
+        path.mkdir(parents=True)
+        (path / "index_manifest.json").write_text("{}", encoding="utf-8")
+    switch_version(root, first)
+    assert active_index_dir(root) == first
+
+    switch_version(root, second, grace_seconds=60.0)
+    with read_lease(first):
+        pass
+    # Retired, but within its grace period for readers in other processes.
+    assert first.exists() and active_index_dir(root) == second
+
+
+def test_delete_document_and_rebuild_job(tmp_path, config, embeddings, files) -> None:
+    vectorstore, _ = ingest_files(list(files.values()), embeddings, config)
+    root = config.chroma_persist_dir
+
+    removed = delete_document(vectorstore, root, "labs.txt")
+    assert removed and delete_document(vectorstore, root, "labs.txt") is None
+    assert "labs.txt" not in load_manifest(root)
+    assert not vectorstore.get(ids=removed)["ids"]
+    assert all(chunk_id not in removed for chunk_id, _ in get_lexical_index(root).search("lab reports", k=5))
+
+    config = dataclasses.replace(config, chroma_persist_dir=tmp_path / "jobs_db")
+    queue = IngestJobQueue(
+        JobStore(config.ingest_jobs_db),
+        config,
+        embeddings,
+        lambda index_dir=None: FlatVectorStore(embeddings, index_dir or active_index_dir(config.chroma_persist_dir)),
+    )
+    try:
+        job = queue.wait(queue.submit([files["labs.txt"]], rebuild=True), timeout=10)
+    finally:
+        queue.close()
+    assert job.status == "completed" and job.rebuild
+    assert active_index_dir(config.chroma_persist_dir).name == f"job-{job.id}"
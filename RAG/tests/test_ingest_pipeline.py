@@ -0,0 +1,42 @@
+from __future__ import annotations
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.ingest_pipeline import ingest_files
+from src.manifest import load_manifest
+
+
+def _write(tmp_path, name: str, words: int):
+    path = tmp_path / name
+    path.write_text(" ".join(f"{name}-word{i}" for i in range(words)), encoding="utf-8")
+    return path
+
+
+def test_ingest_files_streams_batches_and_reports_progress(tmp_path, make_config) -> None:
+    config = make_config(chunk_size_tokens=20, retriever_top_k=5, vector_backend="chroma")
+    paths = [_write(tmp_path, "a.txt", 60), _write(tmp_path, "b.txt", 60), tmp_path / "missing.md"]
+    paths[2].write_text("x", encoding="utf-8")
+    progress = []
+
+    vs, summary = ingest_files(paths, FakeEmbeddings(size=8), config, batch_size=4, on_progress=progress.append)
+
+    assert summary.files_indexed == 2
+    assert summary.warnings == ["missing.md: Unsupported file type: .md"]
+    assert len(progress) == summary.batches > 1
+    assert all(p.batch_chunks <= 4 for p in progress)
+    assert progress[-1].chunks_indexed == summary.chunks_indexed == len(vs.get()["ids"])
+    assert set(load_manifest(config.chroma_persist_dir)) == {"a.txt", "b.txt"}
+
+
+def test_ingest_files_skips_unchanged_and_replaces_edited(tmp_path, make_config) -> None:
+    config = make_config(retriever_top_k=5, vector_backend="chroma")
+    a = _write(tmp_path, "a.txt", 10)
+    b = _write(tmp_path, "b.txt", 10)
+    ingest_files([a, b], FakeEmbeddings(size=8), config)
+
+    _write(tmp_path, "b.txt", 12)
+    vs, summary = ingest_files([a, b], FakeEmbeddings(size=8), config)
+
+    assert summary.files_skipped == 1
+    assert summary.chunks_embedded == 1
+    assert len(vs.get()["ids"]) == 2
@@ -50,3 +50,47 @@ def test_unsupported_extension(tmp_path: Path) -> None:
     file_path.write_text("x", encoding="utf-8")
     with pytest.raises(ValueError):
         ingestion.extract_text_from_file(file_path)
+
+
+def test_extract_files_splits_large_pdfs_and_keeps_page_order(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    file_path = tmp_path / "long.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+
+    class FakePage:
+        def __init__(self, number: int) -> None:
+            self.number = number
+
+        def extract_text(self):
+            return f"Page {self.number}"
+
+    class FakeReader:
+        def __init__(self, _):
+            self.pages = [FakePage(n) for n in range(1, 8)]
+
+    monkeypatch.setattr(ingestion, "PdfReader", FakeReader)
+    assert ingestion._plan_tasks(file_path, 3) == [(1, 3), (4, 6), (7, 7)]
+    records = [
+        record
+        for first, last in ingestion._plan_tasks(file_path, 3)
+        for record in ingestion._extract_task(str(file_path), first, last)
+    ]
+    assert [r["page_number"] for r in records] == list(range(1, 8))
+    assert records[3]["text"] == "Page 4"
+
+
+def test_extract_files_parallel_isolates_errors(tmp_path: Path) -> None:
+    paths = []
+    for name in ["a.txt", "b.md", "c.txt"]:
+        path = tmp_path / name
+        path.write_text(f"contents of {name}", encoding="utf-8")
+        paths.append(path)
+
+    results = list(ingestion.extract_files(paths, max_workers=2))
+
+    assert [r.path.name for r in results] == ["a.txt", "b.md", "c.txt"]
+    assert results[0].records[0]["text"] == "contents of a.txt"
+    assert results[1].error == "Unsupported file type: .md"
+    assert results[1].records == []
+    assert results[2].error is None
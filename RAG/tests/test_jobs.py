@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import threading
+
+import pytest
+
+from src.flat_index import FlatVectorStore
+from src.jobs import IngestJobQueue, JobStore
+from src.lexical_index import drop_lexical_index
+
+
+class CountingEmbeddings:
+    def __init__(self, fail_on_call: int | None = None, gate: threading.Event | None = None) -> None:
+        self.calls = 0
+        self.embedded = 0
+        self.fail_on_call = fail_on_call
+        self.gate = gate
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.calls += 1
+        if self.gate is not None:
+            self.gate.wait(timeout=5)
+        if self.calls == self.fail_on_call:
+            raise RuntimeError("embedding provider went away")
+        self.embedded += len(texts)
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        return [float(len(text) % 7 + 1), float(text.count("e") + 1), 1.0]
+
+
+@pytest.fixture
+def files(tmp_path):
+    long_file = tmp_path / "long.txt"
+    long_file.write_text(" ".join(f"sentence {i} about the weekly lecture schedule." for i in range(40)))
+    short_file = tmp_path / "short.txt"
+    short_file.write_text("Exam dates are posted on the notice board.")
+    yield [long_file, short_file]
+    drop_lexical_index(tmp_path / "db")
+
+
+@pytest.fixture
+def config(make_config):
+    return make_config(chunk_size_tokens=12, retriever_top_k=3)
+
+
+def _queue(config, embeddings, vectorstore=None) -> IngestJobQueue:
+    vectorstore = vectorstore or FlatVectorStore(embeddings, config.chroma_persist_dir)
+    return IngestJobQueue(JobStore(config.ingest_jobs_db), config, embeddings, lambda: vectorstore, batch_size=4)
+
+
+def test_job_runs_in_background_and_reports_progress(config, files) -> None:
+    embeddings = CountingEmbeddings()
+    queue = _queue(config, embeddings)
+    try:
+        job = queue.wait(queue.submit(files), timeout=30)
+    finally:
+        queue.close()
+
+    assert job.status == "completed"
+    assert job.files == {"long.txt": "done", "short.txt": "done"}
+    assert job.files_done == job.files_total == 2
+    assert job.batches > 1
+    assert job.chunks_embedded == embeddings.embedded == job.chunks_indexed
+    # The checkpoint is dropped once every file is in the manifest.
+    assert queue.store.checkpointed_chunk_ids(job.id) == set()
+
+
+def test_failed_job_resumes_without_re_embedding_checkpointed_batches(config, files) -> None:
+    failing = CountingEmbeddings(fail_on_call=3)
+    queue = _queue(config, failing)
+    try:
+        job_id = queue.submit(files)
+        job = queue.wait(job_id, timeout=30)
+    finally:
+        queue.close()
+    assert job.status == "failed" and "went away" in job.error
+    checkpointed = queue.store.checkpointed_chunk_ids(job_id)
+    assert len(checkpointed) == failing.embedded == 8
+
+    # A fresh process: new queue over the same database and index.
+    healthy = CountingEmbeddings()
+    queue = _queue(config, healthy)
+    try:
+        assert queue.retry(job_id)
+        job = queue.wait(job_id, timeout=30)
+        vectorstore = queue.get_vectorstore()
+    finally:
+        queue.close()
+    assert job.status == "completed"
+    total = len(vectorstore.get()["ids"])
+    assert healthy.embedded == total - len(checkpointed)
+
+
+def test_cancel_stops_running_job_and_interrupted_jobs_are_requeued(config, files) -> None:
+    gate = threading.Event()
+    embeddings = CountingEmbeddings(gate=gate)
+    queue = _queue(config, embeddings)
+    try:
+        job_id = queue.submit(files)
+        while queue.get(job_id).status != "running":
+            threading.Event().wait(0.01)
+        assert queue.cancel(job_id)
+        gate.set()
+        job = queue.wait(job_id, timeout=30)
+    finally:
+        queue.close()
+    assert job.status == "cancelled"
+    assert job.files_done < job.files_total
+
+    store = JobStore(config.ingest_jobs_db)
+    assert store.retry(job_id)
+    assert store.claim_next().id == job_id
+    # Another process starting a queue leaves a job whose owner is still heartbeating alone.
+    other = JobStore(config.ingest_jobs_db, lease_seconds=60.0)
+    assert other.requeue_interrupted() == 0
+    assert other.get(job_id).status == "running"
+    # A crash leaves the job marked running; once its lease lapses it goes back in line.
+    expired = JobStore(config.ingest_jobs_db, lease_seconds=0.0)
+    threading.Event().wait(0.01)
+    assert expired.requeue_interrupted() == 1
+    assert expired.get(job_id).status == "queued"
+    # The crashed owner's late outcome no longer applies, and its lease cannot be renewed.
+    assert expired.claim_next().id == job_id
+    assert not store.heartbeat(job_id)
+    store.finish(job_id, "failed", error="stale")
+    assert expired.get(job_id).status == "running"
+    for handle in (store, other, expired):
+        handle.close()
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.chunking import chunk_records
+from src.lexical_index import LEXICAL_INDEX_FILENAME, BM25Index, drop_lexical_index, get_lexical_index, tokenize
+from src.models import DocumentChunk, RetrievalResult
+from src.rag_pipeline import _passes_threshold
+from src.retriever import hybrid_retrieve
+from src.vector_store import build_or_update_vectorstore, lexical_index_for
+
+RECORDS = [
+    {"text": "M23BCS502 Cryptography and Network Security question paper.", "source_file": "cns.pdf", "page_number": 1},
+    {"text": "Operating systems scheduling and memory management notes.", "source_file": "os.pdf", "page_number": 1},
+    {"text": "Network topologies and routing for computer networks.", "source_file": "cn.pdf", "page_number": 1},
+]
+
+
+def test_tokenize_keeps_course_codes() -> None:
+    assert tokenize("Paper M23BCS502, Unit-1") == ["paper", "m23bcs502", "unit", "1"]
+
+
+def test_bm25_ranks_exact_code_first_and_handles_updates(tmp_path) -> None:
+    chunks = chunk_records(RECORDS)
+    index = BM25Index()
+    index.add(chunks)
+
+    assert index.search("m23bcs502 syllabus", k=2)[0][0] == chunks[0].id
+    assert [cid for cid, _ in index.search("network", k=5)] and len(index) == 3
+
+    index.delete([chunks[0].id])
+    assert all(cid != chunks[0].id for cid, _ in index.search("M23BCS502 network", k=5))
+
+    index.save(tmp_path)
+    reloaded = BM25Index.load(tmp_path)
+    assert len(reloaded) == 2
+    assert reloaded.search("scheduling", k=1)[0][0] == chunks[1].id
+
+
+def test_hybrid_retrieve_surfaces_lexical_match(tmp_path) -> None:
+    db = tmp_path / "db"
+    chunks = chunk_records(RECORDS)
+    vs = build_or_update_vectorstore(chunks, FakeEmbeddings(size=16), db)
+
+    results = hybrid_retrieve("M23BCS502", vs, get_lexical_index(db), k=3)
+
+    assert results[0].chunk.id == chunks[0].id
+    assert results[0].chunk.metadata["lexical_score"] > 0
+    assert results[0].chunk.source_file == "cns.pdf"
+    assert 0 < results[-1].score <= results[0].score <= 1.0
+
+
+def test_hybrid_threshold_reads_the_dense_similarity() -> None:
+    config = SimpleNamespace(retrieval_score_threshold=0.5)
+
+    def hit(score: float, **metadata) -> RetrievalResult:
+        return RetrievalResult(DocumentChunk("c", "text", "a.pdf", None, 0, metadata), score)
+
+    # A fused score near 1.0 does not carry a weak vector match past the threshold.
+    assert not _passes_threshold(hit(0.95, rrf_score=0.03, dense_score=0.2), config)
+    assert _passes_threshold(hit(0.4, rrf_score=0.01, dense_score=0.7), config)
+    assert _passes_threshold(hit(0.3, rrf_score=0.01, dense_score=None, lexical_score=4.2), config)
+    assert not _passes_threshold(hit(0.2), config)
+
+
+def test_empty_lexical_index_is_backfilled_from_the_vector_store(tmp_path) -> None:
+    db = tmp_path / "db"
+    chunks = chunk_records(RECORDS)
+    hashes = {record["source_file"]: "h" for record in RECORDS}
+    vs = build_or_update_vectorstore(chunks, FakeEmbeddings(size=16), db, hashes, backend="flat")
+    # An index from before hybrid retrieval: vectors and a manifest, but no BM25 file.
+    (db / LEXICAL_INDEX_FILENAME).unlink()
+    drop_lexical_index(db)
+
+    lexical_index = lexical_index_for(vs, db)
+    assert len(lexical_index) == 3
+    assert lexical_index.search("M23BCS502", k=1)[0][0] == chunks[0].id
+    assert (db / LEXICAL_INDEX_FILENAME).exists()
+    assert len(lexical_index_for(vs, tmp_path / "empty")) == 0
+
+
+def test_save_from_a_stale_copy_keeps_the_other_writers_documents(tmp_path) -> None:
+    chunks = chunk_records(RECORDS)
+    first, second = BM25Index.load(tmp_path), BM25Index.load(tmp_path)
+    first.add(chunks[:2])
+    first.save(tmp_path)
+    # `second` was read before that save, like a copy cached in another process.
+    second.add(chunks[2:])
+    second.delete([chunks[0].id])
+    second.save(tmp_path)
+
+    saved = BM25Index.load(tmp_path)
+    assert sorted(saved.chunk_ids) == sorted([chunks[1].id, chunks[2].id])
+    assert saved.search("scheduling", k=1)[0][0] == chunks[1].id
+
+    cached = get_lexical_index(tmp_path)
+    first.add(chunks[:1])
+    first.save(tmp_path)
+    assert get_lexical_index(tmp_path) is not cached
+    assert len(get_lexical_index(tmp_path)) == 3
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from types import SimpleNamespace
+
+import pytest
+
+from src import llm
+from src.models import DocumentChunk, RetrievalResult
+
+
+def _chunks() -> list[RetrievalResult]:
+    chunk = DocumentChunk(id="1", text="Fees are due in June.", source_file="fees.pdf", page_number=2, chunk_index=0)
+    return [RetrievalResult(chunk=chunk, score=0.9)]
+
+
+class FakeGroq:
+    instances = 0
+
+    def __init__(self, api_key: str) -> None:
+        FakeGroq.instances += 1
+        self.requests: list[dict] = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    def _create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("stream"):
+            pieces = ["Fees ", None, "are due in June. [S1]"]
+            return iter(SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=p))]) for p in pieces)
+        message = SimpleNamespace(content="Fees are due in June. [S1]")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+@pytest.fixture
+def fake_groq(monkeypatch: pytest.MonkeyPatch):
+    FakeGroq.instances = 0
+    llm.get_groq_client.cache_clear()
+    monkeypatch.setattr(llm, "_groq_client_class", lambda: FakeGroq)
+    yield FakeGroq
+    llm.get_groq_client.cache_clear()
+
+
+def test_stream_with_groq_yields_tokens_and_reuses_client(fake_groq, make_config) -> None:
+    config = make_config(retriever_top_k=5)
+    tokens = list(llm.stream_with_groq("When are fees due?", _chunks(), config))
+    answer = llm.generate_with_groq("When are fees due?", _chunks(), config)
+
+    assert tokens == ["Fees ", "are due in June. [S1]"]
+    assert answer == "".join(tokens)
+    assert fake_groq.instances == 1
+    assert llm.get_groq_client("groq-key").requests[0]["stream"] is True
+
+
+def test_stream_with_gemini_skips_textless_chunks(monkeypatch: pytest.MonkeyPatch, make_config) -> None:
+    class TextlessChunk:
+        @property
+        def text(self):
+            raise ValueError("no text parts")
+
+    class FakeModel:
+        def generate_content(self, parts, stream=False):
+            assert stream is True
+            assert "When are fees due?" in parts[0]
+            return iter([SimpleNamespace(text="June"), TextlessChunk(), SimpleNamespace(text=".")])
+
+    monkeypatch.setattr(llm, "get_gemini_model", lambda api_key, model_name: FakeModel())
+    tokens = list(llm.stream_with_gemini_multimodal("When are fees due?", _chunks(), [], make_config()))
+    assert tokens == ["June", "."]
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+import io
+from pathlib import Path
+
+import pytest
+from PIL import Image, ImageDraw
+
+from src import ingestion, ocr
+from src.ocr import OCRSettings, estimate_skew, preprocess
+
+
+def _text_like_image(size: tuple[int, int] = (1200, 900)) -> Image.Image:
+    image = Image.new("RGB", size, color="white")
+    draw = ImageDraw.Draw(image)
+    for y in range(80, size[1] - 80, 40):
+        for x in range(100, size[0] - 100, 60):
+            draw.rectangle([x, y, x + 45, y + 14], fill="black")
+    return image
+
+
+def test_image_ocr_is_cached_by_content_and_settings(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    calls: list[tuple[str, tuple[int, int]]] = []
+
+    def fake_ocr(image):
+        calls.append((image.mode, image.size))
+        return "lecture notes"
+
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", fake_ocr)
+    first = tmp_path / "photo.png"
+    _text_like_image((4000, 3000)).save(first)
+    renamed = tmp_path / "copy of photo.png"
+    renamed.write_bytes(first.read_bytes())
+
+    settings = OCRSettings(cache_dir=tmp_path / "cache", max_side=1000)
+    assert ingestion.extract_text_from_file(first, settings)[0]["text"] == "lecture notes"
+    assert ingestion.extract_text_from_file(renamed, settings)[0]["source_file"] == "copy of photo.png"
+    # Grayscale and downscaled before Tesseract sees it; the identical copy never reaches it.
+    assert calls == [("L", (1000, 750))]
+
+    ingestion.extract_text_from_file(first, OCRSettings(cache_dir=tmp_path / "cache", max_side=2000))
+    assert len(calls) == 2
+    ocr.drop_ocr_cache(tmp_path / "cache")
+
+
+def test_preprocess_respects_dpi_and_deskews() -> None:
+    image = _text_like_image()
+    assert estimate_skew(image) == 0.0
+    assert estimate_skew(image.rotate(3, expand=True, fillcolor="white")) == -3.0
+
+    image.info["dpi"] = (600, 600)
+    assert preprocess(image, OCRSettings(target_dpi=300, deskew=False)).size == (600, 450)
+    assert preprocess(image, OCRSettings(target_dpi=0, max_side=0, deskew=False)).size == (1200, 900)
+    # A 300 DPI A4 scan already sits at the target and is not squeezed into max_side.
+    page = Image.new("L", (2480, 3508), 255)
+    page.info["dpi"] = (300, 300)
+    assert preprocess(page, OCRSettings(max_side=2000, deskew=False)).size == (2480, 3508)
+    # A camera's nominal 72 DPI says nothing about the page, so max_side applies.
+    page.info["dpi"] = (72, 72)
+    assert preprocess(page, OCRSettings(max_side=2000, deskew=False)).size == (1414, 2000)
+
+
+def test_image_only_pdf_pages_fall_back_to_ocr(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> None:
+    file_path = tmp_path / "scan.pdf"
+    file_path.write_bytes(b"%PDF-1.4")
+    buffer = io.BytesIO()
+    _text_like_image((800, 600)).save(buffer, format="PNG")
+
+    class FakeImage:
+        data = buffer.getvalue()
+        image = Image.open(io.BytesIO(data))
+
+    class FakeLogo:
+        data = b"logo"
+        image = Image.new("RGB", (32, 32))
+
+    class FakePage:
+        def __init__(self, text: str, images: list) -> None:
+            self.text = text
+            self.images = images
+
+        def extract_text(self):
+            return self.text
+
+    class FakeReader:
+        def __init__(self, _):
+            self.pages = [FakePage("Typed page", []), FakePage("", [FakeLogo(), FakeImage()]), FakePage("", [])]
+
+    monkeypatch.setattr(ingestion, "PdfReader", FakeReader)
+    monkeypatch.setattr(ocr.pytesseract, "image_to_string", lambda _img: "scanned page")
+    records = ingestion.extract_text_from_file(file_path)
+    assert [(r["page_number"], r["text"]) for r in records] == [(1, "Typed page"), (2, "scanned page")]
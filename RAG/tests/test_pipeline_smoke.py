@@ -16,6 +16,7 @@ def test_pipeline_smoke(tmp_path, monkeypatch) -> None:
         groq_api_key="x",
         gemini_api_key="x",
         embedding_provider="gemini",
+        local_embedding_model="sentence-transformers/all-MiniLM-L6-v2",
         chroma_persist_dir=tmp_path / "db",
         upload_dir=tmp_path / "uploads",
         chunk_size_tokens=500,
@@ -0,0 +1,62 @@
+from __future__ import annotations
+
+import subprocess
+import sys
+import threading
+import time
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from src import registry
+from src.flat_index import FlatVectorStore
+from src.registry import ResourceRegistry
+
+
+def test_registry_builds_each_resource_once_under_concurrency() -> None:
+    shared = ResourceRegistry()
+    calls = []
+
+    def factory():
+        calls.append(1)
+        time.sleep(0.05)
+        return object()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(shared.get_or_create("model", factory))) for _ in range(8)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+    assert all(result is results[0] for result in results)
+
+
+def test_warmup_shares_models_and_stores_across_callers(monkeypatch, make_config) -> None:
+    monkeypatch.setattr(registry, "_REGISTRY", ResourceRegistry())
+    built = []
+    monkeypatch.setattr(registry, "get_embedding_model", lambda config: built.append(1) or FakeEmbeddings(size=8))
+    config = make_config(
+        openai_api_key="", groq_api_key="", gemini_api_key="", chunk_size_tokens=50, embedding_cache_max_mb=0
+    )
+
+    timings = registry.warmup(config)
+    assert {"embedding_model", "embed_query", "vectorstore", "lexical_index", "tokenizer"} <= timings.keys()
+    embedding_model = registry.shared_embedding_model(config)
+    store = registry.shared_vectorstore(config)
+    assert isinstance(store, FlatVectorStore)
+    assert registry.shared_vectorstore(config, embedding_model) is store
+    assert built == [1]
+
+    registry.drop_vectorstores(config.chroma_persist_dir)
+    assert registry.shared_vectorstore(config) is not store
+
+
+def test_provider_sdks_are_not_imported_eagerly() -> None:
+    code = (
+        "import sys, src.rag_pipeline, src.embeddings, src.registry, src.batch_qa; "
+        "print(sorted(m for m in ('google.generativeai', 'groq', 'langchain_openai', 'chromadb') if m in sys.modules))"
+    )
+    output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout
+    assert output.strip() == "[]"
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from src.models import DocumentChunk, RetrievalResult
+from src.reranker import CrossEncoderReranker
+
+
+class FakeCrossEncoder:
+    def __init__(self) -> None:
+        self.batches: list[list[tuple[str, str]]] = []
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.batches.append(list(pairs))
+        return [1.0 if "hostel" in text else 0.1 for _, text in pairs]
+
+
+def _result(chunk_id: str, text: str, score: float) -> RetrievalResult:
+    chunk = DocumentChunk(id=chunk_id, text=text, source_file="f.txt", page_number=None, chunk_index=0)
+    return RetrievalResult(chunk=chunk, score=score)
+
+
+def test_rerank_reorders_and_caches_scores() -> None:
+    model = FakeCrossEncoder()
+    reranker = CrossEncoderReranker(model=model)
+    candidates = [
+        _result("a", "Library timings", 0.9),
+        _result("b", "Hostel fees and hostel rules", 0.4),
+        _result("c", "Canteen menu", 0.8),
+    ]
+
+    top = reranker.rerank("hostel fee", candidates, top_k=2)
+    assert [r.chunk.id for r in top] == ["b", "a"]
+    assert top[0].score == 1.0
+    assert top[0].chunk.metadata["retrieval_score"] == 0.4
+
+    reranker.rerank("hostel fee", candidates + [_result("d", "hostel wifi", 0.2)], top_k=2)
+    assert [len(batch) for batch in model.batches] == [3, 1]
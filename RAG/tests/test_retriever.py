@@ -4,8 +4,9 @@ from langchain_chroma import Chroma
 from langchain_community.embeddings import FakeEmbeddings
 
 from src.chunking import chunk_records
+from src.retrieval_cache import RetrievalCache
 from src.retriever import retrieve
-from src.vector_store import build_or_update_vectorstore
+from src.vector_store import build_or_update_vectorstore, bump_index_version, get_index_version
 
 
 def test_retrieve_top_match(tmp_path) -> None:
@@ -19,3 +20,23 @@ def test_retrieve_top_match(tmp_path) -> None:
     results = retrieve("What are derivatives?", vs, k=1)
     assert len(results) == 1
     assert results[0].chunk.source_file in {"math.txt", "bio.txt"}
+
+
+def test_retrieve_cache_hits_until_index_version_changes(tmp_path) -> None:
+    records = [{"text": "Calculus studies derivatives.", "source_file": "math.txt", "page_number": None}]
+    embedding = FakeEmbeddings(size=32)
+    db = tmp_path / "db"
+    vs = build_or_update_vectorstore(chunk_records(records), embedding, db)
+    cache = RetrievalCache(max_entries=8, ttl_seconds=60)
+
+    version = get_index_version(db)
+    first = retrieve("What are derivatives?", vs, k=1, cache=cache, index_version=version)
+    calls = []
+    vs.similarity_search_by_vector_with_relevance_scores = lambda *a, **kw: calls.append(a) or []
+    again = retrieve("  what are DERIVATIVES? ", vs, k=1, cache=cache, index_version=version)
+    assert again[0].chunk.id == first[0].chunk.id
+    assert calls == []
+
+    bump_index_version(db)
+    assert retrieve("What are derivatives?", vs, k=1, cache=cache, index_version=get_index_version(db)) == []
+    assert len(calls) == 1
@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from dataclasses import replace
+
+import numpy as np
+import pytest
+
+from src.chunking import chunk_records
+from src.dedup import DedupIndex
+from src.flat_index import FlatVectorStore
+from src.lexical_index import get_lexical_index
+from src.retriever import hybrid_retrieve, retrieve
+from src.scope import RetrievalScope
+from src.vector_store import build_or_update_vectorstore
+
+
+@pytest.fixture
+def embeddings(keyword_embeddings):
+    return keyword_embeddings("derivative", "cell", "reaction", "war")
+
+
+RECORDS = [
+    {"text": "Each derivative rule, week one.", "source_file": "math.pdf", "page_number": 1},
+    {"text": "Chain rule for a derivative, week five.", "source_file": "math.pdf", "page_number": 5},
+    {"text": "A derivative appears in cell growth models.", "source_file": "bio.pdf", "page_number": 2},
+    {"text": "Reaction rates and the war effort.", "source_file": "history.pdf", "page_number": 7},
+]
+
+
+@pytest.mark.parametrize("backend", ["flat", "chroma"])
+def test_scope_is_pushed_down_to_the_store(tmp_path, backend, embeddings) -> None:
+    chunks = chunk_records(RECORDS)
+    vs = build_or_update_vectorstore(chunks, embeddings, tmp_path / "db", backend=backend)
+
+    scope = RetrievalScope(source_files=["math.pdf"], page_min=3)
+    results = retrieve("derivative", vs, k=4, scope=scope)
+    assert [(r.chunk.source_file, r.chunk.page_number) for r in results] == [("math.pdf", 5)]
+
+    # Scoping happens before top-k, so a narrow scope still fills k from the matching rows.
+    bio = retrieve("derivative", vs, k=1, scope=RetrievalScope(source_files=["bio.pdf"]))
+    assert [r.chunk.source_file for r in bio] == ["bio.pdf"]
+    assert retrieve("derivative", vs, k=4, scope=RetrievalScope(source_files=[])) == []
+    assert all("uploaded_at" in r.chunk.metadata for r in results)
+
+
+def test_flat_scope_uses_quantized_search_for_large_scopes(tmp_path) -> None:
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(400, 32)).astype(np.float32)
+    ids = [f"c{i}" for i in range(len(vectors))]
+    metadatas = [{"source_file": f"f{i % 2}.pdf", "page_number": i, "uploaded_at": float(i)} for i in range(400)]
+    exact = FlatVectorStore(None, tmp_path / "none")
+    store = FlatVectorStore(None, tmp_path / "int8", quantization="int8", rescore_candidates=50)
+    for target in (exact, store):
+        target.add_embeddings(ids, vectors.tolist(), metadatas, ids)
+
+    scope = RetrievalScope(source_files=["f1.pdf"], uploaded_after=100.0)
+    for query in rng.normal(size=(3, 32)).tolist():
+        expected = exact.similarity_search_by_vector_with_relevance_scores(query, k=5, scope=scope)
+        found = store.similarity_search_by_vector_with_relevance_scores(query, k=5, scope=scope)
+        assert [d.page_content for d, _ in found] == [d.page_content for d, _ in expected]
+        assert all(scope.matches(doc.metadata) for doc, _ in found)
+
+
+def test_hybrid_drops_out_of_scope_lexical_hits(tmp_path, embeddings) -> None:
+    db = tmp_path / "db"
+    vs = build_or_update_vectorstore(chunk_records(RECORDS), embeddings, db, backend="flat")
+
+    results = hybrid_retrieve(
+        "derivative week", vs, get_lexical_index(db), k=4, scope=RetrievalScope(source_files=["bio.pdf"])
+    )
+    assert [r.chunk.source_file for r in results] == ["bio.pdf"]
+
+
+def test_scope_from_dict_validates_and_builds_where() -> None:
+    assert RetrievalScope.from_dict(None) is None
+    assert RetrievalScope.from_dict({}) is None
+    scope = RetrievalScope.from_dict({"source_files": ["a.pdf"], "page_max": "4"})
+    assert scope == RetrievalScope(source_files=frozenset({"a.pdf"}), page_max=4)
+    assert scope.to_chroma_where() == {"$and": [{"source_file": {"$in": ["a.pdf"]}}, {"page_number": {"$lte": 4}}]}
+    assert not scope.matches({"source_file": "a.pdf", "page_number": None})
+    with pytest.raises(ValueError):
+        RetrievalScope.from_dict({"source_files": "a.pdf"})
+    with pytest.raises(ValueError):
+        RetrievalScope.from_dict({"page_min": "first"})
+
+
+@pytest.mark.parametrize("backend", ["flat", "chroma"])
+def test_scope_finds_text_deduplicated_into_another_file(tmp_path, backend, embeddings) -> None:
+    handout = "A derivative measures the rate of change of a function at a point."
+    records = [
+        {"text": handout, "source_file": "math.pdf", "page_number": 1},
+        {"text": "Each derivative rule, week one.", "source_file": "math.pdf", "page_number": 2},
+        {"text": handout, "source_file": "bio.pdf", "page_number": 3},
+    ]
+    dedup = DedupIndex()
+    chunks = chunk_records(records)
+    vs = build_or_update_vectorstore(chunks, embeddings, tmp_path / "db", backend=backend, dedup=dedup)
+
+    scope = RetrievalScope(source_files=["bio.pdf"])
+    assert retrieve("derivative", vs, k=4, scope=scope) == []
+    scope = replace(scope, alias_ids=dedup.scope_aliases(scope))
+    # Only the shared passage comes back, not the rest of the file it was stored under.
+    results = retrieve("derivative", vs, k=4, scope=scope)
+    assert [r.chunk.text for r in results] == [handout]
+    outside = replace(scope, page_max=2)
+    assert dedup.scope_aliases(outside) == frozenset()
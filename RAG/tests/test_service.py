@@ -0,0 +1,141 @@
+from __future__ import annotations
+
+import asyncio
+import json
+import threading
+
+import httpx
+import pytest
+from starlette.testclient import TestClient
+
+from src import rag_pipeline
+from src.flat_index import FlatVectorStore
+from src.service import create_app
+
+
+@pytest.fixture
+def make_app(make_config, keyword_embeddings):
+    def make(**overrides):
+        config = make_config(**overrides)
+        config.upload_dir.mkdir(exist_ok=True)
+        embeddings = keyword_embeddings()
+        vectorstore = FlatVectorStore(embedding_function=embeddings, persist_directory=config.chroma_persist_dir)
+        return create_app(config, embeddings, vectorstore)
+
+    return make
+
+
+DOCUMENTS = [
+    {"source_file": "math.txt", "text": "Calculus covers derivatives."},
+    {"source_file": "bio.txt", "text": "Biology covers cells.", "page_number": 2},
+]
+
+
+def test_ingest_then_query_and_stream(tmp_path, monkeypatch, make_app) -> None:
+    monkeypatch.setattr(rag_pipeline, "generate_with_groq", lambda q, chunks, c: f"from {chunks[0].chunk.source_file}")
+    monkeypatch.setattr(rag_pipeline, "stream_with_groq", lambda q, chunks, c: iter(["Cells ", "divide."]))
+    (tmp_path / "uploads").mkdir()
+    (tmp_path / "uploads" / "chem.txt").write_text("Chemistry covers reactions.", encoding="utf-8")
+
+    with TestClient(make_app()) as client:
+        response = client.post("/ingest", json={"documents": DOCUMENTS})
+        assert response.status_code == 200
+        assert response.json()["files_indexed"] == 2
+        response = client.post("/ingest", json={"paths": ["chem.txt"]})
+        assert response.status_code == 200 and response.json()["files_indexed"] == 1
+        assert client.post("/ingest", json={"paths": ["../outside.txt"]}).status_code == 400
+
+        response = client.post("/query", json={"question": "biology"})
+        assert response.status_code == 200
+        body = response.json()
+        assert body["answer"] == "from bio.txt"
+        assert body["sources"][0]["page_number"] == 2
+        assert "retrieve" in body["timings"]
+
+        with client.stream("POST", "/query/stream", json={"question": "biology"}) as stream:
+            events = [line for line in stream.iter_lines() if line.startswith("data: ")]
+        payloads = [json.loads(line[len("data: "):]) for line in events]
+        assert payloads[0]["sources"][0]["source_file"] == "bio.txt"
+        assert "".join(p["text"] for p in payloads if "text" in p) == "Cells divide."
+        assert "timings" in payloads[-1]
+
+        assert client.post("/query", json={"question": " "}).status_code == 400
+        assert client.post("/query", content=b"not json").status_code == 400
+        for image in (str(tmp_path / "outside.png"), "../outside.png", "missing.png"):
+            assert client.post("/query", json={"question": "x", "images": [image]}).status_code == 400
+
+        response = client.delete("/documents/bio.txt")
+        assert response.status_code == 200 and response.json()["chunks_removed"] == 1
+        assert client.delete("/documents/bio.txt").status_code == 404
+        assert client.post("/query", json={"question": "biology"}).json()["answer"] != "from bio.txt"
+        assert client.post("/ingest", json={"documents": DOCUMENTS, "rebuild": True}).status_code == 400
+
+        shard_docs = [{"source_file": "organic.txt", "text": "Chemistry covers carbon."}]
+        assert client.post("/ingest", json={"documents": shard_docs, "collection": "chem101"}).status_code == 200
+        response = client.post("/query", json={"question": "chemistry", "collections": ["chem101", "default"]})
+        assert response.json()["sources"][0]["collection"] in {"chem101", "default"}
+        response = client.post("/query", json={"question": "chemistry", "collections": ["chem101"]})
+        assert response.json()["answer"] == "from organic.txt"
+        assert client.post("/query", json={"question": "x", "collections": ["nope"]}).status_code == 400
+        assert client.post("/ingest", json={"documents": shard_docs, "collection": "../up"}).status_code == 400
+        assert client.delete("/documents/organic.txt?collection=chem101").status_code == 200
+
+
+def _blocking_generate(release: threading.Event, calls: list[str]):
+    def generate(query, context_chunks, config):
+        calls.append(query)
+        release.wait(timeout=5)
+        return f"answer to {query}"
+
+    return generate
+
+
+async def _post_all(app, bodies: list[dict], path: str = "/query") -> list[httpx.Response]:
+    # ASGITransport skips the lifespan, so the service pools stay open across calls.
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://service") as client:
+        return await asyncio.gather(*(client.post(path, json=body) for body in bodies))
+
+
+def test_identical_in_flight_queries_share_one_run(monkeypatch, make_app) -> None:
+    release = threading.Event()
+    calls: list[str] = []
+    monkeypatch.setattr(rag_pipeline, "generate_with_groq", _blocking_generate(release, calls))
+    app = make_app()
+
+    async def scenario() -> list[httpx.Response]:
+        await _post_all(app, [{"documents": DOCUMENTS}], "/ingest")
+        pending = asyncio.ensure_future(
+            _post_all(app, [{"question": "Biology?"}, {"question": "  biology? "}, {"question": "BIOLOGY?"}])
+        )
+        while not calls:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        release.set()
+        return await pending
+
+    responses = asyncio.run(scenario())
+    assert [response.status_code for response in responses] == [200, 200, 200]
+    assert len(calls) == 1
+    assert app.state.service.coalesced == 2
+
+
+def test_overload_returns_503(monkeypatch, make_app) -> None:
+    release = threading.Event()
+    calls: list[str] = []
+    monkeypatch.setattr(rag_pipeline, "generate_with_groq", _blocking_generate(release, calls))
+    app = make_app(service_max_inflight=1)
+
+    async def scenario() -> tuple[list[httpx.Response], httpx.Response]:
+        await _post_all(app, [{"documents": DOCUMENTS}], "/ingest")
+        pending = asyncio.ensure_future(_post_all(app, [{"question": "biology"}]))
+        while not calls:
+            await asyncio.sleep(0.01)
+        (rejected,) = await _post_all(app, [{"question": "calculus"}])
+        release.set()
+        return await pending, rejected
+
+    (accepted,), rejected = asyncio.run(scenario())
+    assert accepted.status_code == 200
+    assert rejected.status_code == 503
+    assert rejected.headers["Retry-After"] == "1"
@@ -0,0 +1,114 @@
+from __future__ import annotations
+
+import dataclasses
+
+import pytest
+
+from src.index_versions import active_index_dir
+from src.ingest_pipeline import ingest_files
+from src.manifest import load_manifest
+from src.models import DocumentChunk, RetrievalResult
+from src.retrieval_cache import RetrievalCache
+from src.shards import (
+    collection_root,
+    list_collections,
+    merge_top_k,
+    normalize_scores,
+    retrieve_collections,
+    validate_collection_name,
+)
+
+
+@pytest.fixture
+def embeddings(keyword_embeddings):
+    return keyword_embeddings("integral", "enzyme", "treaty", "exam")
+
+
+def _result(chunk_id: str, score: float) -> RetrievalResult:
+    return RetrievalResult(DocumentChunk(chunk_id, chunk_id, f"{chunk_id}.txt", None, 0), score)
+
+
+def test_merge_top_k_and_normalization() -> None:
+    first = [_result("a", 0.9), _result("b", 0.5), _result("c", 0.1)]
+    second = [_result("d", 0.7), _result("a", 0.6)]
+    assert [r.chunk.id for r in merge_top_k([first, second], k=3)] == ["a", "d", "b"]
+    assert merge_top_k([[], []], k=3) == []
+
+    assert [r.score for r in normalize_scores(first, "minmax")] == [1.0, 0.5, 0.0]
+    zscores = [r.score for r in normalize_scores(first, "zscore")]
+    assert zscores[1] == 0.5 and zscores[0] > 0.5 > zscores[2]
+    assert normalize_scores(first, "none") is first
+    with pytest.raises(ValueError):
+        normalize_scores(first, "rank")
+
+
+def test_collection_names_stay_inside_the_persist_dir(tmp_path) -> None:
+    assert collection_root(tmp_path, None) == tmp_path
+    assert collection_root(tmp_path, "default") == tmp_path
+    assert collection_root(tmp_path, "MATH-101") == tmp_path / "collections" / "MATH-101"
+    for name in ("../etc", "a/b", "", ".hidden", "x" * 65):
+        with pytest.raises(ValueError):
+            validate_collection_name(name)
+
+
+def test_fan_out_merges_collections(tmp_path, make_config, embeddings) -> None:
+    config = make_config(chunk_size_tokens=40, retriever_top_k=3)
+    texts = {
+        "calc.txt": "The integral of a sum is the sum of integrals.",
+        "bio.txt": "An enzyme lowers activation energy.",
+        "history.txt": "The treaty ended the war.",
+        "exams.txt": "The integral exam is in June.",
+    }
+    paths = {}
+    for name, text in texts.items():
+        paths[name] = tmp_path / name
+        paths[name].write_text(text, encoding="utf-8")
+    ingest_files([paths["calc.txt"], paths["exams.txt"]], embeddings, config, collection="math101")
+    ingest_files([paths["bio.txt"]], embeddings, config, collection="bio200")
+    ingest_files([paths["history.txt"]], embeddings, config)
+
+    root = config.chroma_persist_dir
+    assert list_collections(root) == ["default", "bio200", "math101"]
+    assert set(load_manifest(active_index_dir(collection_root(root, "math101")))) == {"calc.txt", "exams.txt"}
+    assert "calc.txt" not in load_manifest(root)
+
+    embeddings.queries.clear()
+    cache = RetrievalCache()
+    shards = ["math101", "bio200", "default"]
+    results = retrieve_collections("integral enzyme", shards, embeddings, config, 3, 10, cache)
+    # Embedded once for all three shards; each hit says which collection it came from.
+    assert embeddings.queries == ["integral enzyme"]
+    assert len(results) == 3 and results == sorted(results, key=lambda r: r.score, reverse=True)
+    assert {(r.chunk.source_file, r.chunk.metadata["collection"]) for r in results[:2]} == {
+        ("calc.txt", "math101"),
+        ("bio.txt", "bio200"),
+    }
+    assert results[2].chunk.source_file == "exams.txt"
+
+    only_bio = retrieve_collections("integral", ["bio200"], embeddings, config, 3, 10, cache)
+    assert [r.chunk.source_file for r in only_bio] == ["bio.txt"]
+    with pytest.raises(ValueError, match="Unknown collection"):
+        retrieve_collections("integral", ["chem300"], embeddings, config, 3, 10, cache)
+
+    minmax = dataclasses.replace(config, shard_score_normalization="minmax")
+    scaled = retrieve_collections("treaty", ["math101", "default"], embeddings, minmax, 3, 10)
+    # Each shard's best hit scores 1.0 after min-max scaling, its worst 0.0.
+    assert [r.score for r in scaled] == [1.0, 1.0, 0.0]
+    assert {r.chunk.source_file for r in scaled[:2]} == {"history.txt", "calc.txt"}
+
+
+def test_rebuilding_a_legacy_default_index_keeps_named_collections(tmp_path, make_config, embeddings) -> None:
+    config = make_config(chunk_size_tokens=40, retriever_top_k=3, index_retire_grace_seconds=0.0)
+    first, second = tmp_path / "a.txt", tmp_path / "b.txt"
+    first.write_text("The integral exam is in June.", encoding="utf-8")
+    second.write_text("An enzyme lowers activation energy.", encoding="utf-8")
+    ingest_files([first], embeddings, config)
+    ingest_files([second], embeddings, config, collection="bio")
+
+    ingest_files([first], embeddings, config, rebuild=True)
+    root = config.chroma_persist_dir
+    # The pre-versioning default index was retired; the collection stored beside it was not.
+    assert active_index_dir(root).parent.name == "versions"
+    assert set(load_manifest(collection_root(root, "bio"))) == {"b.txt"}
+    results = retrieve_collections("enzyme", ["bio"], embeddings, config, 1, 10)
+    assert [r.chunk.source_file for r in results] == ["b.txt"]
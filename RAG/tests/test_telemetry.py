@@ -0,0 +1,107 @@
+from __future__ import annotations
+
+import gc
+import json
+import urllib.request
+from dataclasses import replace
+from types import SimpleNamespace
+
+import pytest
+from langchain_community.embeddings import FakeEmbeddings
+
+from src import llm, rag_pipeline, telemetry
+from src.ingest_pipeline import ingest_files
+from src.rag_pipeline import answer_query, stream_answer_query
+from src.telemetry import MetricsRegistry, Trace, span, start_metrics_server
+
+
+def _fake_groq(monkeypatch) -> None:
+    usage = SimpleNamespace(prompt_tokens=120, completion_tokens=7)
+
+    def create(model, messages, temperature, stream=False):
+        if not stream:
+            message = SimpleNamespace(content="Fees are due.")
+            return SimpleNamespace(choices=[SimpleNamespace(message=message)], usage=usage)
+        return iter(
+            [
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="Fees "))], x_groq=None),
+                SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content="due."))], x_groq=None),
+                SimpleNamespace(choices=[], x_groq=SimpleNamespace(usage=usage)),
+            ]
+        )
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    monkeypatch.setattr(llm, "get_groq_client", lambda api_key: client)
+
+
+def test_answers_and_ingest_carry_stage_timings_and_export(tmp_path, monkeypatch, make_config) -> None:
+    trace_log = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(telemetry._EXPORTER, "trace_log_path", trace_log)
+    monkeypatch.setattr(telemetry._EXPORTER, "metrics", MetricsRegistry())
+    _fake_groq(monkeypatch)
+    config = make_config(chunk_size_tokens=50)
+    doc = tmp_path / "fees.txt"
+    doc.write_text("Semester fees are due in June. Late fees apply after July.", encoding="utf-8")
+
+    vectorstore, summary = ingest_files([doc], FakeEmbeddings(size=8), config)
+    assert {"hash", "extract", "chunk", "embed", "vector_write", "persist", "total"} <= summary.timings.keys()
+
+    answer = answer_query("When are fees due?", vectorstore, config)
+    expected = {"retrieve", "embed_query", "vector_search", "threshold_filter", "build_prompt", "llm"}
+    assert expected <= answer.timings.keys()
+    assert answer.timings["total"] >= answer.timings["retrieve"]
+    assert (answer.prompt_tokens, answer.completion_tokens) == (120, 7)
+
+    streamed = stream_answer_query("When are fees due?", vectorstore, replace(config, retrieval_mode="hybrid"))
+    assert "total" not in streamed.timings
+    assert "".join(streamed.tokens) == "Fees due."
+    assert {"lexical_search", "llm", "time_to_first_token", "total"} <= streamed.timings.keys()
+    assert streamed.completion_tokens == 7
+
+    records = [json.loads(line) for line in trace_log.read_text(encoding="utf-8").splitlines()]
+    assert [record["kind"] for record in records] == ["ingest", "query", "query_stream"]
+    assert records[1]["used_model"] == "groq" and records[1]["prompt_tokens"] == 120
+    metrics = telemetry.get_metrics_registry().render()
+    assert 'rag_stage_duration_seconds_count{kind="query",stage="llm"} 1' in metrics
+    assert 'rag_llm_tokens_total{kind="query_stream",type="completion"} 7' in metrics
+
+
+def test_span_is_noop_without_trace_and_metrics_endpoint_serves_histograms(monkeypatch) -> None:
+    with span("orphan"):
+        pass
+
+    registry = MetricsRegistry()
+    monkeypatch.setattr(telemetry._EXPORTER, "metrics", registry)
+    server = start_metrics_server(0)
+    registry.observe(Trace(kind="query", timings={"retrieve": 30.0}))
+    port = server.server_address[1]
+    try:
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode("utf-8")
+    finally:
+        server.shutdown()
+        telemetry._SERVERS.pop(("127.0.0.1", 0))
+    assert 'rag_stage_duration_seconds_bucket{kind="query",stage="retrieve",le="0.025"} 0' in body
+    assert 'rag_stage_duration_seconds_bucket{kind="query",stage="retrieve",le="0.05"} 1' in body
+    assert 'rag_stage_duration_seconds_bucket{kind="query",stage="retrieve",le="+Inf"} 1' in body
+
+
+def test_stream_traces_finish_on_failed_retrieval_and_abandoned_streams(tmp_path, monkeypatch, make_config) -> None:
+    trace_log = tmp_path / "traces.jsonl"
+    monkeypatch.setattr(telemetry._EXPORTER, "trace_log_path", trace_log)
+    monkeypatch.setattr(telemetry._EXPORTER, "metrics", MetricsRegistry())
+    config = make_config()
+
+    def fail(*args):
+        raise RuntimeError("index unavailable")
+
+    monkeypatch.setattr(rag_pipeline, "_select_context", fail)
+    with pytest.raises(RuntimeError):
+        stream_answer_query("When are fees due?", None, config)
+
+    monkeypatch.setattr(rag_pipeline, "_select_context", lambda *args: ([], []))
+    abandoned = stream_answer_query("When are fees due?", None, config)
+    del abandoned
+    gc.collect()
+
+    records = [json.loads(line) for line in trace_log.read_text(encoding="utf-8").splitlines()]
+    assert [record["kind"] for record in records] == ["query_stream", "query_stream"]
@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+from langchain_community.embeddings import FakeEmbeddings
+
+from src.chunking import chunk_records
+from src.manifest import is_file_unchanged, load_manifest
+from src.telemetry import trace
+from src.vector_store import build_or_update_vectorstore, unwrap_embeddings
+
+
+class CountingEmbeddings(FakeEmbeddings):
+    embedded: int = 0
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+
+def _chunks(text: str, source_file: str):
+    return chunk_records([{"text": text, "source_file": source_file, "page_number": 1}])
+
+
+def test_incremental_sync_skips_unchanged_and_removes_stale(tmp_path) -> None:
+    db = tmp_path / "db"
+    embedding = CountingEmbeddings(size=16)
+
+    chunks = _chunks("Exam schedule for CNS.", "cns.pdf") + _chunks("Lab manual.", "lab.pdf")
+    vs = build_or_update_vectorstore(chunks, embedding, db, file_hashes={"cns.pdf": "h1", "lab.pdf": "h2"})
+    assert embedding.embedded == 2
+    manifest = load_manifest(db)
+    assert is_file_unchanged(manifest, "lab.pdf", "h2")
+    old_ids = manifest["cns.pdf"]["chunk_ids"]
+
+    edited = _chunks("Revised exam schedule for CNS.", "cns.pdf")
+    vs = build_or_update_vectorstore(edited, embedding, db, file_hashes={"cns.pdf": "h3"})
+    assert embedding.embedded == 3
+
+    stored_ids = set(vs.get()["ids"])
+    assert not stored_ids & set(old_ids)
+    assert {c.id for c in edited} <= stored_ids
+    assert load_manifest(db)["lab.pdf"]["content_hash"] == "h2"
+
+
+def test_resync_with_same_chunks_embeds_nothing(tmp_path) -> None:
+    db = tmp_path / "db"
+    embedding = CountingEmbeddings(size=16)
+    chunks = _chunks("Syllabus unit one.", "syllabus.txt")
+    build_or_update_vectorstore(chunks, embedding, db, file_hashes={"syllabus.txt": "a"})
+    build_or_update_vectorstore(chunks, embedding, db, file_hashes={"syllabus.txt": "b"})
+    assert embedding.embedded == 1
+
+
+def test_chroma_writes_through_add_texts_and_times_embedding(tmp_path) -> None:
+    embedding = CountingEmbeddings(size=16)
+    with trace("ingest") as ingest:
+        vs = build_or_update_vectorstore(_chunks("Exam schedule for CNS.", "cns.pdf"), embedding, tmp_path / "db")
+    assert embedding.embedded == 1 and len(vs.get()["ids"]) == 1
+    # Chroma embeds inside add_texts; the embedding still shows up as its own stage.
+    assert {"embed", "vector_write"} <= ingest.timings.keys()
+    assert unwrap_embeddings(vs.embeddings) is embedding